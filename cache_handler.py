@@ -0,0 +1,298 @@
+# Shared two-tier cache: an in-process LRU in front of Redis or a local SQLite file
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Persistent tier configuration: "redis", "sqlite" or "memory" (in-process only)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "bot_cache.sqlite3")
+
+# Backend calls made from async code run on these threads, so a stalled Redis or a busy SQLite file never blocks the event loop
+BACKEND_WORKERS = 2
+_backend_executor = ThreadPoolExecutor(max_workers=BACKEND_WORKERS, thread_name_prefix="cache")
+
+class TTLCache:
+    """
+    Size-bounded LRU cache where every entry carries its own time-to-live.
+    Expired entries are dropped lazily when they are read.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key) -> Optional[Any]:
+        """Return the cached value for key, or None if it is missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float):
+        """Store value under key for ttl seconds, evicting the least recently used entry if full."""
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def peek(self, key) -> Optional[Any]:
+        """Like get(), but without touching LRU order or the hit/miss counters."""
+        entry = self._data.get(key)
+        if entry is None or time.monotonic() >= entry[0]:
+            return None
+        return entry[1]
+
+    def keys(self) -> List:
+        """Return all stored keys, including ones that have expired but not been evicted yet."""
+        return list(self._data.keys())
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteBackend:
+    """Persistent tier stored in a local SQLite file. Values are JSON strings with an absolute expiry."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)")
+            # Drop whatever expired while the bot was offline
+            self._conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        """Return (value, seconds left or None for no expiry), or None if missing or expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is None:
+            return value, None
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            self.delete(key)
+            return None
+        return value, remaining
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self, prefix: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+class RedisBackend:
+    """Persistent tier stored in Redis; expiry is handled by Redis itself."""
+
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5, decode_responses=True)
+        self._client.ping()
+
+    def get(self, key: str) -> Optional[Tuple[str, Optional[float]]]:
+        value, ttl_ms = self._client.pipeline().get(key).pttl(key).execute()
+        if value is None:
+            return None
+        return value, (ttl_ms / 1000 if ttl_ms and ttl_ms > 0 else None)
+
+    def set(self, key: str, value: str, ttl: Optional[float]):
+        self._client.set(key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    def delete(self, key: str):
+        self._client.delete(key)
+
+    def clear(self, prefix: str):
+        keys = list(self._client.scan_iter(match=f"{prefix}*"))
+        if keys:
+            self._client.delete(*keys)
+
+_backend = None
+_backend_ready = False
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """
+    Return the shared persistent backend chosen by CACHE_BACKEND, creating it on first use.
+    Returns None (in-process caching only) for "memory" or if the backend can't be reached.
+    """
+    global _backend, _backend_ready
+    with _backend_lock:
+        if not _backend_ready:
+            _backend_ready = True
+            try:
+                if CACHE_BACKEND == "redis":
+                    _backend = RedisBackend(REDIS_URL)
+                elif CACHE_BACKEND == "sqlite":
+                    _backend = SQLiteBackend(CACHE_DB_PATH)
+            except Exception as e:
+                print(f"Cache backend '{CACHE_BACKEND}' unavailable, using in-process cache only: {e}")
+                _backend = None
+    return _backend
+
+_DEFAULT_BACKEND = object()
+
+class TieredCache:
+    """
+    Namespaced two-tier cache. Reads check the in-process LRU first, then the persistent
+    backend (repopulating the LRU on a hit). Writes go to both tiers with the same TTL.
+    Keys are strings or tuples of strings; values must be JSON serializable.
+    Async code uses get_async/set_async/delete_async, which do the backend work on a worker thread.
+    """
+
+    # Lifetime given to L1 copies of backend entries that have no expiry
+    DEFAULT_L1_TTL = 24 * 60 * 60
+
+    def __init__(self, namespace: str, max_size: int = 1000, backend=_DEFAULT_BACKEND):
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._local = TTLCache(max_size)
+        self._backend = backend
+
+    def _get_backend(self):
+        if self._backend is _DEFAULT_BACKEND:
+            self._backend = get_backend()
+        return self._backend
+
+    def _backend_key(self, key) -> str:
+        return f"{self.namespace}:{':'.join(key) if isinstance(key, tuple) else key}"
+
+    def get(self, key) -> Optional[Any]:
+        """Return the cached value for key from either tier, or None if it is missing or expired."""
+        value = self._local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        return self._use_backend_entry(key, self._read_backend(key))
+
+    async def get_async(self, key) -> Optional[Any]:
+        """Like get(), but an in-process miss is looked up in the backend without blocking the event loop."""
+        value = self._local.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if self._backend is None:
+            self.misses += 1
+            return None
+        entry = await asyncio.get_running_loop().run_in_executor(_backend_executor, self._read_backend, key)
+        return self._use_backend_entry(key, entry)
+
+    def set(self, key, value, ttl: Optional[float]):
+        """Store value under key in both tiers for ttl seconds (None keeps it until evicted)."""
+        self._local.set(key, value, ttl if ttl is not None else self.DEFAULT_L1_TTL)
+        self._write_backend(key, json.dumps(value), ttl)
+
+    async def set_async(self, key, value, ttl: Optional[float]):
+        """Like set(), but the backend is written without blocking the event loop."""
+        self._local.set(key, value, ttl if ttl is not None else self.DEFAULT_L1_TTL)
+        if self._backend is not None:
+            await asyncio.get_running_loop().run_in_executor(_backend_executor, self._write_backend, key, json.dumps(value), ttl)
+
+    def delete(self, key):
+        self._local._data.pop(key, None)
+        self._delete_backend(key)
+
+    async def delete_async(self, key):
+        self._local._data.pop(key, None)
+        if self._backend is not None:
+            await asyncio.get_running_loop().run_in_executor(_backend_executor, self._delete_backend, key)
+
+    # Backend access; these may run on a worker thread, so they only touch the backend
+    def _read_backend(self, key) -> Optional[Tuple[str, Optional[float]]]:
+        backend = self._get_backend()
+        if backend is None:
+            return None
+        try:
+            return backend.get(self._backend_key(key))
+        except Exception as e:
+            print(f"Cache read error ({self.namespace}): {e}")
+            return None
+
+    def _write_backend(self, key, raw: str, ttl: Optional[float]):
+        backend = self._get_backend()
+        if backend is not None:
+            try:
+                backend.set(self._backend_key(key), raw, ttl)
+            except Exception as e:
+                print(f"Cache write error ({self.namespace}): {e}")
+
+    def _delete_backend(self, key):
+        backend = self._get_backend()
+        if backend is not None:
+            try:
+                backend.delete(self._backend_key(key))
+            except Exception as e:
+                print(f"Cache delete error ({self.namespace}): {e}")
+
+    def _use_backend_entry(self, key, entry) -> Optional[Any]:
+        # Decode a backend hit and copy it into the in-process tier
+        if entry is not None:
+            try:
+                raw, remaining = entry
+                value = json.loads(raw)
+                self._local.set(key, value, remaining if remaining is not None else self.DEFAULT_L1_TTL)
+                self.hits += 1
+                return value
+            except Exception as e:
+                print(f"Cache read error ({self.namespace}): {e}")
+        self.misses += 1
+        return None
+
+    def peek(self, key) -> Optional[Any]:
+        """Return a fresh in-process value without touching LRU order, counters or the backend."""
+        return self._local.peek(key)
+
+    def keys(self) -> List:
+        """Return the keys held in the in-process tier."""
+        return self._local.keys()
+
+    def clear(self):
+        """Clear this namespace in both tiers."""
+        self._local.clear()
+        backend = self._get_backend()
+        if backend is not None:
+            try:
+                backend.clear(f"{self.namespace}:")
+            except Exception as e:
+                print(f"Cache clear error ({self.namespace}): {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._local), "max_size": self._local.max_size, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._local)
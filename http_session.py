@@ -0,0 +1,50 @@
+# Pooled aiohttp sessions for the API clients: one keep-alive session per client per event loop
+import asyncio
+import aiohttp
+from typing import Dict, List, Optional
+
+_pools: List["SessionPool"] = []
+
+
+class SessionPool:
+    """
+    Hands out one shared aiohttp session per event loop (the bot's loop, plus any private loop
+    used by sync wrappers), created on first use with the given connection limits.
+    """
+
+    def __init__(self, pool_size: int, timeout: float, keepalive: Optional[float] = None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        _pools.append(self)
+
+    async def get(self) -> aiohttp.ClientSession:
+        """Return the pooled session for the running event loop, creating it on first use."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector_args = {"limit": self.pool_size}
+            if self.keepalive is not None:
+                connector_args["keepalive_timeout"] = self.keepalive
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**connector_args),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        """Close the pooled session for the running event loop."""
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session and not session.closed:
+            await session.close()
+
+
+async def close_all():
+    """Close every pool's session for the running event loop (called when the bot shuts down)."""
+    for pool in _pools:
+        try:
+            await pool.close()
+        except Exception as e:
+            print(f"Error closing HTTP session: {e}")
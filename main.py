@@ -6,6 +6,7 @@ from discord import Intents, app_commands
 from discord.ext import commands as discord_commands
 from dotenv import load_dotenv
 
+import http_session
 import mcserver_handler
 import music_handler
 import mtg_handler
@@ -41,6 +42,9 @@ async def on_ready():
                 print(f"Killing bot in: {guild.name} (ID: {guild.id})")
                 await guild.leave()
 
+        stock_handler.start_quote_refresher()
+        stock_handler.start_symbol_index_load()
+
     except Exception as e:
         print(f"Failed in on_ready: {e}")
 @client.event
@@ -83,17 +87,15 @@ async def mtg(ctx, query: str):
 # VOICE COMMANDS
 # ============================================================================
 
-@commands.command(name='leave')
-async def leave(ctx):
+@commands.command(name='leave', description="Stops the music and leaves the voice channel")
+async def leave(message):
     """Disconnect the bot from the current voice channel."""
     try:
-        if ctx.voice_client:
-            await ctx.voice_client.disconnect()
-        else:
-            await ctx.send("I'm not in a voice channel.")
+        await message.response.send_message("Leaving...")
+        await music_handler.leave(message)
     except Exception as e:
         print(e)
-        await ctx.send("⚠️ An error has occurred.")
+        await message.channel.send("⚠️ An error has occurred.")
 
 # ============================================================================
 # MUSIC COMMANDS
@@ -113,15 +115,13 @@ async def next(message):
     """Skip the currently playing song and play the next one in queue."""
     try:
         await message.response.send_message("⏭️ Skipping Current Song...")
-        voice_client = discord.utils.get(message.client.voice_clients, guild=message.guild)
-        if voice_client and voice_client.is_playing():
-            voice_client.stop()
+        await music_handler.skip(message)
     except Exception as e:
         print(e)
         await message.channel.send("⚠️ An error has occurred.")
 
 @commands.command(name="play", description="Play Music from Spotify or Youtube")
-@app_commands.describe(link="Youtube, Spotify, or a Search Query")
+@app_commands.describe(link="Youtube, Spotify, or a Search Query (separate several songs with ;)")
 async def play(message, link: str):
     """Play a song or playlist from YouTube, Spotify, or search query."""
     try:
@@ -162,6 +162,28 @@ async def stop(message):
         print(e)
         await message.channel.send("⚠️ An error has occurred.")
 
+@commands.command(name="remove", description="Remove a song from the queue")
+@app_commands.describe(position="Queue position of the song (see /queue)")
+async def remove(message, position: int):
+    """Remove one song from the music queue by its position."""
+    try:
+        await message.response.send_message("Removing Song...")
+        await music_handler.remove_from_queue(message, position)
+    except Exception as e:
+        print(e)
+        await message.channel.send("⚠️ An error has occurred.")
+
+@commands.command(name="move", description="Move a song to another spot in the queue")
+@app_commands.describe(position="Queue position of the song", to="Queue position to move it to")
+async def move(message, position: int, to: int):
+    """Move a song within the music queue."""
+    try:
+        await message.response.send_message("Moving Song...")
+        await music_handler.move_in_queue(message, position, to)
+    except Exception as e:
+        print(e)
+        await message.channel.send("⚠️ An error has occurred.")
+
 @commands.command(name="queue", description="Lists all songs in queue")
 async def queue(message):
     """Display all songs currently in the music queue."""
@@ -316,12 +338,34 @@ async def apistatus(message: discord.Interaction):
             value=f"{usage['remaining']} calls available",
             inline=False
         )
+        if usage['queued']:
+            embed.add_field(
+                name="Queued Requests",
+                value=f"{usage['queued']} lookups waiting for a free slot",
+                inline=False
+            )
         embed.add_field(
             name="Total Calls (Session)",
             value=f"{usage['total_calls']} total API calls made",
             inline=False
         )
         
+        cache = stock_handler.get_cache_stats()
+        lookups = cache['hits'] + cache['misses']
+        hit_rate = (cache['hits'] / lookups) * 100 if lookups else 0
+        embed.add_field(
+            name="Cache",
+            value=f"{cache['size']}/{cache['max_size']} entries | {hit_rate:.1f}% hit rate ({cache['hits']} hits, {cache['misses']} misses)",
+            inline=False
+        )
+        
+        extraction = music_handler.extraction_stats()
+        embed.add_field(
+            name="Music Extraction",
+            value=f"{extraction['running']}/{extraction['workers']} workers busy | {extraction['queued']} queued | {extraction['timeouts']} timeouts | {extraction['queue_timeouts']} dropped while queued",
+            inline=False
+        )
+        
         # Add status indicator
         if usage['calls_this_minute'] >= 50:
             status = "🔴 High usage - approaching limit"
@@ -339,13 +383,28 @@ async def apistatus(message: discord.Interaction):
         print(f"API status command error: {e}")
         await message.response.send_message("⚠️ An error has occurred.")
 
+async def ticker_autocomplete(interaction: discord.Interaction, current: str):
+    choices = []
+    
+    for match in stock_handler.autocomplete_tickers(current):
+        name = f"{match['symbol']}: {match['description']}"[:100]
+        choices.append(
+            app_commands.Choice(
+                name=name,
+                value=match['symbol']
+            )
+        )
+    
+    return choices[:25]
+
 @commands.command(name="stock", description="Get stock information by ticker")
 @app_commands.describe(ticker="Stock ticker symbol (e.g., AAPL, MSFT)")
+@app_commands.autocomplete(ticker=ticker_autocomplete)
 async def stock(message: discord.Interaction, ticker: str):
     """Fetch real-time stock information from Finnhub API."""
     try:
         await message.response.defer()
-        stock_info = stock_handler.get_stock(ticker.upper())
+        stock_info = await stock_handler.get_stock_async(ticker.upper())
         
         if not stock_info:
             await message.followup.send(f"❌ Unable to find stock data for **{ticker.upper()}**. Please check the ticker symbol.")
@@ -354,12 +413,13 @@ async def stock(message: discord.Interaction, ticker: str):
         # Format the change color based on positive/negative
         change = stock_info.get("change", 0)
         change_percent = stock_info.get("change_percent", 0)
-        change_emoji = "📈" if change >= 0 else "📉"
+        is_up = not isinstance(change, (int, float)) or change >= 0
+        change_emoji = "📈" if is_up else "📉"
         
         embed = discord.Embed(
             title=f"{stock_info.get('name', 'N/A')} ({stock_info.get('ticker')})",
             description=stock_info.get("description", "N/A"),
-            color=discord.Color.green() if change >= 0 else discord.Color.red()
+            color=discord.Color.green() if is_up else discord.Color.red()
         )
         
         embed.add_field(name="💰 Price", value=f"${stock_info.get('price', 'N/A')}", inline=True)
@@ -375,6 +435,9 @@ async def stock(message: discord.Interaction, ticker: str):
         if stock_info.get('website'):
             embed.add_field(name="🔗 Website", value=f"[Link]({stock_info.get('website')})", inline=False)
         
+        if stock_info.get('missing'):
+            embed.add_field(name="⚠️ Partial Data", value=f"Could not fetch {' and '.join(stock_info['missing'])} data for this ticker, try again shortly.", inline=False)
+        
         # Add warning message about data accuracy
         embed.add_field(name="⚠️ Data Accuracy", value="Stock data may be delayed by up to 15 minutes. Always verify with official sources before making investment decisions.", inline=False)
         
@@ -388,13 +451,99 @@ async def stock(message: discord.Interaction, ticker: str):
         print(f"Stock command error: {e}")
         await message.followup.send(f"⚠️ {str(e)}")
 
+@commands.command(name="stocks", description="Get prices for several tickers at once")
+@app_commands.describe(tickers="Ticker symbols separated by spaces or commas (e.g., AAPL MSFT NVDA)")
+async def stocks(message: discord.Interaction, tickers: str):
+    """Fetch a compact price overview for up to 25 tickers in one embed."""
+    try:
+        await message.response.defer()
+        symbols = tickers.replace(",", " ").split()
+        results, skipped = await stock_handler.get_stocks_batch(symbols)
+        
+        if not results:
+            await message.followup.send("❌ Please provide at least one ticker symbol.")
+            return
+        
+        embed = discord.Embed(title="📊 Stock Overview", color=discord.Color.blue())
+        for ticker, stock_info in results.items():
+            if not stock_info:
+                value = "Rate limit reached, try again shortly" if ticker in skipped else "No data found"
+                embed.add_field(name=f"❔ {ticker}", value=value, inline=True)
+                continue
+            
+            change = stock_info.get("change_percent")
+            if isinstance(change, (int, float)):
+                emoji = "📈" if change >= 0 else "📉"
+                change_text = f" ({change:+.2f}%)"
+            else:
+                emoji = "💲"
+                change_text = ""
+            price = stock_info.get("price", "N/A")
+            price_text = f"${price}{change_text}" if price != "N/A" else "Price unavailable"
+            name = stock_info.get("name", "N/A")
+            embed.add_field(
+                name=f"{emoji} {ticker}",
+                value=f"{price_text}\n{name}" if name != "N/A" else price_text,
+                inline=True
+            )
+        
+        if len(symbols) > stock_handler.BATCH_MAX_TICKERS:
+            embed.description = f"Showing the first {stock_handler.BATCH_MAX_TICKERS} tickers."
+        
+        usage = stock_handler.get_api_usage()
+        embed.set_footer(text=f"API Calls: {usage['calls_this_minute']}/{usage['limit']} this minute | Total: {usage['total_calls']}")
+        await message.followup.send(embed=embed)
+        
+    except Exception as e:
+        print(f"Stocks command error: {e}")
+        await message.followup.send(f"⚠️ {str(e)}")
+
+@commands.command(name="watch", description="Keep a ticker's quote refreshed for this server")
+@app_commands.describe(ticker="Stock ticker symbol (e.g., AAPL, MSFT)")
+async def watch(message: discord.Interaction, ticker: str):
+    """Add a ticker to this server's watchlist so /stock answers instantly."""
+    try:
+        if await stock_handler.watch_ticker(message.guild.id, ticker):
+            await message.response.send_message(f"👀 Watching **{ticker.upper()}**.")
+        else:
+            await message.response.send_message(f"❌ Watchlist is full ({stock_handler.WATCHLIST_MAX} tickers). Remove one with /unwatch first.")
+    except Exception as e:
+        print(f"Watch command error: {e}")
+        await message.response.send_message("⚠️ An error has occurred.")
+
+@commands.command(name="unwatch", description="Stop refreshing a ticker for this server")
+@app_commands.describe(ticker="Stock ticker symbol to remove from the watchlist")
+async def unwatch(message: discord.Interaction, ticker: str):
+    """Remove a ticker from this server's watchlist."""
+    try:
+        if await stock_handler.unwatch_ticker(message.guild.id, ticker):
+            await message.response.send_message(f"🙈 Stopped watching **{ticker.upper()}**.")
+        else:
+            await message.response.send_message(f"❌ **{ticker.upper()}** is not on the watchlist.")
+    except Exception as e:
+        print(f"Unwatch command error: {e}")
+        await message.response.send_message("⚠️ An error has occurred.")
+
+@commands.command(name="watchlist", description="List this server's watched tickers")
+async def watchlist(message: discord.Interaction):
+    """Show the tickers this server is watching."""
+    try:
+        tickers = stock_handler.get_watchlist(message.guild.id)
+        if tickers:
+            await message.response.send_message(f"👀 Watching: {', '.join(tickers)}")
+        else:
+            await message.response.send_message("The watchlist is empty. Add tickers with /watch.")
+    except Exception as e:
+        print(f"Watchlist command error: {e}")
+        await message.response.send_message("⚠️ An error has occurred.")
+
 @commands.command(name="stocksearch", description="Search for stocks by company name")
 @app_commands.describe(query="Company name or partial ticker to search for")
 async def stocksearch(message: discord.Interaction, query: str):
     """Search for stocks by company name or ticker."""
     try:
         await message.response.defer()
-        results = stock_handler.search_stocks(query)
+        results = await stock_handler.search_stocks_async(query)
         
         if not results:
             await message.followup.send(f"❌ No results found for **{query}**.")
@@ -444,14 +593,19 @@ mcstatus - Provides the status of the server
 mcip - Provides the IP of the server
 ========================
 ***Music***
-play - Given a search query, youtube playlist/song, or spotify playlist/song, plays music
+play - Given a search query, youtube playlist/song, or spotify playlist/album/artist/song, plays music
+       (queue several songs at once by separating them with ;)
 queue - Provides a list of songs in queue
+remove / move - Remove a song from the queue or move it to another position
 pause - Pauses the current song
 resume - Resumes the current paused song
-stop - Stops the current and clears the queue
+stop - Stops the current and clears the queue (the bot stays in the channel for a few minutes)
+leave - Stops the music and leaves the voice channel
 ========================
 ***Stock Market Data***
 stock - Get current stock price and information by ticker symbol
+stocks - Get prices for several tickers at once
+watch / unwatch / watchlist - Keep quotes for this server's favorite tickers refreshed
 stocksearch - Search for stocks by company name
 apistatus - Check current API usage and rate limit status
 ========================
@@ -462,4 +616,13 @@ mtg - Search for Magic: The Gathering card information
         print(f"Help command error: {e}")
         await message.channel.send("⚠️ An error has occurred.")
 
-client.run(TOKEN)
+async def run_bot():
+    """Run the bot until it shuts down, then close the pooled HTTP sessions."""
+    discord.utils.setup_logging()
+    async with client:
+        try:
+            await client.start(TOKEN)
+        finally:
+            await http_session.close_all()
+
+asyncio.run(run_bot())
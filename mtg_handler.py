@@ -4,8 +4,25 @@ from io import BytesIO
 import requests
 import discord
 
-# Function to fetch MTG cards by name
+import cache_handler
+
+# Card lookups survive restarts; prices are refreshed once a day
+CARD_TTL = 24 * 60 * 60  # seconds
+_card_cache = cache_handler.TieredCache("mtg", max_size=500)
+
+# Function to fetch MTG cards by name, served from the card cache when possible
 def fetch_cards_by_name(name):
+    key = name.strip().lower()
+    card_details = _card_cache.get(key)
+    if card_details:
+        return card_details
+
+    card_details = _fetch_card_details(name)
+    if card_details:
+        _card_cache.set(key, card_details, CARD_TTL)
+    return card_details
+
+def _fetch_card_details(name):
     
     card_details = {}
     try:
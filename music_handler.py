@@ -1,22 +1,102 @@
 from dotenv import load_dotenv
 import os
 import discord
-from spotipy.oauth2 import SpotifyClientCredentials
-import spotipy
 import asyncio
 import yt_dlp as youtube_dl;
-import random
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+import cache_handler
+import spotify_handler
+from music_queue import GuildQueue, Track
 
 
 #Initilizng and grabing important variables
 load_dotenv()
-SP_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SP_CLIENT_SC = os.getenv("SPOTIFY_CLIENT_SECRET")
-sp = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(client_id=SP_CLIENT_ID, client_secret=SP_CLIENT_SC))
 
 #Global Variables
 embed_ctx = {}
-queue = {}
+queue = {}  # guild_id -> GuildQueue
+
+# Bounded worker pool that every blocking yt-dlp call goes through
+EXTRACT_WORKERS = int(os.getenv("YTDL_WORKERS", "4"))
+EXTRACT_TIMEOUT = float(os.getenv("YTDL_TIMEOUT", "30"))  # seconds one extraction may run once a worker picks it up
+EXTRACT_QUEUE_TIMEOUT = float(os.getenv("YTDL_QUEUE_TIMEOUT", "60"))  # seconds a caller waits for a free worker
+_extract_executor = ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="yt-dlp")
+_extract_pending = 0  # extractions submitted and not finished yet (running + queued), including ones whose caller timed out
+_extract_pending_lock = threading.Lock()
+_extract_timeouts = 0  # extractions that ran longer than EXTRACT_TIMEOUT
+_extract_queue_timeouts = 0  # extractions dropped because no worker was free within EXTRACT_QUEUE_TIMEOUT
+
+# Look-ahead resolution of upcoming queue entries
+PREFETCH_COUNT = int(os.getenv("MUSIC_PREFETCH", "2"))  # queued songs resolved ahead of time
+_prefetch_tasks = {}  # guild_id -> running prefetch task
+_resolving = {}  # search query -> in-flight resolve task, shared by playback and prefetch
+
+# Playback
+PLAYBACK_MODE = os.getenv("MUSIC_PLAYBACK_MODE", "opus").lower()  # "opus" (pass Opus streams through) or "pcm"
+_players = {}  # guild_id -> player task that plays the queue one song after another
+_skipped = set()  # guild_ids whose current song was ended on purpose (/next), so an early end isn't a failure
+
+# Streaming playlist ingestion
+PLAYLIST_CHUNK = 25  # entries handed to the queue at a time while a playlist is still being read
+_ingest_tasks = {}  # guild_id -> set of background ingestion tasks
+
+# Voice sessions: the bot stays in its channel for a while after the music stops, so the next /play skips the handshake
+VOICE_IDLE_GRACE = float(os.getenv("MUSIC_IDLE_GRACE", "300"))  # seconds an idle bot stays connected
+VOICE_HEALTH_INTERVAL = 15  # seconds between connection checks while idle
+VOICE_CONNECT_TIMEOUT = 10  # seconds to wait for a (re)connect
+_voice_channels = {}  # guild_id -> voice channel of the current session
+_idle_timers = {}  # guild_id -> task that leaves once the guild has been idle for VOICE_IDLE_GRACE
+
+# Several songs in one /play, separated by ";" or new lines
+MULTI_PLAY_MAX = int(os.getenv("MUSIC_MULTI_MAX", "25"))  # entries taken from one /play
+
+# Resolved stream urls, keyed by YouTube video id or normalized search query
+STREAM_CACHE_SIZE = 512  # entries
+STREAM_DEFAULT_TTL = 60 * 60  # seconds, for urls without an expire= timestamp
+STREAM_EXPIRY_MARGIN = 10 * 60  # seconds before expire= that a url stops being reused
+EARLY_END_SECONDS = 3  # a song ending this fast most likely hit an expired url (HTTP 403)
+_stream_cache = cache_handler.TTLCache(STREAM_CACHE_SIZE)
+_stale_retries = set()  # stream keys already re-resolved once after an early end
+
+# Optional on-disk cache of frequently played songs, saved as Opus files named by video id
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "")  # empty disables the audio cache
+AUDIO_CACHE_MAX_BYTES = int(float(os.getenv("AUDIO_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv("AUDIO_CACHE_MIN_PLAYS", "2"))  # plays before a song is saved
+AUDIO_CACHE_MAX_FILE = 50 * 1024 * 1024  # bytes, keeps hour-long mixes out of the cache
+PLAY_COUNT_TTL = 30 * 24 * 60 * 60  # seconds a song's play count is remembered
+_play_counts = cache_handler.TieredCache("audio_plays", max_size=5000)
+_audio_downloads = {}  # video id -> running download task
+_audio_download_slot = asyncio.Semaphore(1)  # one download at a time, so interactive extractions keep their workers
+
+# Spotify track id -> YouTube video id it was matched to, so each Spotify track is searched for only once
+SPOTIFY_MATCH_TTL = 90 * 24 * 60 * 60  # seconds
+_spotify_matches = cache_handler.TieredCache("spotify_yt", max_size=5000)
+
+# Now playing embed updates
+EMBED_UPDATE_INTERVAL = float(os.getenv("MUSIC_EMBED_INTERVAL", "1.5"))  # minimum seconds between edits of one embed
+_embed_dirty = set()  # guild_ids whose embed changed since its last edit
+_embed_last_edit = {}  # guild_id -> (interaction whose message was edited, monotonic time)
+_embed_flush_tasks = {}  # guild_id -> task that applies the latest embed once the interval has passed
+
+# Link classification for /play
+ParsedLink = namedtuple("ParsedLink", ["kind", "id", "url"])  # url is the canonical link for the id
+SPOTIFY_HOSTS = ("open.spotify.com", "play.spotify.com")
+SPOTIFY_SHARE_HOSTS = ("spotify.link", "spotify.app.link")  # App share links, a redirect to an open.spotify.com link
+SPOTIFY_KINDS = ("track", "album", "playlist", "artist")
+YOUTUBE_HOSTS = ("youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com")
+YOUTUBE_VIDEO_PATHS = ("shorts", "live", "embed", "v")  # /<path>/<video id>
+
+# /queue pagination
+QUEUE_PAGE_SIZE = 15  # songs per page
+QUEUE_TITLE_MAX = 100  # characters shown per title, keeps a page well under Discord's 2000 limit
+QUEUE_VIEW_TIMEOUT = 5 * 60  # seconds the page buttons stay active
+
 # ✅ FFmpeg Settings for Stable Playback
 FFMPEG_OPTIONS = {
     'before_options': (
@@ -28,9 +108,14 @@ FFMPEG_OPTIONS = {
     ),
     'options': '-vn'  # Disables video processing, ensuring only audio is used
 }
+# FFmpeg settings for files from the audio cache (no network, so no reconnect options)
+LOCAL_FFMPEG_OPTIONS = {
+    'before_options': '-nostdin -loglevel panic',
+    'options': '-vn'
+}
 # yt-dlp options for optimal audio extraction and search functionality
 ydl_opts = {
-    'format': 'bestaudio/best',  # Ensures the highest quality audio is used
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',  # Prefers Opus audio (playable without re-encoding), then the best available
     'default_search': 'ytsearch',  # Uses YouTube search if a direct link is not provided
     'source_address': '0.0.0.0',  # Avoids IP bans by binding to all available network interfaces
     'quiet': True,  # Prevents excessive logging from yt-dlp
@@ -45,6 +130,22 @@ ydl_opts = {
     'nocheckcertificate': True,  # Bypasses SSL certificate verification to avoid connection issues
     'skip_download': True,  # Ensures yt-dlp only fetches URLs, without downloading files
 }
+# yt-dlp options for playlists: list ids and titles only, songs are resolved when they come up
+flat_ydl_opts = {
+    **ydl_opts,
+    'extract_flat': 'in_playlist',  # Don't resolve every entry up front
+}
+# yt-dlp options for saving a song to the audio cache
+audio_cache_ydl_opts = {
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',
+    'quiet': True,
+    'noplaylist': True,
+    'max_filesize': AUDIO_CACHE_MAX_FILE,
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',  # Opus sources are only remuxed, anything else is converted once
+        'preferredcodec': 'opus',
+    }],
+}
 
 async def shuffle_queue(message: discord.Interaction):
     """Shuffles the current music queue for the guild."""
@@ -53,27 +154,31 @@ async def shuffle_queue(message: discord.Interaction):
         await message.channel.send("🎵 The queue is currently empty. Nothing to shuffle.")
         return
 
-    random.shuffle(queue[message.guild.id])
+    queue[message.guild.id].shuffle()
     await message.channel.send("🔀 Queue shuffled.")
 async def get_voice_client(interaction: discord.Interaction):
-    """Safely gets or connects the bot to the user's voice channel."""
+    """Safely gets or connects the bot to the user's voice channel, reusing the guild's voice session if it has one."""
     
     if not interaction.user.voice or not interaction.user.voice.channel:
         await interaction.channel.send("❌ You must be in a voice channel.")
         return None
 
+    cancel_idle_disconnect(interaction.guild.id)
+    channel = interaction.user.voice.channel
     voice_client = discord.utils.get(interaction.client.voice_clients, guild=interaction.guild)
 
     # Already connected
     if voice_client and voice_client.is_connected():
         # Move if in different channel
-        if voice_client.channel != interaction.user.voice.channel:
-            await voice_client.move_to(interaction.user.voice.channel)
+        if voice_client.channel != channel:
+            await voice_client.move_to(channel)
+        _voice_channels[interaction.guild.id] = channel
         return voice_client
 
     # Not connected — connect safely
     try:
-        voice_client = await interaction.user.voice.channel.connect(reconnect=True)
+        voice_client = await connect_voice(voice_client, channel)
+        _voice_channels[interaction.guild.id] = channel
         return voice_client
     except Exception as e:
         print(f"Voice connection error: {e}")
@@ -81,94 +186,652 @@ async def get_voice_client(interaction: discord.Interaction):
         return None
 
 
+#METHOD VOICE_SESSION    ======Helpers======         ==============================================
+async def connect_voice(voice_client, channel):
+    """Connects to a channel, first dropping a voice client whose connection has died."""
+    if voice_client:
+        try:
+            await voice_client.disconnect(force=True)
+        except Exception as e:
+            print(f"Voice cleanup error: {e}")
+    return await asyncio.wait_for(channel.connect(reconnect=True), VOICE_CONNECT_TIMEOUT)
+
+
+async def ensure_voice(guild, client):
+    """
+    Returns a connected voice client for the guild's session, reconnecting to the session's channel
+    if the connection dropped. Returns None if the guild has no session or reconnecting fails.
+    """
+    voice_client = discord.utils.get(client.voice_clients, guild=guild)
+    if voice_client is None:
+        # No client at all means the bot was disconnected on purpose (kicked or moved out), end the session
+        _voice_channels.pop(guild.id, None)
+        return None
+    if voice_client.is_connected():
+        return voice_client
+    channel = _voice_channels.get(guild.id)
+    if channel is None:
+        return None
+    try:
+        print(f"Voice connection in {guild.id} dropped, reconnecting")
+        return await connect_voice(voice_client, channel)
+    except Exception as e:
+        print(f"Voice reconnect error: {e}")
+        return None
+
+
+def schedule_idle_disconnect(message: discord.Interaction):
+    """Leaves the guild's voice channel after VOICE_IDLE_GRACE seconds unless something is played before then."""
+    cancel_idle_disconnect(message.guild.id)
+    _idle_timers[message.guild.id] = asyncio.ensure_future(_idle_disconnect(message.guild, message.client))
+
+
+def cancel_idle_disconnect(guild_id):
+    task = _idle_timers.pop(guild_id, None)
+    if task:
+        task.cancel()
+
+
+#Helper: Keeps an idle session healthy during the grace period, then leaves
+async def _idle_disconnect(guild, client):
+    deadline = time.monotonic() + VOICE_IDLE_GRACE
+    while (remaining := deadline - time.monotonic()) > 0:
+        await asyncio.sleep(min(VOICE_HEALTH_INTERVAL, remaining))
+        voice_client = discord.utils.get(client.voice_clients, guild=guild)
+        if voice_client is None:
+            break  # Disconnected from outside (kicked or /leave), the session is over
+        if not voice_client.is_connected() and deadline - time.monotonic() > VOICE_HEALTH_INTERVAL:
+            await ensure_voice(guild, client)
+
+    if _idle_timers.get(guild.id) is asyncio.current_task():
+        del _idle_timers[guild.id]
+    _voice_channels.pop(guild.id, None)
+    voice_client = discord.utils.get(client.voice_clients, guild=guild)
+    if voice_client:
+        await voice_client.disconnect()
+
+
 #Helper: Query search function for yt-dlp
 def run_yt_dlp_search(query):
     with youtube_dl.YoutubeDL(ydl_opts) as ydl:
         return ydl.extract_info(query, download=False)
 
 
-#Handler: Processes a search query and returns the direct streaming URL of the best match
-async def handle_single_song(message, query):
+#Helper: Submits a blocking call to the extraction pool, counted in _extract_pending until its thread is done
+def _submit_extraction(fn, *args):
+    """Returns (job, started): the pool's future and an asyncio.Event that is set once a worker picks the job up."""
+    global _extract_pending
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def run():
+        loop.call_soon_threadsafe(started.set)
+        return fn(*args)
+
+    with _extract_pending_lock:
+        _extract_pending += 1
+    job = _extract_executor.submit(run)
+    # Count the job until its thread is really done (or it is cancelled while queued); a timed out extraction keeps its worker busy
+    job.add_done_callback(_extraction_finished)
+    return job, started
+
+
+#Helper: Runs a blocking yt-dlp call on the extraction pool so the event loop (and voice) never stalls
+async def extract_info(query):
+    """
+    Runs run_yt_dlp_search on the bounded extraction pool. Gives up if no worker is free within
+    EXTRACT_QUEUE_TIMEOUT seconds, or once the extraction has run for EXTRACT_TIMEOUT seconds.
+    """
+    global _extract_timeouts, _extract_queue_timeouts
+    job, started = _submit_extraction(run_yt_dlp_search, query)
+    try:
+        await asyncio.wait_for(started.wait(), EXTRACT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        # Drop the job if it is still queued; if a worker picked it up just now, wait for it as usual
+        if job.cancel():
+            _extract_queue_timeouts += 1
+            raise
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(job), EXTRACT_TIMEOUT)
+    except asyncio.TimeoutError:
+        _extract_timeouts += 1
+        raise
+
+
+def _extraction_finished(job):
+    global _extract_pending
+    with _extract_pending_lock:
+        _extract_pending -= 1
+
+
+#Helper: Walks a playlist lazily (ids and titles only) and hands entries over in chunks; runs on a pool thread
+def run_yt_dlp_flat_playlist(link, on_chunk):
+    with youtube_dl.YoutubeDL(flat_ydl_opts) as ydl:
+        info = ydl.extract_info(link, download=False, process=False)
+        # Links like watch?v=..&list=.. redirect to the playlist itself
+        while info and info.get('_type') in ('url', 'url_transparent'):
+            info = ydl.extract_info(info['url'], download=False, process=False)
+
+        chunk = []
+        for entry in (info or {}).get('entries') or []:
+            if entry:
+                chunk.append(entry)
+            if len(chunk) >= PLAYLIST_CHUNK:
+                if not on_chunk(chunk):
+                    return
+                chunk = []
+        if chunk:
+            on_chunk(chunk)
+
+
+#Helper: Async iterator over a playlist's entry chunks, fed by run_yt_dlp_flat_playlist on the extraction pool
+async def flat_playlist_pages(link):
+    loop = asyncio.get_running_loop()
+    pages = asyncio.Queue()
+    stop = threading.Event()
+
+    def on_chunk(chunk):
+        loop.call_soon_threadsafe(pages.put_nowait, chunk)
+        return not stop.is_set()
+
+    job, _ = _submit_extraction(run_yt_dlp_flat_playlist, link, on_chunk)
+    job.add_done_callback(lambda _: loop.call_soon_threadsafe(pages.put_nowait, None))
+    try:
+        while True:
+            chunk = await pages.get()
+            if chunk is None:
+                break
+            yield chunk
+        await asyncio.wrap_future(job)
+    finally:
+        # Stop reading the playlist if nobody wants the rest (e.g. the queue was cleared)
+        stop.set()
+
+
+def extraction_stats():
+    """Returns worker count, running/queued extraction counts and run/queue timeouts for the extraction pool."""
+    running = min(_extract_pending, EXTRACT_WORKERS)
+    return {
+        "workers": EXTRACT_WORKERS,
+        "running": running,
+        "queued": _extract_pending - running,
+        "timeouts": _extract_timeouts,
+        "queue_timeouts": _extract_queue_timeouts,
+    }
+
+
+#Helper: The YouTube video id in a link, or None for search text and other links
+def youtube_video_id(query):
+    match = re.search(r"(?:[?&]v=|youtu\.be/|/shorts/)([\w-]{11})", query)
+    return match.group(1) if match else None
+
+
+#Helper: Cache key for a search query or YouTube link, so the same song maps to one entry
+def stream_cache_key(query):
+    video_id = youtube_video_id(query)
+    if video_id:
+        return f"yt:{video_id}"
+    return "q:" + " ".join(query.lower().split())
+
+
+#Helper: Seconds a stream url can safely be reused, based on googlevideo's expire= timestamp
+def stream_url_ttl(url):
+    expire = parse_qs(urlparse(url).query).get("expire")
+    if not expire:
+        match = re.search(r"/expire/(\d+)", url)
+        expire = [match.group(1)] if match else None
+    if not expire:
+        return STREAM_DEFAULT_TTL
+    try:
+        return float(expire[0]) - time.time() - STREAM_EXPIRY_MARGIN
+    except ValueError:
+        return STREAM_DEFAULT_TTL
+
+
+def cache_stream(query, info):
+    """Stores resolved stream info ({url, thumbnail, title, acodec, id}) for a query until shortly before its url expires."""
+    ttl = stream_url_ttl(info["url"])
+    if ttl > 0:
+        _stream_cache.set(stream_cache_key(query), info, ttl)
+
+
+def evict_stream(query):
+    """Forgets the cached stream for a query (e.g. after ffmpeg was refused an expired url)."""
+    _stream_cache._data.pop(stream_cache_key(query), None)
+
+
+#Helper: Display title for a yt-dlp video entry ("title - uploader"), used for every video so cached info agrees
+def video_title(entry):
+    title = entry.get("title")
+    author = entry.get("uploader") or entry.get("channel")
+    return f"{title} - {author}" if title and author else title
+
+
+#Helper: Resolves a search query or video link to stream info ({url, thumbnail, title, acodec, id}), or None if nothing matched
+async def _resolve_query(query):
+    # Use YouTube search instead of direct link
+    video_info = await extract_info(query)
+
+    # Ensure a valid result exists (a direct video link returns the video itself, a search returns entries)
+    if not video_info or ("entries" in video_info and not video_info["entries"]):
+        return None
+
+    # Extract the first result
+    best_match = video_info["entries"][0] if "entries" in video_info else video_info
+    if not best_match.get("url"):  # Direct streaming URL
+        return None
+    info = {
+        "url": best_match["url"],
+        "thumbnail": best_match.get("thumbnail"),  # Thumbnail URL for the embed
+        "title": video_title(best_match),
+        "acodec": best_match.get("acodec"),  # e.g. "opus"; lets playback skip re-encoding
+        "id": best_match.get("id"),  # YouTube video id, names the song in the audio cache
+    }
+    cache_stream(query, info)
+    return info
+
+
+async def resolve_query(query):
+    """
+    Resolves a search query, serving it from the stream cache when possible and otherwise
+    sharing one extraction between concurrent callers (playback and prefetch).
+    """
+    cached = _stream_cache.get(stream_cache_key(query))
+    if cached:
+        return cached
+
+    task = _resolving.get(query)
+    if task is None:
+        task = asyncio.ensure_future(_resolve_query(query))
+        _resolving[query] = task
+        task.add_done_callback(lambda done: _resolving.pop(query, None) if _resolving.get(query) is done else None)
+    return await asyncio.shield(task)
+
+
+async def track_query(track):
+    """
+    Returns what to resolve for a track: the YouTube video it already matched (looked up by
+    Spotify track id for Spotify tracks) or, the first time, its search query.
+    """
+    if track.spotify_id and not track.video_id:
+        track.video_id = await _spotify_matches.get_async(track.spotify_id)
+    if track.video_id:
+        return f"https://www.youtube.com/watch?v={track.video_id}"
+    return track.query
+
+
+async def resolve_track(track):
+    """
+    Resolves a track's stream info, or None if nothing matched. If the video a track was matched to
+    no longer resolves (removed or region-blocked), the match is forgotten and its search query used instead.
+    """
+    query = await track_query(track)
+    if query == track.query:
+        return await resolve_query(query)
+    try:
+        info = await resolve_query(query)
+    except Exception as e:
+        print(f"Matched video for {track.title} failed: {e}")
+        info = None
+    if info:
+        return info
+    await forget_match(track)
+    return await resolve_query(track.query)
+
+
+async def forget_match(track):
+    """Drops the video a track was matched to, so it is searched for again."""
+    if track.spotify_id:
+        await _spotify_matches.delete_async(track.spotify_id)
+    track.video_id = None
+
+
+async def apply_stream(track, info):
+    """Copies resolved stream info onto a Track, remembering which video a Spotify track matched."""
+    if track.spotify_id and not track.video_id and info.get("id"):
+        await _spotify_matches.set_async(track.spotify_id, info["id"], SPOTIFY_MATCH_TTL)
+    track.url = info["url"]
+    track.thumbnail = info.get("thumbnail")
+    track.codec = info.get("acodec")
+    track.video_id = info.get("id") or track.video_id
+
+
+#Handler: Resolves a queued track and returns the stream info of the best match
+async def handle_single_song(message, track):
     global queue
-    global ydl_opts
     try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            # Use YouTube search instead of direct link
-            video_info = run_yt_dlp_search(query)
-
-            # Ensure a valid result exists
-            if not video_info or "entries" not in video_info or not video_info["entries"]:
-                await message.channel.send("❌ No results found for the search query.")
-                return None
-
-            # Extract the first result
-            best_match = video_info["entries"][0]
-            url = best_match.get("url")  # Get direct streaming URL
-            thumbnail = best_match.get("thumbnail")  # Get thumbnail URL for potential embed use
-
-            # Return the streaming URL
-            return url, thumbnail
+        result = await resolve_track(track)
+
+        if not result:
+            await message.channel.send("❌ No results found for the search query.")
+            return None
+
+        # Return the streaming URL
+        return result
         
     except Exception as e:
         await message.channel.send("⚠️ An error occurred while searching for the song.")
         print(f"yt-dlp Error: {e}")
         return None
 
+#METHOD PREFETCH    ======Helpers======         ==============================================
+def schedule_prefetch(guild_id):
+    """Starts resolving the next PREFETCH_COUNT queued songs in the background if not already running."""
+    task = _prefetch_tasks.get(guild_id)
+    if PREFETCH_COUNT > 0 and (task is None or task.done()):
+        _prefetch_tasks[guild_id] = asyncio.ensure_future(_prefetch(guild_id))
+
+
+async def _prefetch(guild_id):
+    attempted = set()
+    while True:
+        guild_queue = queue.get(guild_id)
+        pending = [track for track in (guild_queue.peek(PREFETCH_COUNT) if guild_queue else [])
+                   if not track.resolved and id(track) not in attempted]
+        if not pending:
+            return
+
+        for track in pending:
+            attempted.add(id(track))
+            try:
+                result = await resolve_track(track)
+            except Exception as e:
+                print(f"Prefetch error for {track.title}: {e}")
+                continue
+            if not result:
+                continue
+
+            # Tracks are shared objects, so this lands wherever the track is now (even after a shuffle)
+            await apply_stream(track, result)
+
+
+#METHOD EMBED    ======Helpers======         ==============================================
+async def update_embed(guild_id):
+    """
+    Publishes the guild's now playing embed after a change. The first change is sent right away;
+    changes within EMBED_UPDATE_INTERVAL of an edit are merged into one trailing edit of the latest state.
+    """
+    _embed_dirty.add(guild_id)
+    task = _embed_flush_tasks.get(guild_id)
+    if task and not task.done():
+        return  # The pending edit reads the embed when it fires, so it already includes this change
+
+    entry = embed_ctx.get(guild_id)
+    ctx = entry[1] if entry else None
+    last_ctx, last_edit = _embed_last_edit.get(guild_id, (None, float("-inf")))
+    wait = last_edit + EMBED_UPDATE_INTERVAL - time.monotonic() if last_ctx is ctx else 0
+    if wait <= 0:
+        await _edit_embed(guild_id)
+    else:
+        _embed_flush_tasks[guild_id] = asyncio.ensure_future(_flush_embed_later(guild_id, wait))
+
+
+async def _flush_embed_later(guild_id, wait):
+    while True:
+        await asyncio.sleep(wait)
+        if guild_id not in _embed_dirty:
+            return
+        await _edit_embed(guild_id)
+        wait = EMBED_UPDATE_INTERVAL
+
+
+async def _edit_embed(guild_id):
+    _embed_dirty.discard(guild_id)
+    if not embed_ctx.get(guild_id):
+        return
+    embed, ctx = embed_ctx[guild_id]
+    _embed_last_edit[guild_id] = ctx, time.monotonic()
+    try:
+        await ctx.edit_original_response(embed=embed)
+    except Exception as e:
+        print(f"Embed update error: {e}")
+
+
+def cancel_embed_updates(guild_id):
+    """Drops any pending embed edit for a guild (e.g. when the embed is being removed)."""
+    _embed_dirty.discard(guild_id)
+    task = _embed_flush_tasks.pop(guild_id, None)
+    if task:
+        task.cancel()
+
+
 #METHOD PLAY_NEXT    ======Helpers======         ==============================================
 async def play_next(message: discord.Interaction):
-    global queue
-    global embed_ctx
-    embed, ctx = embed_ctx[message.guild.id]
-
+    """Makes sure the guild's player task is running; it keeps playing the queue until it runs out."""
     voice_client = discord.utils.get(message.client.voice_clients, guild=message.guild)
 
     if not voice_client or not voice_client.is_connected():
         return
 
-    if not queue[message.guild.id]:
-        await message.channel.send("🎵 The queue is empty.")
-        await ctx.edit_original_response(embed=None)
-        await voice_client.disconnect()
-        return
+    task = _players.get(message.guild.id)
+    if task is None or task.done():
+        _players[message.guild.id] = asyncio.ensure_future(_player_loop(message))
+
+
+#Helper: One long-lived loop per guild: take the next track, play it, wait for it to end, repeat
+async def _player_loop(message: discord.Interaction):
+    guild_id = message.guild.id
+    track_done = asyncio.Event()
+    loop = asyncio.get_running_loop()
 
-    item = queue[message.guild.id].pop(0)
+    def after_play(error):
+        # Runs on discord.py's audio thread; just wake the player up
+        if error:
+            print(f"Playback error: {error}")
+        loop.call_soon_threadsafe(track_done.set)
 
-    if len(item) == 4:
-        value, title, is_url, thumbnail = item
+    try:
+        while True:
+            voice_client = await ensure_voice(message.guild, message.client)
+            if not voice_client:
+                return
+
+            guild_queue = queue.get(guild_id)
+            track = guild_queue.next() if guild_queue else None
+            if track is None:
+                # Leave _players before awaiting anything, so a /play from here on starts a fresh player
+                _release_player(guild_id)
+                await _finish_playback(message)
+                return
+
+            try:
+                await track_query(track)  # Picks up the video a Spotify track was matched to, for the audio cache
+                path = cached_audio(track)
+                if not track.resolved and not path:
+                    result = await handle_single_song(message, track)
+                    if result:
+                        await apply_stream(track, result)
+                if not track.resolved and not path:
+                    continue
+
+                if embed_ctx.get(guild_id):
+                    embed, _ = embed_ctx[guild_id]
+                    embed.set_field_at(0, name="Song", value=track.title, inline=False)
+                    embed.set_image(url=track.thumbnail)
+                    await update_embed(guild_id)
+
+                track_done.clear()
+                _skipped.discard(guild_id)
+                started = time.monotonic()
+                source = await make_audio_source(track, path)
+                voice_client.play(source, after=after_play)
+                await record_play(track)
+
+                # Resolve the upcoming songs while this one plays
+                schedule_prefetch(guild_id)
+                await track_done.wait()
+                if not path and guild_id not in _skipped:
+                    retry_if_cut_short(guild_id, track, time.monotonic() - started)
+            except Exception as e:
+                print(f"Player error on {track.title}: {e}")
+    finally:
+        _release_player(guild_id)
+
+
+#Helper: Builds the audio source for a track according to PLAYBACK_MODE
+async def make_audio_source(track, path=None):
+    """
+    In "opus" mode Opus streams are passed through untouched (no decode and no re-encode in Python),
+    streams of unknown codec are probed first, and anything else falls back to PCM.
+    A path from the audio cache (always Opus) is played instead of the stream url.
+    """
+    if path:
+        if PLAYBACK_MODE == "opus":
+            return discord.FFmpegOpusAudio(path, codec="copy", **LOCAL_FFMPEG_OPTIONS)
+        return discord.FFmpegPCMAudio(path, **LOCAL_FFMPEG_OPTIONS)
+    if PLAYBACK_MODE == "opus":
+        if track.codec == "opus":
+            return discord.FFmpegOpusAudio(track.url, codec="copy", **FFMPEG_OPTIONS)
+        if not track.codec or track.codec == "none":
+            try:
+                return await discord.FFmpegOpusAudio.from_probe(track.url, **FFMPEG_OPTIONS)
+            except Exception as e:
+                print(f"Codec probe failed for {track.title}, playing as PCM: {e}")
+    return discord.FFmpegPCMAudio(track.url, **FFMPEG_OPTIONS)
+
+
+def _release_player(guild_id):
+    if _players.get(guild_id) is asyncio.current_task():
+        del _players[guild_id]
+
+
+async def _finish_playback(message):
+    await message.channel.send("🎵 The queue is empty.")
+    cancel_embed_updates(message.guild.id)
+    if embed_ctx.get(message.guild.id):
+        await embed_ctx[message.guild.id][1].edit_original_response(embed=None)
+    # Stay connected for a while so the next /play starts right away
+    schedule_idle_disconnect(message)
+
+
+def stop_player(guild_id):
+    """Stops a guild's player task (the current song keeps going until the voice client is stopped)."""
+    task = _players.pop(guild_id, None)
+    if task:
+        task.cancel()
+
+
+#Helper: Re-queues a song once with a fresh url if it died right away (expired stream url)
+def retry_if_cut_short(guild_id, track, elapsed):
+    key = stream_cache_key(track.query)
+    if elapsed < EARLY_END_SECONDS and key not in _stale_retries:
+        print(f"{track.title} ended after {elapsed:.1f}s, re-resolving its stream url")
+        _stale_retries.add(key)
+        evict_stream(track.query)
+        if track.video_id:
+            evict_stream(f"https://www.youtube.com/watch?v={track.video_id}")
+        track.url = None
+        queue.setdefault(guild_id, GuildQueue()).appendleft(track)
     else:
-        value, title, is_url = item
-        thumbnail = None
+        _stale_retries.discard(key)
 
 
-    if not is_url:
-        value, thumbnail = await handle_single_song(message, value)
+#METHOD AUDIO_CACHE    ======Helpers======         ===============================================
+def audio_cache_path(video_id):
+    return os.path.join(AUDIO_CACHE_DIR, f"{video_id}.opus")
 
-    if not value:
-        await play_next(message)
+
+def cached_audio(track):
+    """Returns the saved audio file for a track (marking it recently used), or None if there isn't one."""
+    video_id = track.video_id or youtube_video_id(track.query)
+    if not AUDIO_CACHE_DIR or not video_id:
+        return None
+    path = audio_cache_path(video_id)
+    try:
+        os.utime(path)  # Eviction drops the least recently touched files first
+    except OSError:
+        return None
+    if not track.thumbnail:
+        track.thumbnail = f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
+    return path
+
+
+async def record_play(track):
+    """Counts a play and saves the song to the audio cache once it reaches AUDIO_CACHE_MIN_PLAYS."""
+    video_id = track.video_id or youtube_video_id(track.query)
+    if not AUDIO_CACHE_DIR or not video_id:
         return
+    plays = (await _play_counts.get_async(video_id) or 0) + 1
+    await _play_counts.set_async(video_id, plays, PLAY_COUNT_TTL)
+    if plays < AUDIO_CACHE_MIN_PLAYS or video_id in _audio_downloads or os.path.exists(audio_cache_path(video_id)):
+        return
+    task = asyncio.ensure_future(_save_audio(video_id))
+    _audio_downloads[video_id] = task
+    task.add_done_callback(lambda _: _audio_downloads.pop(video_id, None))
 
-    embed.set_field_at(0, name="Song", value=title, inline=False)
-    embed.set_image(url=thumbnail)
-    await ctx.edit_original_response(embed=embed)
 
-    def after_play(error):
-        if error:
-            print(f"Playback error: {error}")
-        fut = asyncio.run_coroutine_threadsafe(
-            play_next(message),
-            message.client.loop
-        )
+async def _save_audio(video_id):
+    async with _audio_download_slot:
         try:
-            fut.result()
-        except:
+            await asyncio.wrap_future(_submit_extraction(run_yt_dlp_download, video_id)[0])
+            await asyncio.wrap_future(_submit_extraction(evict_audio_cache)[0])
+        except Exception as e:
+            print(f"Audio cache download failed for {video_id}: {e}")
+
+
+#Helper: Downloads one song into the audio cache; runs on a pool thread
+def run_yt_dlp_download(video_id):
+    # Download into a side folder and move the finished file in, so playback never sees a partial file
+    incoming = os.path.join(AUDIO_CACHE_DIR, ".incoming")
+    os.makedirs(incoming, exist_ok=True)
+    opts = {**audio_cache_ydl_opts, 'outtmpl': os.path.join(incoming, f"{video_id}.%(ext)s")}
+    try:
+        with youtube_dl.YoutubeDL(opts) as ydl:
+            ydl.download([f"https://www.youtube.com/watch?v={video_id}"])
+        downloaded = os.path.join(incoming, f"{video_id}.opus")
+        if os.path.exists(downloaded):
+            os.replace(downloaded, audio_cache_path(video_id))
+    finally:
+        # Failed or oversized downloads leave partial files and unconverted audio behind
+        for name in os.listdir(incoming):
+            if name.startswith(f"{video_id}."):
+                try:
+                    os.remove(os.path.join(incoming, name))
+                except OSError:
+                    pass
+
+
+def evict_audio_cache():
+    """
+    Deletes the least recently played files until the audio cache fits in AUDIO_CACHE_MAX_BYTES.
+    Anything left in .incoming counts too and goes first; downloads hold _audio_download_slot
+    while this runs, so nothing there is still being written.
+    """
+    files = []
+    with os.scandir(AUDIO_CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.name.endswith(".opus"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+    try:
+        with os.scandir(os.path.join(AUDIO_CACHE_DIR, ".incoming")) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files.append((float("-inf"), entry.stat().st_size, entry.path))
+    except FileNotFoundError:
+        pass
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= AUDIO_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
             pass
 
-    source = discord.FFmpegPCMAudio(value, **FFMPEG_OPTIONS)
-    voice_client.play(source, after=after_play)
 
+#METHOD SKIP    ======Helpers======         ===============================================
+async def skip(message: discord.Interaction):
+    """Ends the current song so the player moves on to the next one in the queue."""
+    voice_client = discord.utils.get(message.client.voice_clients, guild=message.guild)
 
-    
-        
+    if voice_client and (voice_client.is_playing() or voice_client.is_paused()):
+        _skipped.add(message.guild.id)
+        voice_client.stop()
+    else:
+        await message.channel.send("❌ No music is currently playing.")
 
 
 #METHOD PAUSE    ======Helpers======         ===============================================
@@ -199,54 +862,179 @@ async def resume(message: discord.Interaction):
 
 #METHOD SHOW_QUEUE    ======Helpers======         ===============================================
 async def show_queue(message: discord.Interaction):
-    """Displays the current music queue."""
+    """Displays the first page of the music queue, with buttons to page through the rest."""
     global queue
-    if not queue[message.guild.id]:
+    guild_queue = queue.get(message.guild.id)
+    if not guild_queue:
         await message.channel.send("🎵 The queue is currently empty.")
         return
 
-    response = "**🎶 Current Queue:**\n"
-    for i, (url, title, value) in enumerate(queue[message.guild.id], start=1):
-        response += f"`{i}.` {title}\n"
+    if len(guild_queue) <= QUEUE_PAGE_SIZE:
+        await message.channel.send(render_queue_page(guild_queue, 0))
+        return
+
+    view = QueuePageView(message.guild.id)
+    view.message = await message.channel.send(render_queue_page(guild_queue, 0), view=view)
+
+
+#Helper: Renders one page of a queue; only that page's tracks are read, so big queues stay cheap
+def render_queue_page(guild_queue, page):
+    pages = max(1, -(-len(guild_queue) // QUEUE_PAGE_SIZE))
+    start = page * QUEUE_PAGE_SIZE
+    lines = [f"**🎶 Current Queue** (page {page + 1}/{pages}, {len(guild_queue)} songs)"]
+    for i, track in enumerate(guild_queue.snapshot(start, start + QUEUE_PAGE_SIZE), start=start + 1):
+        title = track.title if len(track.title) <= QUEUE_TITLE_MAX else track.title[:QUEUE_TITLE_MAX - 1] + "…"
+        lines.append(f"`{i}.` {title}")
+    return "\n".join(lines)
+
+
+class QueuePageView(discord.ui.View):
+    """Previous/next buttons under a /queue message; each click edits that message in place."""
+
+    def __init__(self, guild_id):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.guild_id = guild_id
+        self.page = 0
+        self.message = None
+
+    def page_count(self):
+        return max(1, -(-len(queue.get(self.guild_id) or ()) // QUEUE_PAGE_SIZE))
+
+    async def show_page(self, interaction: discord.Interaction, page):
+        guild_queue = queue.get(self.guild_id)
+        if not guild_queue:
+            await interaction.response.edit_message(content="🎵 The queue is currently empty.", view=None)
+            self.stop()
+            return
+        # The queue keeps changing while the message is up, so clamp to the pages that exist now
+        self.page = min(max(page, 0), self.page_count() - 1)
+        await interaction.response.edit_message(content=render_queue_page(guild_queue, self.page), view=self)
+
+    @discord.ui.button(label="◀ Prev", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+#METHOD REMOVE / MOVE    ======Helpers======         ===============================================
+async def remove_from_queue(message: discord.Interaction, position: int):
+    """Removes the song at a 1-based queue position."""
+    guild_queue = queue.get(message.guild.id)
+    try:
+        if position < 1:
+            raise IndexError
+        track = guild_queue.remove(position - 1)
+    except (AttributeError, IndexError):
+        await message.channel.send(f"❌ There is no song at position {position}.")
+        return
+    await message.channel.send(f"🗑️ Removed `{position}.` {track.title}")
+
 
-    await message.channel.send(response)
+async def move_in_queue(message: discord.Interaction, source: int, destination: int):
+    """Moves the song at one 1-based queue position to another."""
+    guild_queue = queue.get(message.guild.id)
+    try:
+        if source < 1 or destination < 1:
+            raise IndexError
+        track = guild_queue.move(source - 1, destination - 1)
+    except (AttributeError, IndexError):
+        await message.channel.send("❌ Both positions must be songs in the queue.")
+        return
+    await message.channel.send(f"↕️ Moved {track.title} to position {destination}.")
+    schedule_prefetch(message.guild.id)
 
 
 #METHOD CLEAR_QUEUE    ======Helpers======         ===============================================
 async def clear_queue(message: discord.Interaction):
-    global queue
-    queue[message.guild.id] = []
-    embed_ctx[message.guild.id] = None
+    """Stops the music and clears the queue; the bot stays in the channel until the idle grace period ends."""
+    _reset_music(message.guild.id)
 
     voice_client = discord.utils.get(message.client.voice_clients, guild=message.guild)
 
     if voice_client and voice_client.is_connected():
         if voice_client.is_playing() or voice_client.is_paused():
             voice_client.stop()
-        await voice_client.disconnect()
+        schedule_idle_disconnect(message)
         await message.channel.send("🛑 Music stopped. Queue cleared.")
     else:
         await message.channel.send("❌ The bot is not in a voice channel.")
 
 
+#METHOD LEAVE    ======Helpers======         ===============================================
+async def leave(message: discord.Interaction):
+    """Stops the music, clears the queue and leaves the voice channel right away."""
+    _reset_music(message.guild.id)
+    cancel_idle_disconnect(message.guild.id)
+    _voice_channels.pop(message.guild.id, None)
+
+    voice_client = discord.utils.get(message.client.voice_clients, guild=message.guild)
+
+    if voice_client:
+        if voice_client.is_playing() or voice_client.is_paused():
+            voice_client.stop()
+        await voice_client.disconnect()
+        await message.channel.send("👋 Left the voice channel.")
+    else:
+        await message.channel.send("❌ The bot is not in a voice channel.")
+
+
+#Helper: Forgets a guild's queue, embed and every background task working on them
+def _reset_music(guild_id):
+    global queue
+    queue.setdefault(guild_id, GuildQueue()).clear()
+    embed_ctx[guild_id] = None
+    cancel_embed_updates(guild_id)
+    stop_player(guild_id)
+    prefetch = _prefetch_tasks.pop(guild_id, None)
+    if prefetch:
+        prefetch.cancel()
+    cancel_ingest(guild_id)
+
+
 
 #METHOD handle_song_search    ======Helpers======         ===============================================   
 async def handle_song_search(message: discord.Interaction, query: str):
-    """Searches for a song on Spotify and returns a properly formatted query for YouTube search."""
+    """Searches for a song on Spotify and returns (YouTube search query, title, Spotify track id) for the best match."""
     
     global queue
-    result = sp.search(q=query, type="track", limit=1)
+    track_info = await spotify_handler.search_track(query)
 
-    if not result or not result["tracks"]["items"]:
+    if not track_info:
         await message.channel.send("❌ No results found for the search query.")
         return None
 
-    track_info = result["tracks"]["items"][0]
     track_name = track_info["name"]
     track_artist = ", ".join(artist["name"] for artist in track_info["artists"])  
     search_query = f"{track_name} {track_artist} Audio"
 
-    return search_query, f"{track_name} - {track_artist}", False  # ✅ Fix: Properly return search results
+    # The Spotify id lets the track reuse its matched video and the audio cache
+    return search_query, f"{track_name} - {track_artist}", track_info.get("id")
+
+
+#Helper: Turns a Spotify track object into an unresolved queue Track (YouTube search query, title)
+def spotify_track_to_item(track):
+    if not track or not track.get("name"):
+        return None
+    artists = ", ".join(artist["name"] for artist in track["artists"])
+    return Track(f"{track['name']} {artists} Audio", f"{track['name']} - {artists}", spotify_id=track.get("id"))
+
+
+#Helper: Async iterator over Spotify paging objects, starting from the page fetch_first() returns
+async def spotify_pages(fetch_first):
+    page = await fetch_first()
+    while page:
+        yield page["items"]
+        page = await spotify_handler.next_page(page)
 
 
 #METHOD SPOTIFY_SONG    ======Helpers======         ===============================================
@@ -255,103 +1043,319 @@ async def handle_spotify_song(message, link):
     global embed_ctx
     embed, ctx = embed_ctx[message.guild.id]
     try:
-        track_id = link.split("/track/")[1].split("?")[0]
-        track_info = sp.track(track_id)
+        link_info = parse_link(link)
+        if link_info.kind != "spotify_track":
+            raise ValueError(f"not a Spotify track link: {link}")
+        track_info = await spotify_handler.get_track(link_info.id)
+        if not track_info:
+            raise ValueError(f"unknown track {link_info.id}")
     except (IndexError, Exception) as e:
         await message.channel.send("❌ Invalid Spotify track link or failed to fetch details.")
         print(f"Spotify API Error: {e}")
         return
 
-    track_name = track_info["name"]
-    artists = ", ".join([artist["name"] for artist in track_info["artists"]])
-    search_query = f"{track_name} {artists} Audio"
-    title = f"{track_name} - {artists}"
-
-    queue[message.guild.id].append((search_query, title, False))
-    embed.set_field_at(1, name="Queued: ", value=f"✅ {title}", inline=True)
-    await ctx.edit_original_response(embed=embed)
+    track = spotify_track_to_item(track_info)
+    if not queue[message.guild.id].append(track):
+        await message.channel.send("❌ The queue is full.")
+        return
+    embed.set_field_at(1, name="Queued: ", value=f"✅ {track.title}", inline=True)
+    await update_embed(message.guild.id)
 
 
-#METHOD SPOTIFY_PLAYLIST    ======Helpers======         ===============================================
-async def handle_spotify_playlist(message: discord.Interaction, link: str):  
-    global queue
-    global embed_ctx
-    embed, ctx = embed_ctx[message.guild.id]
+#METHOD SPOTIFY_COLLECTIONS    ======Helpers======         ===============================================
+async def _handle_spotify_collection(message, link, kind, fetch_first, to_item):
     try:
-        playlist_id = link.split("/playlist/")[1].split("?")[0]
-        playlist_tracks = sp.playlist_tracks(playlist_id)
+        link_info = parse_link(link)
+        if link_info.kind != f"spotify_{kind}":
+            raise ValueError(f"not a Spotify {kind} link: {link}")
+        pages = spotify_pages(lambda: fetch_first(link_info.id))
+        queued = await ingest_pages(message, pages, to_item)
+        if not queued:
+            await message.channel.send(f"❌ No playable tracks found in the {kind}.")
     except Exception as e:
-        await message.channel.send("Failed to fetch playlist from Spotify.")
+        await message.channel.send(f"Failed to fetch {kind} from Spotify.")
         print(f"Spotify API Error: {e}")
-        return
 
-    queued_songs = 0
 
-    for item in playlist_tracks['items']:
-        track = item['track']
-        if not track:
-            continue
+async def handle_spotify_playlist(message: discord.Interaction, link: str):
+    """Queues every track of a Spotify playlist, page by page (100 tracks per page)."""
+    await _handle_spotify_collection(
+        message, link, "playlist",
+        lambda playlist_id: spotify_handler.playlist_tracks(playlist_id, limit=100),
+        lambda item: spotify_track_to_item(item.get("track"))
+    )
+
+
+async def handle_spotify_album(message: discord.Interaction, link: str):
+    """Queues every track of a Spotify album, page by page (50 tracks per page)."""
+    await _handle_spotify_collection(
+        message, link, "album",
+        lambda album_id: spotify_handler.album_tracks(album_id, limit=50),
+        spotify_track_to_item
+    )
+
+
+async def handle_spotify_artist(message: discord.Interaction, link: str):
+    """Queues a Spotify artist's top tracks."""
+    async def top_tracks_page(artist_id):
+        return {"items": (await spotify_handler.artist_top_tracks(artist_id))["tracks"]}
+
+    await _handle_spotify_collection(
+        message, link, "artist",
+        top_tracks_page,
+        spotify_track_to_item
+    )
+
+#METHOD INGEST    ======Helpers======         ===============================================
+async def ingest_pages(message: discord.Interaction, pages, to_item):
+    """
+    Enqueues pages of playlist entries as they arrive. Returns once the first page is queued
+    (so playback can start) and keeps consuming the remaining pages in a background task.
+    """
+    guild_id = message.guild.id
+    queued = 0
+    async for page in pages:
+        queued += _enqueue_page(guild_id, page, to_item)
+        if queued:
+            break
+    else:
+        await _show_ingest_progress(message, queued, done=True)
+        return queued
 
-        search_query = f"{track['name']} {', '.join([artist['name'] for artist in track['artists']])} Audio"
-        title = f"{track['name']} - {', '.join([artist['name'] for artist in track['artists']])}"
-        queued_songs+=1
+    await _show_ingest_progress(message, queued, done=False)
+    task = asyncio.ensure_future(_ingest_rest(message, pages, to_item, queued))
+    tasks = _ingest_tasks.setdefault(guild_id, set())
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return queued
 
-        queue[message.guild.id].append((search_query, title, False))
-    embed.set_field_at(1, name="Queued: ", value=f"📃 Queued {queued_songs} songs", inline=True)
-    await ctx.edit_original_response(embed=embed)
 
-#METHOD YOUTUBE_PLAYLIST    ======Helpers======         ===============================================   
-async def handle_youtube_playlist(message: discord.Interaction, playlist_link: str):
-    global queue
-    global ydl_opts
-    global embed_ctx
+async def _ingest_rest(message, pages, to_item, queued):
+    try:
+        async for page in pages:
+            queued += _enqueue_page(message.guild.id, page, to_item)
+            schedule_prefetch(message.guild.id)
+            guild_queue = queue[message.guild.id]
+            if len(guild_queue) >= guild_queue.max_length:
+                break  # Queue is full, stop reading the playlist
+            await _show_ingest_progress(message, queued, done=False)
+    except Exception as e:
+        print(f"Playlist ingestion error: {e}")
+    await _show_ingest_progress(message, queued, done=True)
+
+
+def _enqueue_page(guild_id, page, to_item):
+    tracks = [track for track in map(to_item, page) if track]
+    return queue.setdefault(guild_id, GuildQueue()).extend(tracks)
+
+
+async def _show_ingest_progress(message, queued, done):
+    if not embed_ctx.get(message.guild.id):
+        return
     embed, ctx = embed_ctx[message.guild.id]
-    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        playlist_info = await asyncio.to_thread(run_yt_dlp_search, playlist_link)
+    status = f"📃 Queued {queued} songs" if done else f"📃 Queued {queued} songs (loading more...)"
+    embed.set_field_at(1, name="Queued: ", value=status, inline=True)
+    await update_embed(message.guild.id)
 
-        for video in playlist_info['entries']:
-            title = video["title"]
-            url = video['url']
-            author = video['uploader']
-            thumbnail = video['thumbnail']
 
-            if url:
-                queue[message.guild.id].append((url,  f"{title} - {author}", True, thumbnail))
+#Helper: Turns a flat playlist entry into an unresolved queue Track
+def flat_entry_to_item(entry):
+    title = entry.get("title")
+    if not title or title in ("[Private video]", "[Deleted video]"):
+        return None
+    url = entry.get("url") or f"https://www.youtube.com/watch?v={entry['id']}"
+    return Track(url, video_title(entry))
 
-        embed.set_field_at(1, name="Queued: ", value=f"📃 Queued {len(playlist_info['entries'])} songs", inline=True)
-        await ctx.edit_original_response(embed=embed)
+
+def cancel_ingest(guild_id):
+    """Stops any playlist still being loaded into a guild's queue."""
+    for task in _ingest_tasks.pop(guild_id, set()):
+        task.cancel()
+
+
+#METHOD YOUTUBE_PLAYLIST    ======Helpers======         ===============================================   
+async def handle_youtube_playlist(message: discord.Interaction, playlist_link: str):
+    try:
+        queued = await ingest_pages(message, flat_playlist_pages(playlist_link), flat_entry_to_item)
+        if not queued:
+            await message.channel.send("❌ No playable videos found in the playlist.")
+    except Exception as e:
+        await message.channel.send("Failed to fetch playlist from YouTube.")
+        print(f"yt-dlp Playlist Error: {e}")
 
 
 
 #METHOD YOUTUBE_SONG    ======Helpers======         ===============================================   
 async def handle_youtube_song(message: discord.Interaction, song_link: str):
     global queue
-    global ydl_opts
     global embed_ctx
     embed, ctx = embed_ctx[message.guild.id]
     try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            video_info = await asyncio.to_thread(run_yt_dlp_search, song_link)
-            title = video_info['title']
-            url = video_info['url']
-            author = video_info['uploader']
-            thumbnail = video_info['thumbnail']
-
-            if url:
-                queue[message.guild.id].append((url,  f"{title} - {author}", True, thumbnail))
-                embed.set_field_at(1, name="Queued: ", value=f"✅ {title} - {author}", inline=True)
-                await ctx.edit_original_response(embed=embed)
-            else: 
-                await message.channel.send("⚠️Failed to retrieve a valid URL for the song.")
+        info = await resolve_query(song_link)
+    except Exception as e:
+        print(f"YouTube song error: {e}")
+        info = None
+    if not info:
+        await message.channel.send("⚠️ Couldn't load that video. It may be private, removed or unavailable in this region.")
+        return
+
+    try:
+        track = Track(song_link, info.get("title") or song_link)
+        await apply_stream(track, info)
+        if not queue[message.guild.id].append(track):
+            await message.channel.send("❌ The queue is full.")
+            return
+        embed.set_field_at(1, name="Queued: ", value=f"✅ {track.title}", inline=True)
+        await update_embed(message.guild.id)
     except Exception as e:
         print(e)
 
 
+#METHOD MULTIPLE_SONGS    ======Helpers======         ===============================================
+def split_entries(text):
+    """Splits /play input into its songs (separated by ";" or new lines), dropping empty entries."""
+    return [entry.strip() for entry in re.split(r"[;\n]+", text) if entry.strip()]
+
+
+async def handle_multiple_songs(message: discord.Interaction, entries):
+    """
+    Queues a list of songs. Every entry is looked up at once (Spotify lookups share batched requests,
+    YouTube extractions go through the bounded extraction pool) and they are queued in the order given,
+    each as soon as it and the entries before it are ready, so the first song can start right away.
+    """
+    if len(entries) > MULTI_PLAY_MAX:
+        await message.channel.send(f"⚠️ Only the first {MULTI_PLAY_MAX} songs will be queued.")
+        entries = entries[:MULTI_PLAY_MAX]
+    try:
+        queued = await ingest_pages(message, resolved_entries(message, entries), lambda track: track)
+        if not queued:
+            await message.channel.send("❌ None of those songs could be found.")
+    except Exception as e:
+        await message.channel.send("⚠️ An error occurred while queuing the songs.")
+        print(f"Multi-song Error: {e}")
+
+
+#Helper: Async iterator yielding each entry's Track (as a one-song page) in order while all of them resolve concurrently
+async def resolved_entries(message, entries):
+    tasks = [asyncio.ensure_future(resolve_entry(entry)) for entry in entries]
+    try:
+        for entry, task in zip(entries, tasks):
+            try:
+                track = await task
+            except Exception as e:
+                print(f"Error resolving {entry}: {e}")
+                track = None
+            if track is None:
+                await message.channel.send(f"❌ Couldn't find a song for: {entry}")
+                yield []
+            else:
+                yield [track]
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+#Helper: Turns one entry (search text, Spotify track or YouTube video) into a Track with its stream resolved if possible
+async def resolve_entry(entry):
+    link_info = parse_link(entry)
+    if link_info.kind == "youtube_video":
+        info = await resolve_query(link_info.url)
+        if not info:
+            return None
+        track = Track(link_info.url, info.get("title") or link_info.url)
+        await apply_stream(track, info)
+        return track
+
+    if link_info.kind == "spotify_track":
+        track = spotify_track_to_item(await spotify_handler.get_track(link_info.id))
+    elif link_info.kind == "search":
+        track = spotify_track_to_item(await spotify_handler.search_track(entry))
+    else:
+        return None
+    if track is None:
+        return None
+
+    # Resolve the stream now as well; if that fails the player retries when the song comes up
+    try:
+        info = await resolve_track(track)
+        if info:
+            await apply_stream(track, info)
+    except Exception as e:
+        print(f"Stream lookup failed for {track.title}: {e}")
+    return track
+
+
+#METHOD PARSE_LINK    ======Helpers======         ===============================================
+def parse_link(text):
+    """
+    Classifies /play input and pulls out its canonical id. Kinds: spotify_track, spotify_album,
+    spotify_playlist, spotify_artist, youtube_video, youtube_playlist, youtube_mix, search
+    (anything that isn't a link) and unsupported (a Spotify/YouTube link we can't use).
+    """
+    text = text.strip()
+    match = re.fullmatch(r"spotify:(track|album|playlist|artist):([A-Za-z0-9]{22})", text)
+    if match:
+        return _spotify_link(*match.groups())
+    if not text or any(c.isspace() for c in text) or "." not in text:
+        return ParsedLink("search", None, text)
+
+    url = urlparse(text if "://" in text else f"https://{text}")
+    host = (url.hostname or "").lower()
+    host = host[4:] if host.startswith("www.") else host
+    segments = [segment for segment in url.path.split("/") if segment]
+    params = parse_qs(url.query)
+
+    if host in SPOTIFY_SHARE_HOSTS:
+        return ParsedLink("unsupported", None, text)
+    if host in SPOTIFY_HOSTS:
+        segments = [segment for segment in segments if not segment.startswith("intl-")]  # e.g. /intl-de/track/...
+        if len(segments) >= 2 and segments[0] in SPOTIFY_KINDS and re.fullmatch(r"[A-Za-z0-9]{22}", segments[1]):
+            return _spotify_link(segments[0], segments[1])
+        return ParsedLink("unsupported", None, text)
+
+    if host == "youtu.be" or host in YOUTUBE_HOSTS:
+        if host == "youtu.be":
+            video_id = segments[0] if segments else None
+        elif len(segments) >= 2 and segments[0] in YOUTUBE_VIDEO_PATHS:
+            video_id = segments[1]
+        else:
+            video_id = params.get("v", [None])[0]
+        list_id = params.get("list", [None])[0]
+
+        if video_id and not re.fullmatch(r"[\w-]{11}", video_id):
+            return ParsedLink("unsupported", None, text)
+        if list_id and list_id.startswith("RD"):
+            # Mixes are generated per video, so keep the video in the link
+            url = f"https://www.youtube.com/watch?v={video_id}&list={list_id}" if video_id else f"https://www.youtube.com/playlist?list={list_id}"
+            return ParsedLink("youtube_mix", list_id, url)
+        if video_id:
+            # A video opened from a playlist (watch?v=..&list=..) is just that video
+            return ParsedLink("youtube_video", video_id, f"https://www.youtube.com/watch?v={video_id}")
+        if list_id:
+            return ParsedLink("youtube_playlist", list_id, f"https://www.youtube.com/playlist?list={list_id}")
+        return ParsedLink("unsupported", None, text)
+
+    return ParsedLink("search", None, text)
+
+
+def unsupported_link_message(link_info):
+    """The reply for an unsupported link, pointing share links to the open.spotify.com link they redirect to."""
+    host = (urlparse(link_info.url if "://" in link_info.url else f"https://{link_info.url}").hostname or "").lower()
+    host = host[4:] if host.startswith("www.") else host
+    if host in SPOTIFY_SHARE_HOSTS:
+        return "❌ Spotify share links (spotify.link) aren't supported. Open it and use the open.spotify.com link instead."
+    return "❌ That Spotify/YouTube link isn't supported. Try a song, album, playlist or video link."
+
+
+def _spotify_link(kind, spotify_id):
+    return ParsedLink(f"spotify_{kind}", spotify_id, f"https://open.spotify.com/{kind}/{spotify_id}")
+
+
 #METHOD PLAY    ======Helpers======     (check_idle)    ===============================================
 async def play(message: discord.Interaction, link: str):
     global queue
     if message.guild.id not in queue:
-        queue[message.guild.id] = []
+        queue[message.guild.id] = GuildQueue()
     
     if embed_ctx.get(message.guild.id, None) is None:
         embed = discord.Embed(title="🎵 Mokey Music 🎵", color=discord.Color.blue())
@@ -369,29 +1373,43 @@ async def play(message: discord.Interaction, link: str):
         return
 
     # Determine source type
-    if "spotify" in link:
-        if "playlist" in link:
-            await handle_spotify_playlist(message, link)
-        else:
-            await handle_spotify_song(message, link)
-
-    elif "youtu" in link:
-        if "playlist" in link:
-            await handle_youtube_playlist(message, link)
-        else:
-            await handle_youtube_song(message, link)
+    entries = split_entries(link)
+    link_info = parse_link(link)
+    if len(entries) > 1:
+        await handle_multiple_songs(message, entries)
+
+    elif link_info.kind == "spotify_playlist":
+        await handle_spotify_playlist(message, link_info.url)
+    elif link_info.kind == "spotify_album":
+        await handle_spotify_album(message, link_info.url)
+    elif link_info.kind == "spotify_artist":
+        await handle_spotify_artist(message, link_info.url)
+    elif link_info.kind == "spotify_track":
+        await handle_spotify_song(message, link_info.url)
+
+    elif link_info.kind in ("youtube_playlist", "youtube_mix"):
+        await handle_youtube_playlist(message, link_info.url)
+    elif link_info.kind == "youtube_video":
+        await handle_youtube_song(message, link_info.url)
+
+    elif link_info.kind == "unsupported":
+        await message.channel.send(unsupported_link_message(link_info))
 
     else:
         search_result = await handle_song_search(message, link)
         if search_result:
-            video_url, title, is_url = search_result
-            queue[message.guild.id].append((video_url, title, is_url))
-            embed, ctx = embed_ctx[message.guild.id]
-            embed.set_field_at(1, name="Queued: ", value=f"✅ {title}", inline=True)
-            await ctx.edit_original_response(embed=embed)
+            search_query, title, spotify_id = search_result
+            if queue[message.guild.id].append(Track(search_query, title, spotify_id=spotify_id)):
+                embed, ctx = embed_ctx[message.guild.id]
+                embed.set_field_at(1, name="Queued: ", value=f"✅ {title}", inline=True)
+                await update_embed(message.guild.id)
+            else:
+                await message.channel.send("❌ The queue is full.")
             
 
     # Only start playing if not already playing
     if not voice_client.is_playing() and not voice_client.is_paused():
         await play_next(message)
+    else:
+        schedule_prefetch(message.guild.id)
 
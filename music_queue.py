@@ -0,0 +1,123 @@
+# Per-guild music queue: a bounded deque of compact track records
+import os
+import random
+from collections import deque
+from itertools import islice
+from typing import Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MAX_QUEUE_LENGTH = int(os.getenv("MUSIC_MAX_QUEUE", "5000"))  # songs per guild
+
+
+class Track:
+    """
+    One queued song. `query` is what gets resolved (a YouTube search or video link);
+    `url` is the direct stream url once resolved, None until then, `codec` its audio codec
+    and `video_id` the YouTube video it resolved to, if known. Songs queued from Spotify
+    keep their `spotify_id`.
+    """
+
+    __slots__ = ("query", "title", "url", "thumbnail", "codec", "video_id", "spotify_id")
+
+    def __init__(self, query: str, title: str, url: Optional[str] = None, thumbnail: Optional[str] = None,
+                 codec: Optional[str] = None, video_id: Optional[str] = None, spotify_id: Optional[str] = None):
+        self.query = query
+        self.title = title
+        self.url = url
+        self.thumbnail = thumbnail
+        self.codec = codec
+        self.video_id = video_id
+        self.spotify_id = spotify_id
+
+    @property
+    def resolved(self) -> bool:
+        return self.url is not None
+
+    def __repr__(self):
+        return f"Track({self.title!r}, resolved={self.resolved})"
+
+
+class GuildQueue:
+    """
+    Bounded FIFO of Tracks backed by a deque: O(1) append and next, positional
+    insert/remove/move, shuffle, and cheap slices of a page for rendering.
+    Positions are 0-based here; commands translate from the 1-based numbers users see.
+    """
+
+    def __init__(self, tracks: Iterable[Track] = (), max_length: int = MAX_QUEUE_LENGTH):
+        self.max_length = max_length
+        self._tracks = deque(islice(tracks, max_length))
+
+    def append(self, track: Track) -> bool:
+        """Add a track to the end. Returns False if the queue is full."""
+        if len(self._tracks) >= self.max_length:
+            return False
+        self._tracks.append(track)
+        return True
+
+    def extend(self, tracks: Iterable[Track]) -> int:
+        """Add tracks to the end until the queue is full. Returns how many were added."""
+        room = self.max_length - len(self._tracks)
+        before = len(self._tracks)
+        self._tracks.extend(islice(tracks, max(room, 0)))
+        return len(self._tracks) - before
+
+    def appendleft(self, track: Track):
+        """Put a track back at the front (e.g. to retry it), even if the queue is full."""
+        self._tracks.appendleft(track)
+
+    def next(self) -> Optional[Track]:
+        """Remove and return the first track, or None if the queue is empty."""
+        return self._tracks.popleft() if self._tracks else None
+
+    def peek(self, count: int) -> List[Track]:
+        """Return the first `count` tracks without removing them."""
+        return list(islice(self._tracks, count))
+
+    def insert(self, index: int, track: Track) -> bool:
+        """Insert a track at a position. Returns False if the queue is full."""
+        if len(self._tracks) >= self.max_length:
+            return False
+        self._tracks.insert(index, track)
+        return True
+
+    def remove(self, index: int) -> Track:
+        """Remove and return the track at a position. Raises IndexError if there is none."""
+        track = self._tracks[index]
+        del self._tracks[index]
+        return track
+
+    def move(self, source: int, destination: int) -> Track:
+        """Move the track at `source` so it ends up at `destination`. Raises IndexError if out of range."""
+        if not 0 <= destination < len(self._tracks):
+            raise IndexError("queue index out of range")
+        track = self.remove(source)
+        self._tracks.insert(destination, track)
+        return track
+
+    def shuffle(self):
+        tracks = list(self._tracks)
+        random.shuffle(tracks)
+        self._tracks = deque(tracks)
+
+    def clear(self):
+        self._tracks.clear()
+
+    def snapshot(self, start: int = 0, stop: Optional[int] = None) -> List[Track]:
+        """Return a list copy of the tracks in [start, stop), e.g. one page for display."""
+        return list(islice(self._tracks, start, stop))
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __bool__(self):
+        return bool(self._tracks)
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    def __getitem__(self, index: int) -> Track:
+        return self._tracks[index]
@@ -0,0 +1,189 @@
+# Async Spotify Web API client: reused client-credentials token, batched track lookups, Retry-After handling
+import asyncio
+import base64
+import os
+import time
+from itertools import islice
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+import http_session
+
+load_dotenv()
+
+SP_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
+SP_CLIENT_SC = os.getenv("SPOTIFY_CLIENT_SECRET")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+SPOTIFY_MARKET = os.getenv("SPOTIFY_MARKET", "US")  # market used for artist top tracks
+
+# HTTP connection pool settings for the shared aiohttp session
+HTTP_TIMEOUT = 10  # seconds, per request
+HTTP_POOL_SIZE = 10  # max open connections to Spotify
+
+TOKEN_REFRESH_MARGIN = 60  # seconds before expiry that a token is renewed
+TRACK_BATCH_SIZE = 50  # ids per /tracks call (Spotify's maximum)
+TRACK_BATCH_WINDOW = 0.05  # seconds single-track lookups wait so they can share one /tracks call
+MAX_ATTEMPTS = 5  # tries per request while Spotify answers 429 or the token is refused
+DEFAULT_RETRY_AFTER = 1  # seconds, when a 429 comes without a Retry-After header
+
+# Keep-alive sessions to Spotify, one per event loop
+_http = http_session.SessionPool(HTTP_POOL_SIZE, HTTP_TIMEOUT)
+
+# Client-credentials token, shared by every request until shortly before it expires
+_token: Optional[str] = None
+_token_expires_at = 0.0  # monotonic time
+_token_task: Optional[asyncio.Task] = None
+
+# After a 429 every request waits until this monotonic time instead of failing
+_retry_after_until = 0.0
+
+# Single-track lookups waiting to be sent together through /tracks
+_pending_tracks: Dict[str, asyncio.Future] = {}
+_batch_task: Optional[asyncio.Task] = None
+
+async def close_session():
+    """Close the pooled Spotify session for the running event loop."""
+    await _http.close()
+
+async def _fetch_token() -> str:
+    global _token, _token_expires_at
+    credentials = base64.b64encode(f"{SP_CLIENT_ID}:{SP_CLIENT_SC}".encode()).decode()
+    session = await _http.get()
+    async with session.post(
+        SPOTIFY_TOKEN_URL,
+        data={"grant_type": "client_credentials"},
+        headers={"Authorization": f"Basic {credentials}"},
+    ) as response:
+        response.raise_for_status()
+        data = await response.json()
+    _token = data["access_token"]
+    _token_expires_at = time.monotonic() + data.get("expires_in", 3600) - TOKEN_REFRESH_MARGIN
+    return _token
+
+async def _get_token() -> str:
+    """
+    Return the cached access token, fetching a new one when it is about to expire.
+    Concurrent callers share a single token request.
+    """
+    global _token_task
+    if _token and time.monotonic() < _token_expires_at:
+        return _token
+    loop = asyncio.get_running_loop()
+    if _token_task is None or _token_task.done() or _token_task.get_loop() is not loop:
+        _token_task = loop.create_task(_fetch_token())
+    return await asyncio.shield(_token_task)
+
+def _drop_token():
+    global _token
+    _token = None
+
+async def _wait_for_rate_limit():
+    """Sleep until a Retry-After window set by an earlier 429 has passed."""
+    while True:
+        delay = _retry_after_until - time.monotonic()
+        if delay <= 0:
+            return
+        await asyncio.sleep(delay)
+
+async def _spotify_get(path: str, params: Optional[Dict] = None) -> Dict:
+    """
+    GET a Spotify API path (or a full `next` url from a paging object) with the shared token.
+    A 429 holds back every request until its Retry-After has passed and then retries;
+    a refused token is renewed once. Raises after MAX_ATTEMPTS or on any other error status.
+    """
+    global _retry_after_until
+    url = path if path.startswith("http") else f"{SPOTIFY_API_URL}{path}"
+    for attempt in range(MAX_ATTEMPTS):
+        await _wait_for_rate_limit()
+        token = await _get_token()
+        session = await _http.get()
+        async with session.get(url, params=params, headers={"Authorization": f"Bearer {token}"}) as response:
+            if response.status == 429:
+                delay = float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+                _retry_after_until = max(_retry_after_until, time.monotonic() + delay)
+                continue
+            if response.status == 401 and attempt == 0:
+                _drop_token()
+                continue
+            response.raise_for_status()
+            return await response.json()
+    raise Exception(f"Spotify request failed after {MAX_ATTEMPTS} attempts: {path}")
+
+async def search_track(query: str) -> Optional[Dict]:
+    """Return the best matching track object for a search, or None if nothing matched."""
+    result = await _spotify_get("/search", {"q": query, "type": "track", "limit": 1})
+    items = (result.get("tracks") or {}).get("items") or []
+    return items[0] if items else None
+
+async def get_track(track_id: str) -> Optional[Dict]:
+    """
+    Return one track object (None if Spotify doesn't know the id). Lookups made within
+    TRACK_BATCH_WINDOW of each other are sent together as one /tracks call.
+    """
+    global _batch_task
+    loop = asyncio.get_running_loop()
+    future = _pending_tracks.get(track_id)
+    if future is None or future.get_loop() is not loop:
+        future = loop.create_future()
+        _pending_tracks[track_id] = future
+        if _batch_task is None or _batch_task.done() or _batch_task.get_loop() is not loop:
+            _batch_task = loop.create_task(_flush_track_batches())
+    return await asyncio.shield(future)
+
+async def _flush_track_batches():
+    await asyncio.sleep(TRACK_BATCH_WINDOW)
+    while _pending_tracks:
+        batch = dict(islice(_pending_tracks.items(), TRACK_BATCH_SIZE))
+        for track_id in batch:
+            del _pending_tracks[track_id]
+        try:
+            tracks = await get_tracks(list(batch))
+            for index, future in enumerate(batch.values()):
+                if not future.done():
+                    future.set_result(tracks[index] if index < len(tracks) else None)
+        except Exception as e:
+            if len(batch) == 1:
+                _settle(next(iter(batch.values())), exception=e)
+            else:
+                # Spotify refuses the whole call if any id is bad, so look the ids up one at a time
+                await asyncio.gather(*(_fetch_single(track_id, future) for track_id, future in batch.items()))
+
+async def _fetch_single(track_id: str, future: asyncio.Future):
+    try:
+        tracks = await get_tracks([track_id])
+        _settle(future, result=tracks[0] if tracks else None)
+    except Exception as e:
+        _settle(future, exception=e)
+
+def _settle(future: asyncio.Future, result=None, exception: Optional[Exception] = None):
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+async def get_tracks(track_ids: List[str]) -> List[Optional[Dict]]:
+    """Return track objects for any number of ids, in order, fetching TRACK_BATCH_SIZE per call."""
+    chunks = [track_ids[i:i + TRACK_BATCH_SIZE] for i in range(0, len(track_ids), TRACK_BATCH_SIZE)]
+    results = await asyncio.gather(*(_spotify_get("/tracks", {"ids": ",".join(chunk)}) for chunk in chunks))
+    return [track for result in results for track in result.get("tracks") or []]
+
+async def playlist_tracks(playlist_id: str, limit: int = 100) -> Dict:
+    """Return the first page of a playlist's items (each item holds a "track")."""
+    return await _spotify_get(f"/playlists/{playlist_id}/tracks", {"limit": limit})
+
+async def album_tracks(album_id: str, limit: int = 50) -> Dict:
+    """Return the first page of an album's tracks."""
+    return await _spotify_get(f"/albums/{album_id}/tracks", {"limit": limit})
+
+async def artist_top_tracks(artist_id: str) -> Dict:
+    """Return an artist's top tracks as {"tracks": [...]}."""
+    return await _spotify_get(f"/artists/{artist_id}/top-tracks", {"market": SPOTIFY_MARKET})
+
+async def next_page(page: Dict) -> Optional[Dict]:
+    """Return the page after a paging object, or None on the last page."""
+    if not page.get("next"):
+        return None
+    return await _spotify_get(page["next"])
@@ -1,10 +1,18 @@
 # Company Stock Information from Finnhub.io API
-import requests
+import asyncio
+import bisect
+import json
 import os
+import re
 import time
-from typing import Dict, Optional, List
+import weakref
+from collections import deque
+from typing import Any, Dict, Optional, List, Tuple
 from dotenv import load_dotenv
 
+import cache_handler
+import http_session
+
 load_dotenv()
 
 # Finnhub API Configuration
@@ -18,169 +26,584 @@ if not FINNHUB_API_KEY:
 RATE_LIMIT = 60
 RATE_LIMIT_WINDOW = 60  # seconds
 
-# Cache for storing fetched data to reduce API calls
-_stock_cache = {}
-_api_call_times = []  # Track timestamps of API calls
-_total_api_calls = 0  # Counter for total API calls made
+# HTTP connection pool settings for the shared aiohttp session
+HTTP_TIMEOUT = 10  # seconds, per request
+HTTP_POOL_SIZE = 10  # max open connections to Finnhub
+HTTP_KEEPALIVE = 30  # seconds an idle connection is kept open
+
+# Cache lifetimes: prices move constantly, company profiles barely change
+QUOTE_TTL = 15  # seconds
+PROFILE_TTL = 3 * 24 * 60 * 60  # 3 days
+CACHE_MAX_SIZE = 2000  # entries (a ticker uses up to two: quote and profile)
+
+# Batch lookups (/stocks)
+BATCH_MAX_TICKERS = 25  # one embed holds at most 25 fields
+BATCH_CONCURRENCY = 5  # upstream requests in flight at once per batch
+
+# Background refresh of watched tickers
+WATCHLIST_MAX = 10  # tickers per guild
+REFRESH_BUDGET = 20  # background quote calls per RATE_LIMIT_WINDOW, spread evenly
+INTERACTIVE_RESERVE = 10  # rate limit slots background refreshes never use
+
+# Local symbol search index, built from Finnhub's bulk symbol list and kept on disk
+SYMBOL_EXCHANGE = "US"
+SYMBOL_CACHE_PATH = os.getenv("SYMBOL_CACHE_PATH", f"symbols_{SYMBOL_EXCHANGE}.json")
+SYMBOL_CACHE_MAX_AGE = 7 * 24 * 60 * 60  # seconds before the dump is downloaded again
+
+# Cache for storing fetched data to reduce API calls, keyed by ("quote" | "profile", ticker).
+# Backed by the shared persistent tier so warm data survives restarts.
+_stock_cache = cache_handler.TieredCache("stock", max_size=CACHE_MAX_SIZE)
+
+# Watched tickers per guild, persisted under a single key so they survive restarts
+_watch_store = cache_handler.TieredCache("watchlist", max_size=1)
+_watchlists: Dict[int, set] = {}
+_watch_save_lock = asyncio.Lock()  # Saves run one at a time so an older snapshot never lands last
+_refresh_task: Optional[asyncio.Task] = None
+_symbol_index: Optional["SymbolIndex"] = None
+_symbol_index_task: Optional[asyncio.Task] = None
+
+# Keep-alive sessions to Finnhub, one per event loop (the bot's loop, plus the private loop used by the sync wrappers)
+_http = http_session.SessionPool(HTTP_POOL_SIZE, HTTP_TIMEOUT, keepalive=HTTP_KEEPALIVE)
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+
+# Upstream calls currently in flight, keyed like the cache, so identical concurrent lookups share one request
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+class RateLimiter:
+    """
+    Sliding-window rate limiter allowing at most `limit` calls in any `window` seconds.
+    Call timestamps live in a deque, so each check only drops expired entries (amortized O(1)).
+    The window is shared by every event loop (the bot's and the sync wrappers' private loop);
+    each loop queues its own acquire() waiters behind a lock created on that loop.
+    """
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self.total_calls = 0
+        self._calls = deque()
+        self._waiting = 0
+        self._locks = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock for that loop's waiters
+
+    def _prune(self, now: float):
+        while self._calls and now - self._calls[0] >= self.window:
+            self._calls.popleft()
+
+    def try_acquire(self, reserve: int = 0) -> bool:
+        """
+        Record a call and return True if a slot is free right now, otherwise return False.
+        A non-zero reserve marks a low-priority caller: it only gets a slot while nobody is
+        queued in acquire() and more than `reserve` slots are left for interactive callers.
+        """
+        now = time.monotonic()
+        self._prune(now)
+        if reserve and self._waiting:
+            return False
+        if len(self._calls) >= self.limit - reserve:
+            return False
+        self._calls.append(now)
+        self.total_calls += 1
+        return True
+
+    def wait_time(self) -> float:
+        """Seconds until the next slot frees up (0 if one is free now)."""
+        now = time.monotonic()
+        self._prune(now)
+        if len(self._calls) < self.limit:
+            return 0.0
+        return max(self.window - (now - self._calls[0]), 0.0)
+
+    async def acquire(self):
+        """Wait until a slot is free, then record a call. Waiters are served in arrival order."""
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            lock = self._locks[loop] = asyncio.Lock()
+        self._waiting += 1
+        try:
+            async with lock:
+                while not self.try_acquire():
+                    await asyncio.sleep(self.wait_time())
+        finally:
+            self._waiting -= 1
+
+    def usage(self) -> Dict[str, int]:
+        """Current window usage, total calls made, and callers waiting for a slot."""
+        self._prune(time.monotonic())
+        calls = len(self._calls)
+        return {
+            "calls_this_minute": calls,
+            "limit": self.limit,
+            "remaining": self.limit - calls,
+            "total_calls": self.total_calls,
+            "queued": self._waiting,
+        }
+
+_rate_limiter = RateLimiter(RATE_LIMIT, RATE_LIMIT_WINDOW)
 
 def _check_rate_limit():
     """
-    Check if we've exceeded the rate limit.
-    Removes calls older than the time window and raises exception if limit exceeded.
+    Check if we've exceeded the rate limit without waiting.
+    Records the call if a slot is free, raises exception if limit exceeded.
     """
-    global _api_call_times, _total_api_calls
-    
-    current_time = time.time()
-    
-    # Remove calls older than the time window
-    _api_call_times = [call_time for call_time in _api_call_times 
-                       if current_time - call_time < RATE_LIMIT_WINDOW]
-    
-    # Check if we've exceeded the limit
-    if len(_api_call_times) >= RATE_LIMIT:
-        oldest_call = _api_call_times[0]
-        wait_time = RATE_LIMIT_WINDOW - (current_time - oldest_call)
-        raise Exception(f"⚠️ Rate limit exceeded ({len(_api_call_times)}/{RATE_LIMIT}). Please wait {wait_time:.1f} seconds before making another API call.")
-    
-    # Record this API call
-    _api_call_times.append(current_time)
-    _total_api_calls += 1
+    if not _rate_limiter.try_acquire():
+        raise Exception(f"⚠️ Rate limit exceeded ({RATE_LIMIT}/{RATE_LIMIT}). Please wait {_rate_limiter.wait_time():.1f} seconds before making another API call.")
 
-def get_quote(ticker: str) -> Optional[Dict]:
+async def close_session():
+    """Close the pooled Finnhub session for the running event loop."""
+    await _http.close()
+
+async def _finnhub_get(endpoint: str, params: Dict, acquire: bool = True) -> Dict:
     """
-    Fetch real-time stock quote data from Finnhub API.
+    Perform a rate-limited GET against the Finnhub API over the shared session.
+    Waits for a free rate limit slot instead of failing when the budget is spent.
+    Pass acquire=False only if the caller already holds a slot from try_acquire().
     
-    Returns: Dictionary with price, change, and volume data
+    Returns: Decoded JSON response
     """
-    try:
-        _check_rate_limit()
-        url = f"{FINNHUB_BASE_URL}/quote"
-        params = {
-            "symbol": ticker.upper(),
-            "token": FINNHUB_API_KEY
-        }
-        response = requests.get(url, params=params)
+    if acquire:
+        await _rate_limiter.acquire()
+    session = await _http.get()
+    params = {**params, "token": FINNHUB_API_KEY}
+    async with session.get(f"{FINNHUB_BASE_URL}{endpoint}", params=params) as response:
         response.raise_for_status()
-        return response.json()
+        return await response.json()
+
+def _run_sync(coro):
+    """
+    Run a coroutine to completion for synchronous callers.
+    Uses one private event loop so its pooled session is reused between calls.
+    Must not be called from inside a running event loop - await the *_async function instead.
+    """
+    global _sync_loop
+    if _sync_loop is None or _sync_loop.is_closed():
+        _sync_loop = asyncio.new_event_loop()
+    return _sync_loop.run_until_complete(coro)
+
+async def _single_flight(key: Tuple[str, str], fetch) -> Any:
+    """
+    Run fetch() once for all concurrent callers asking for the same key.
+    The first caller starts the request; later callers await the same task until it finishes.
+    """
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(key)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(fetch())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight.pop(key, None) if _inflight.get(key) is done else None)
+    # Shield so one cancelled caller doesn't cancel the request for everyone else
+    return await asyncio.shield(task)
+
+def _is_empty_quote(quote: Optional[Dict]) -> bool:
+    # Finnhub answers unknown symbols with an all-zero quote ({"c": 0, "d": None, ..., "t": 0})
+    return not quote or quote.get("t") == 0 or (not quote.get("c") and not quote.get("pc"))
+
+async def _fetch_quote(ticker: str) -> Optional[Dict]:
+    """Returns the quote, {} if Finnhub has no quote for the symbol, or None if the request failed."""
+    try:
+        quote = await _finnhub_get("/quote", {"symbol": ticker})
+        if _is_empty_quote(quote):
+            return {}
+        await _stock_cache.set_async(("quote", ticker), quote, QUOTE_TTL)
+        return quote
     except Exception as e:
         print(f"Error fetching quote for {ticker}: {e}")
         return None
 
-def get_company_profile(ticker: str) -> Optional[Dict]:
-    """
-    Fetch company profile information from Finnhub API.
-    
-    Returns: Dictionary with company name, sector, market cap, description, etc.
-    """
+async def _fetch_profile(ticker: str) -> Optional[Dict]:
+    """Returns the profile, {} if Finnhub has no profile for the symbol, or None if the request failed."""
     try:
-        _check_rate_limit()
-        url = f"{FINNHUB_BASE_URL}/stock/profile2"
-        params = {
-            "symbol": ticker.upper(),
-            "token": FINNHUB_API_KEY
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json()
+        profile = await _finnhub_get("/stock/profile2", {"symbol": ticker})
+        if not profile:
+            return {}
+        await _stock_cache.set_async(("profile", ticker), profile, PROFILE_TTL)
+        return profile
     except Exception as e:
         print(f"Error fetching profile for {ticker}: {e}")
         return None
 
-def get_stock(ticker: str) -> Optional[Dict]:
+async def get_quote_async(ticker: str) -> Optional[Dict]:
     """
-    Retrieve comprehensive stock information by ticker symbol.
-    Combines quote and company profile data from Finnhub API.
+    Fetch real-time stock quote data from Finnhub API without blocking the event loop.
+    
+    Returns: Dictionary with price, change, and volume data
+    """
+    ticker = ticker.upper()
+    cached = await _stock_cache.get_async(("quote", ticker))
+    if cached is not None:
+        return cached
+    return await _single_flight(("quote", ticker), lambda: _fetch_quote(ticker))
+
+async def get_company_profile_async(ticker: str) -> Optional[Dict]:
+    """
+    Fetch company profile information from Finnhub API without blocking the event loop.
+    
+    Returns: Dictionary with company name, sector, market cap, description, etc.
     """
     ticker = ticker.upper()
+    cached = await _stock_cache.get_async(("profile", ticker))
+    if cached is not None:
+        return cached
+    return await _single_flight(("profile", ticker), lambda: _fetch_profile(ticker))
+
+def _build_stock_info(ticker: str, quote: Optional[Dict], profile: Optional[Dict]) -> Dict:
+    """
+    Combine quote and company profile data into a single stock information object.
+    Either half may be empty; its fields are filled with "N/A". A half that couldn't be
+    fetched (None) is also listed under "missing".
+    """
+    missing = [part for part, data in (("quote", quote), ("profile", profile)) if data is None]
+    quote = quote or {}
+    profile = profile or {}
+    return {
+        "ticker": ticker,
+        "name": profile.get("name", "N/A"),
+        "sector": profile.get("finnhubIndustry", "N/A"),
+        "market_cap": profile.get("marketCapitalization", "N/A"),
+        "price": quote.get("c", "N/A"),  # current price
+        "open": quote.get("o", "N/A"),
+        "high": quote.get("h", "N/A"),
+        "low": quote.get("l", "N/A"),
+        "previous_close": quote.get("pc", "N/A"),
+        "change": quote.get("d", "N/A"),
+        "change_percent": quote.get("dp", "N/A"),
+        "pe_ratio": profile.get("pe", "N/A"),
+        "description": profile.get("description", "N/A"),
+        "website": profile.get("website", "N/A"),
+        "currency": profile.get("currency", "N/A"),
+        "volume": quote.get("v", "N/A"),
+        "missing": missing,
+    }
+
+async def get_stock_async(ticker: str) -> Optional[Dict]:
+    """
+    Retrieve comprehensive stock information by ticker symbol.
+    Fetches quote and company profile data from Finnhub API concurrently;
+    each half is served from the cache while it is still fresh.
     
-    # Check cache first
-    if ticker in _stock_cache:
-        return _stock_cache[ticker]
+    Returns: Combined stock information, a partial result (see "missing") if one half
+             couldn't be fetched, or None for an unknown ticker or if neither could
+    """
+    ticker = ticker.upper()
     
     try:
-        quote = get_quote(ticker)
-        profile = get_company_profile(ticker)
+        quote, profile = await asyncio.gather(
+            get_quote_async(ticker),
+            get_company_profile_async(ticker),
+        )
         
-        if not quote or not profile:
-            print(f"Unable to fetch complete data for {ticker}")
+        if not quote and not profile:
+            print(f"Unable to fetch any data for {ticker}")
             return None
         
-        # Combine data into a single stock information object
-        stock_info = {
-            "ticker": ticker,
-            "name": profile.get("name", "N/A"),
-            "sector": profile.get("finnhubIndustry", "N/A"),
-            "market_cap": profile.get("marketCapitalization", "N/A"),
-            "price": quote.get("c", "N/A"),  # current price
-            "open": quote.get("o", "N/A"),
-            "high": quote.get("h", "N/A"),
-            "low": quote.get("l", "N/A"),
-            "previous_close": quote.get("pc", "N/A"),
-            "change": quote.get("d", "N/A"),
-            "change_percent": quote.get("dp", "N/A"),
-            "pe_ratio": profile.get("pe", "N/A"),
-            "description": profile.get("description", "N/A"),
-            "website": profile.get("website", "N/A"),
-            "currency": profile.get("currency", "N/A"),
-            "volume": quote.get("v", "N/A"),
-        }
-        
-        # Cache the result
-        _stock_cache[ticker] = stock_info
+        stock_info = _build_stock_info(ticker, quote, profile)
+        if stock_info["missing"]:
+            print(f"Partial data for {ticker}, missing: {', '.join(stock_info['missing'])}")
         return stock_info
         
     except Exception as e:
         print(f"Error retrieving stock data for {ticker}: {e}")
         return None
 
-def search_stocks(query: str) -> Optional[List[Dict]]:
+async def get_stocks_batch(tickers: List[str]) -> Tuple[Dict[str, Optional[Dict]], List[str]]:
     """
-    Search for stocks by company name or ticker symbol.
+    Retrieve stock information for several tickers at once.
+    Cached quotes and profiles are served first. The remaining per-minute budget is spent
+    on missing quotes, then on missing profiles, with at most BATCH_CONCURRENCY requests in flight.
     
-    Returns: List of matching companies
+    Returns: (ticker -> stock info or None, in request order; tickers whose quote was skipped
+             because the rate limit budget ran out)
+    """
+    tickers = list(dict.fromkeys(ticker.upper() for ticker in tickers if ticker))[:BATCH_MAX_TICKERS]
+    cached = await asyncio.gather(
+        *(_stock_cache.get_async(("quote", ticker)) for ticker in tickers),
+        *(_stock_cache.get_async(("profile", ticker)) for ticker in tickers),
+    )
+    quotes = dict(zip(tickers, cached[:len(tickers)]))
+    profiles = dict(zip(tickers, cached[len(tickers):]))
+    
+    budget = _rate_limiter.usage()["remaining"]
+    quote_fetch = [ticker for ticker in tickers if quotes[ticker] is None][:max(budget, 0)]
+    budget -= len(quote_fetch)
+    profile_fetch = [ticker for ticker in tickers if profiles[ticker] is None][:max(budget, 0)]
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def bounded(fetch, ticker):
+        async with semaphore:
+            return await fetch(ticker)
+    
+    fetched = await asyncio.gather(
+        *(bounded(get_quote_async, ticker) for ticker in quote_fetch),
+        *(bounded(get_company_profile_async, ticker) for ticker in profile_fetch),
+    )
+    quotes.update(zip(quote_fetch, fetched[:len(quote_fetch)]))
+    profiles.update(zip(profile_fetch, fetched[len(quote_fetch):]))
+    
+    results = {
+        ticker: _build_stock_info(ticker, quotes[ticker], profiles[ticker]) if quotes[ticker] or profiles[ticker] else None
+        for ticker in tickers
+    }
+    skipped = [ticker for ticker in tickers if quotes[ticker] is None and ticker not in quote_fetch]
+    return results, skipped
+
+async def _save_watchlists():
+    async with _watch_save_lock:
+        await _watch_store.set_async("guilds", {str(guild_id): sorted(tickers) for guild_id, tickers in _watchlists.items() if tickers}, None)
+
+async def _load_watchlists():
+    global _watchlists
+    saved = await _watch_store.get_async("guilds") or {}
+    _watchlists = {int(guild_id): set(tickers) for guild_id, tickers in saved.items()}
+
+async def watch_ticker(guild_id: int, ticker: str) -> bool:
+    """Add a ticker to a guild's watchlist. Returns False if the watchlist is full."""
+    tickers = _watchlists.setdefault(guild_id, set())
+    ticker = ticker.upper()
+    if ticker not in tickers and len(tickers) >= WATCHLIST_MAX:
+        return False
+    tickers.add(ticker)
+    await _save_watchlists()
+    return True
+
+async def unwatch_ticker(guild_id: int, ticker: str) -> bool:
+    """Remove a ticker from a guild's watchlist. Returns False if it wasn't being watched."""
+    tickers = _watchlists.get(guild_id, set())
+    if ticker.upper() not in tickers:
+        return False
+    tickers.discard(ticker.upper())
+    await _save_watchlists()
+    return True
+
+def get_watchlist(guild_id: int) -> List[str]:
+    """Return a guild's watched tickers in alphabetical order."""
+    return sorted(_watchlists.get(guild_id, set()))
+
+def _watched_tickers() -> List[str]:
+    return sorted(set().union(*_watchlists.values())) if _watchlists else []
+
+async def _refresh_quote(ticker: str, ttl: float) -> bool:
+    """
+    Refresh one watched quote if a low-priority rate limit slot is free.
+    Returns False when the slot was left for interactive lookups.
     """
+    if ("quote", ticker) in _inflight or not _rate_limiter.try_acquire(reserve=INTERACTIVE_RESERVE):
+        return False
     try:
-        _check_rate_limit()
-        url = f"{FINNHUB_BASE_URL}/search"
-        params = {
-            "q": query,
-            "token": FINNHUB_API_KEY
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("result", [])
+        quote = await _finnhub_get("/quote", {"symbol": ticker}, acquire=False)
+        if quote:
+            await _stock_cache.set_async(("quote", ticker), quote, ttl)
     except Exception as e:
-        print(f"Error searching for stocks: {e}")
+        print(f"Error refreshing quote for {ticker}: {e}")
+    return True
+
+async def _refresh_loop():
+    """
+    Load the saved watchlists, then keep watched quotes warm. One refresh runs every
+    RATE_LIMIT_WINDOW / REFRESH_BUDGET seconds, cycling through all watched tickers. Refreshed
+    quotes live for one full cycle so /stock on a watched ticker is always a cache hit.
+    """
+    await _load_watchlists()
+    interval = RATE_LIMIT_WINDOW / REFRESH_BUDGET
+    while True:
+        tickers = _watched_tickers()
+        if not tickers:
+            await asyncio.sleep(interval)
+            continue
+        ttl = max(QUOTE_TTL, (len(tickers) + 1) * interval)
+        for ticker in tickers:
+            await asyncio.sleep(interval)
+            await _refresh_quote(ticker, ttl)
+
+def start_quote_refresher():
+    """Load saved watchlists and start the background refresh task (safe to call more than once)."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_loop())
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+class SymbolIndex:
+    """
+    In-memory search index over an exchange's symbol list.
+    Symbols and company name tokens are kept in sorted arrays, so every prefix lookup
+    is a binary search plus a walk over the matches; no API calls are needed.
+    """
+
+    # Cap on how many names one query token may match before intersecting
+    MAX_TOKEN_MATCHES = 5000
+
+    def __init__(self, symbols: List[Dict]):
+        self._entries = [
+            {
+                "symbol": item["symbol"],
+                "description": item.get("description", ""),
+                "displaySymbol": item.get("displaySymbol", item["symbol"]),
+                "type": item.get("type", ""),
+            }
+            for item in symbols if item.get("symbol")
+        ]
+        self._by_symbol = {entry["symbol"]: idx for idx, entry in enumerate(self._entries)}
+        self._symbols = sorted((entry["symbol"], idx) for idx, entry in enumerate(self._entries))
+        self._tokens = sorted(
+            (token, idx)
+            for idx, entry in enumerate(self._entries)
+            for token in set(_tokenize(entry["description"]))
+        )
+
+    @staticmethod
+    def _prefix_matches(pairs: List[Tuple[str, int]], prefix: str, limit: int) -> List[int]:
+        matches = []
+        pos = bisect.bisect_left(pairs, (prefix,))
+        while pos < len(pairs) and len(matches) < limit and pairs[pos][0].startswith(prefix):
+            matches.append(pairs[pos][1])
+            pos += 1
+        return matches
+
+    def search(self, query: str, limit: int = 25) -> List[Dict]:
+        """
+        Return up to `limit` entries ranked as: exact symbol, symbol prefix,
+        then companies whose name has a word starting with every query word.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        found: Dict[int, None] = {}
+        
+        symbol = query.upper()
+        if symbol in self._by_symbol:
+            found[self._by_symbol[symbol]] = None
+        if " " not in symbol:
+            found.update(dict.fromkeys(self._prefix_matches(self._symbols, symbol, limit)))
+        
+        tokens = _tokenize(query)
+        if tokens and len(found) < limit:
+            candidates = None
+            for token in tokens:
+                matches = set(self._prefix_matches(self._tokens, token, self.MAX_TOKEN_MATCHES))
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    break
+            if candidates:
+                lowered = query.lower()
+                ranked = sorted(
+                    candidates,
+                    key=lambda idx: (not self._entries[idx]["description"].lower().startswith(lowered),
+                                     len(self._entries[idx]["symbol"]), self._entries[idx]["symbol"]),
+                )
+                found.update(dict.fromkeys(ranked))
+        
+        return [dict(self._entries[idx]) for idx in list(found)[:limit]]
+
+    def __len__(self):
+        return len(self._entries)
+
+def _read_symbol_dump(path: str) -> Optional[List[Dict]]:
+    try:
+        if time.time() - os.path.getmtime(path) > SYMBOL_CACHE_MAX_AGE:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
+def _write_symbol_dump(path: str, symbols: List[Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(symbols, f)
+
+async def load_symbol_index() -> Optional[SymbolIndex]:
+    """
+    Build the local symbol index from the cached dump on disk, downloading a fresh
+    dump from Finnhub (one API call) if it is missing or older than SYMBOL_CACHE_MAX_AGE.
+    """
+    global _symbol_index
+    try:
+        symbols = await asyncio.to_thread(_read_symbol_dump, SYMBOL_CACHE_PATH)
+        if symbols is None:
+            symbols = await _finnhub_get("/stock/symbol", {"exchange": SYMBOL_EXCHANGE})
+            await asyncio.to_thread(_write_symbol_dump, SYMBOL_CACHE_PATH, symbols)
+        _symbol_index = await asyncio.to_thread(SymbolIndex, symbols)
+        print(f"Symbol index loaded with {len(_symbol_index)} symbols")
+    except Exception as e:
+        print(f"Error loading symbol index: {e}")
+    return _symbol_index
+
+def start_symbol_index_load():
+    """Load the symbol index in the background (safe to call more than once)."""
+    global _symbol_index_task
+    if _symbol_index is None and (_symbol_index_task is None or _symbol_index_task.done()):
+        _symbol_index_task = asyncio.get_running_loop().create_task(load_symbol_index())
+
+def autocomplete_tickers(current: str, limit: int = 25) -> List[Dict]:
+    """Return local symbol matches for autocomplete; empty until the index is loaded."""
+    if _symbol_index is None:
+        return []
+    return _symbol_index.search(current, limit)
+
+async def search_stocks_async(query: str) -> Optional[List[Dict]]:
+    """
+    Search for stocks by company name or ticker symbol without blocking the event loop.
+    Answers from the local symbol index when it has matches, otherwise asks Finnhub.
+    
+    Returns: List of matching companies
+    """
+    if _symbol_index is not None:
+        local = _symbol_index.search(query)
+        if local:
+            return local
+
+    async def fetch():
+        try:
+            data = await _finnhub_get("/search", {"q": query})
+            return data.get("result", [])
+        except Exception as e:
+            print(f"Error searching for stocks: {e}")
+            return None
+
+    return await _single_flight(("search", query.strip().lower()), fetch)
+
+def get_quote(ticker: str) -> Optional[Dict]:
+    """Synchronous wrapper around get_quote_async()."""
+    return _run_sync(get_quote_async(ticker))
+
+def get_company_profile(ticker: str) -> Optional[Dict]:
+    """Synchronous wrapper around get_company_profile_async()."""
+    return _run_sync(get_company_profile_async(ticker))
+
+def get_stock(ticker: str) -> Optional[Dict]:
+    """Synchronous wrapper around get_stock_async()."""
+    return _run_sync(get_stock_async(ticker))
+
+def search_stocks(query: str) -> Optional[List[Dict]]:
+    """Synchronous wrapper around search_stocks_async()."""
+    return _run_sync(search_stocks_async(query))
+
 def get_all_stocks() -> Dict:
     """Return cached stocks. Call get_stock() first to populate cache."""
-    return _stock_cache
+    return {
+        ticker: _build_stock_info(ticker, _stock_cache.peek(("quote", ticker)), _stock_cache.peek(("profile", ticker)))
+        for ticker in list_tickers()
+    }
 
 def list_tickers() -> List[str]:
-    """Return a list of cached ticker symbols."""
-    return list(_stock_cache.keys())
+    """Return a list of ticker symbols with fresh cached data."""
+    tickers = dict.fromkeys(ticker for _, ticker in _stock_cache.keys())
+    return [ticker for ticker in tickers
+            if _stock_cache.peek(("quote", ticker)) is not None or _stock_cache.peek(("profile", ticker)) is not None]
 
 def clear_cache():
     """Clear the stock data cache."""
-    global _stock_cache
-    _stock_cache = {}
+    _stock_cache.clear()
+
+def get_cache_stats() -> Dict[str, int]:
+    """Return size and hit/miss counters for the stock cache."""
+    return _stock_cache.stats()
 
 def get_api_usage() -> Dict[str, int]:
     """
     Get current API usage statistics.
     
-    Returns: Dictionary with call counts and limits
+    Returns: Dictionary with call counts, limits and queued callers
     """
-    current_time = time.time()
-    # Count calls in the current minute window
-    calls_this_minute = len([t for t in _api_call_times 
-                             if current_time - t < RATE_LIMIT_WINDOW])
-    
-    return {
-        "calls_this_minute": calls_this_minute,
-        "limit": RATE_LIMIT,
-        "remaining": RATE_LIMIT - calls_this_minute,
-        "total_calls": _total_api_calls
-    }
+    return _rate_limiter.usage()
@@ -0,0 +1,137 @@
+import os
+import sys
+import time
+import asyncio
+import pytest
+from unittest.mock import patch, MagicMock
+
+# Add parent directory to path to import cache_handler
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import cache_handler
+
+
+class TestTTLCache:
+    # Test cases for the in-process TTLCache tier
+
+    def test_ttl_cache_expiry(self):
+        # Test entries disappear after their own TTL
+        cache = cache_handler.TTLCache(max_size=10)
+        with patch('cache_handler.time.monotonic', return_value=100.0):
+            cache.set('short', 1, ttl=5)
+            cache.set('long', 2, ttl=500)
+        with patch('cache_handler.time.monotonic', return_value=110.0):
+            assert cache.get('short') is None
+            assert cache.get('long') == 2
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_ttl_cache_lru_eviction(self):
+        # Test the least recently used entry is evicted when full
+        cache = cache_handler.TTLCache(max_size=2)
+        cache.set('a', 1, ttl=60)
+        cache.set('b', 2, ttl=60)
+        cache.get('a')
+        cache.set('c', 3, ttl=60)
+
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+
+class TestSQLiteBackend:
+    # Test cases for the SQLite persistent tier
+
+    def test_set_get_and_expiry(self, tmp_path):
+        # Test values round trip and expire by wall clock time
+        backend = cache_handler.SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+        with patch('cache_handler.time.time', return_value=1000.0):
+            backend.set('stock:quote:AAPL', '{"c": 1}', ttl=10)
+            backend.set('mtg:bolt', '{"name": "Bolt"}', ttl=None)
+            assert backend.get('stock:quote:AAPL') == ('{"c": 1}', 10.0)
+        with patch('cache_handler.time.time', return_value=1011.0):
+            assert backend.get('stock:quote:AAPL') is None
+            assert backend.get('mtg:bolt') == ('{"name": "Bolt"}', None)
+
+    def test_clear_prefix(self, tmp_path):
+        # Test clearing one namespace leaves the others alone
+        backend = cache_handler.SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+        backend.set('stock:a', '1', ttl=60)
+        backend.set('mtg:a', '2', ttl=60)
+        backend.clear('stock:')
+
+        assert backend.get('stock:a') is None
+        assert backend.get('mtg:a') == ('2', pytest.approx(60, abs=1))
+
+
+class TestTieredCache:
+    # Test cases for the two-tier TieredCache
+
+    def test_survives_restart(self, tmp_path):
+        # Test a new process (fresh L1) is served from the persistent tier
+        path = str(tmp_path / 'cache.sqlite3')
+        cache_handler.TieredCache('stock', backend=cache_handler.SQLiteBackend(path)).set(('quote', 'AAPL'), {'c': 150.25}, ttl=60)
+
+        warm = cache_handler.TieredCache('stock', backend=cache_handler.SQLiteBackend(path))
+        assert warm.get(('quote', 'AAPL')) == {'c': 150.25}
+        assert warm.peek(('quote', 'AAPL')) == {'c': 150.25}
+        assert warm.stats()['hits'] == 1
+
+    def test_namespaces_are_isolated(self, tmp_path):
+        # Test the same key in two namespaces doesn't collide
+        backend = cache_handler.SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+        stock = cache_handler.TieredCache('stock', backend=backend)
+        mtg = cache_handler.TieredCache('mtg', backend=backend)
+        stock.set('key', 'stock value', ttl=60)
+
+        assert mtg.get('key') is None
+        assert stock.get('key') == 'stock value'
+
+    def test_backend_errors_fall_back_to_memory(self):
+        # Test an unreachable backend degrades to in-process caching
+        backend = MagicMock()
+        backend.get.side_effect = Exception("connection refused")
+        backend.set.side_effect = Exception("connection refused")
+        cache = cache_handler.TieredCache('stock', backend=backend)
+
+        cache.set('key', 1, ttl=60)
+        assert cache.get('key') == 1
+        assert cache.get('other') is None
+
+    @pytest.mark.asyncio
+    async def test_async_access_runs_off_the_event_loop(self, tmp_path):
+        # Test a slow backend read doesn't stall other coroutines, and async writes reach the backend
+        path = str(tmp_path / 'cache.sqlite3')
+        await cache_handler.TieredCache('stock', backend=cache_handler.SQLiteBackend(path)).set_async('key', {'c': 1}, ttl=60)
+
+        backend = cache_handler.SQLiteBackend(path)
+        slow_get = backend.get
+        backend.get = lambda key: (time.sleep(0.2), slow_get(key))[1]
+        cache = cache_handler.TieredCache('stock', backend=backend)
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.ensure_future(ticker())
+        value = await cache.get_async('key')
+        task.cancel()
+
+        assert value == {'c': 1}
+        assert ticks >= 5
+        assert await cache.get_async('key') == {'c': 1}
+        assert cache.stats()['hits'] == 2
+
+    @pytest.mark.asyncio
+    async def test_async_delete(self, tmp_path):
+        # Test delete_async removes the key from both tiers
+        backend = cache_handler.SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+        cache = cache_handler.TieredCache('stock', backend=backend)
+        await cache.set_async('key', 1, ttl=60)
+        await cache.delete_async('key')
+
+        assert await cache.get_async('key') is None
+        assert backend.get('stock:key') is None
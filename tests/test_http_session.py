@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+# Add parent directory to path to import http_session
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import http_session
+
+# to run: .venv/Scripts/python.exe -m pytest tests/test_http_session.py -v
+
+
+class TestSessionPool:
+    # Test cases for the shared aiohttp session pools
+
+    @pytest.mark.asyncio
+    async def test_session_is_reused(self):
+        # Test one pool hands out the same session until it is closed
+        pool = http_session.SessionPool(pool_size=2, timeout=5)
+        session = await pool.get()
+
+        assert await pool.get() is session
+        await pool.close()
+        assert session.closed
+        replacement = await pool.get()
+        assert replacement is not session
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_close_all(self):
+        # Test shutdown closes the sessions of every pool
+        first = http_session.SessionPool(pool_size=2, timeout=5)
+        second = http_session.SessionPool(pool_size=2, timeout=5, keepalive=10)
+        sessions = [await first.get(), await second.get()]
+
+        await http_session.close_all()
+
+        assert all(session.closed for session in sessions)
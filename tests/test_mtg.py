@@ -7,6 +7,14 @@ import discord
 # Add parent directory to path to import mtg_handler
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import mtg_handler
+import cache_handler
+
+
+@pytest.fixture(autouse=True)
+def reset_card_cache():
+    # Give every test an empty, in-process-only card cache
+    mtg_handler._card_cache = cache_handler.TieredCache("mtg", backend=None)
+    yield
 
 
 class TestFetchCardsByName:
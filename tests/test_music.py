@@ -8,10 +8,10 @@ import discord
 # Add parent directory to path to import music_handler
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# Mock Spotify and spotipy before importing music_handler
-with patch('spotipy.Spotify'):
-    with patch.dict(os.environ, {'SPOTIFY_CLIENT_ID': 'test_id', 'SPOTIFY_CLIENT_SECRET': 'test_secret'}):
-        import music_handler
+# Fake Spotify credentials before importing music_handler
+with patch.dict(os.environ, {'SPOTIFY_CLIENT_ID': 'test_id', 'SPOTIFY_CLIENT_SECRET': 'test_secret'}):
+    import music_handler
+from music_queue import GuildQueue, Track
 
 # to run: .venv/Scripts/python.exe -m pytest tests/test_music.py -v 
 
@@ -33,7 +33,7 @@ class TestQueueManagement:
         mock_message.guild.id = 12345
         mock_message.channel = AsyncMock()
         
-        music_handler.queue[mock_message.guild.id] = []
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
         
         await music_handler.show_queue(mock_message)
         
@@ -49,11 +49,11 @@ class TestQueueManagement:
         mock_message.guild.id = 12345
         mock_message.channel = AsyncMock()
         
-        music_handler.queue[mock_message.guild.id] = [
-            ("url1", "Song 1", True),
-            ("url2", "Song 2", False),
-            ("url3", "Song 3", True),
-        ]
+        music_handler.queue[mock_message.guild.id] = GuildQueue([
+            Track("q1", "Song 1", "url1"),
+            Track("q2", "Song 2"),
+            Track("q3", "Song 3", "url3"),
+        ])
         
         await music_handler.show_queue(mock_message)
         
@@ -65,6 +65,41 @@ class TestQueueManagement:
         assert "1." in args
         assert "2." in args
         assert "3." in args
+        assert mock_message.channel.send.call_args.kwargs.get("view") is None
+    
+    @pytest.mark.asyncio
+    async def test_show_queue_large_sends_one_page(self):
+        # Test a long queue only renders its first page and attaches page buttons
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.channel = AsyncMock()
+        
+        music_handler.queue[mock_message.guild.id] = GuildQueue(Track(f"q{i}", f"Song {i}") for i in range(5000))
+        
+        await music_handler.show_queue(mock_message)
+        
+        args = mock_message.channel.send.call_args[0][0]
+        assert len(args) < 2000
+        assert f"Song {music_handler.QUEUE_PAGE_SIZE - 1}" in args
+        assert f"Song {music_handler.QUEUE_PAGE_SIZE}\n" not in args + "\n"
+        assert isinstance(mock_message.channel.send.call_args.kwargs["view"], music_handler.QueuePageView)
+    
+    @pytest.mark.asyncio
+    async def test_queue_view_pages_edit_message(self):
+        # Test paging edits the existing message and clamps at the last page
+        music_handler.queue[1] = GuildQueue(Track(f"q{i}", f"Song {i}") for i in range(40))
+        view = music_handler.QueuePageView(1)
+        interaction = MagicMock()
+        interaction.response.edit_message = AsyncMock()
+        
+        await view.show_page(interaction, 1)
+        content = interaction.response.edit_message.call_args.kwargs["content"]
+        assert f"`{music_handler.QUEUE_PAGE_SIZE + 1}.` Song {music_handler.QUEUE_PAGE_SIZE}" in content
+        
+        await view.show_page(interaction, 99)
+        assert view.page == view.page_count() - 1
+        assert "Song 39" in interaction.response.edit_message.call_args.kwargs["content"]
     
     @pytest.mark.asyncio
     async def test_clear_queue_with_playing_music(self):
@@ -75,7 +110,7 @@ class TestQueueManagement:
         mock_message.channel = AsyncMock()
         mock_message.client = MagicMock()
         
-        music_handler.queue[mock_message.guild.id] = [("url1", "Song 1", True)]
+        music_handler.queue[mock_message.guild.id] = GuildQueue([Track("q1", "Song 1", "url1")])
         
         mock_voice_client = MagicMock()
         mock_voice_client.is_playing.return_value = True
@@ -85,9 +120,12 @@ class TestQueueManagement:
         with patch('discord.utils.get', return_value=mock_voice_client):
             await music_handler.clear_queue(mock_message)
         
-        assert music_handler.queue[mock_message.guild.id] == []
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
         mock_voice_client.stop.assert_called()
-        mock_voice_client.disconnect.assert_called()
+        # The bot stays connected through the idle grace period
+        mock_voice_client.disconnect.assert_not_called()
+        assert mock_message.guild.id in music_handler._idle_timers
+        music_handler.cancel_idle_disconnect(mock_message.guild.id)
         mock_message.channel.send.assert_called()
     
     @pytest.mark.asyncio
@@ -99,7 +137,7 @@ class TestQueueManagement:
         mock_message.channel = AsyncMock()
         mock_message.client = MagicMock()
         
-        music_handler.queue[mock_message.guild.id] = [("url1", "Song 1", True)]
+        music_handler.queue[mock_message.guild.id] = GuildQueue([Track("q1", "Song 1", "url1")])
         
         mock_voice_client = MagicMock()
         mock_voice_client.is_playing.return_value = False
@@ -109,7 +147,8 @@ class TestQueueManagement:
         with patch('discord.utils.get', return_value=mock_voice_client):
             await music_handler.clear_queue(mock_message)
         
-        assert music_handler.queue[mock_message.guild.id] == []
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
+        music_handler.cancel_idle_disconnect(mock_message.guild.id)
         mock_message.channel.send.assert_called()
 
 
@@ -217,71 +256,69 @@ class TestSpotifySongHandling:
         music_handler.queue = {}
         yield
         music_handler.queue = {}
+        music_handler.embed_ctx = {}
+    
+    @pytest.fixture
+    def mock_message(self):
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.channel = AsyncMock()
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), AsyncMock())
+        return mock_message
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
-    async def test_handle_spotify_song_success(self, mock_sp):
+    @patch('music_handler.update_embed', new_callable=AsyncMock)
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_song_success(self, mock_sp, mock_update, mock_message):
         # Test handling Spotify song link successfully  
-        mock_sp.track.return_value = {
+        mock_sp.get_track.return_value = {
+            "id": "4uLU6hMCjMI75M1A2tKUQC",
             "name": "Test Song",
             "artists": [{"name": "Artist 1"}, {"name": "Artist 2"}]
         }
         
-        mock_message = AsyncMock()
-        mock_message.guild = MagicMock()
-        mock_message.guild.id = 12345
-        mock_message.channel = AsyncMock()
-        
-        music_handler.queue[mock_message.guild.id] = []
-        
         await music_handler.handle_spotify_song(
             mock_message, 
-            "https://open.spotify.com/track/123456?si=abc"
+            "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC?si=abc"
         )
         
+        track = music_handler.queue[mock_message.guild.id][0]
         assert len(music_handler.queue[mock_message.guild.id]) == 1
-        assert "Test Song" in music_handler.queue[mock_message.guild.id][0][1]
-        assert "Artist 1" in music_handler.queue[mock_message.guild.id][0][1]
-        mock_message.channel.send.assert_called_once()
+        assert track.title == "Test Song - Artist 1, Artist 2"
+        assert track.spotify_id == "4uLU6hMCjMI75M1A2tKUQC"
+        mock_sp.get_track.assert_called_once_with("4uLU6hMCjMI75M1A2tKUQC")
+        mock_update.assert_called_once_with(mock_message.guild.id)
+        mock_message.channel.send.assert_not_called()
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
-    async def test_handle_spotify_song_invalid_link(self, mock_sp):
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_song_invalid_link(self, mock_sp, mock_message):
         # Test handling invalid Spotify link  
-        mock_message = AsyncMock()
-        mock_message.guild = MagicMock()
-        mock_message.guild.id = 12345
-        mock_message.channel = AsyncMock()
-        
-        music_handler.queue[mock_message.guild.id] = []
-        
         await music_handler.handle_spotify_song(
             mock_message, 
             "https://open.spotify.com/invalid"
         )
         
+        mock_sp.get_track.assert_not_called()
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
         mock_message.channel.send.assert_called_once()
         args = mock_message.channel.send.call_args[0][0]
         assert "invalid" in args.lower() or "failed" in args.lower()
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
-    async def test_handle_spotify_song_api_error(self, mock_sp):
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_song_api_error(self, mock_sp, mock_message):
         # Test handling Spotify API error  
-        mock_sp.track.side_effect = Exception("API Error")
-        
-        mock_message = AsyncMock()
-        mock_message.guild = MagicMock()
-        mock_message.guild.id = 12345
-        mock_message.channel = AsyncMock()
-        
-        music_handler.queue[mock_message.guild.id] = []
+        mock_sp.get_track.side_effect = Exception("API Error")
         
         await music_handler.handle_spotify_song(
             mock_message, 
-            "https://open.spotify.com/track/123456?si=abc"
+            "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC?si=abc"
         )
         
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
         mock_message.channel.send.assert_called_once()
         args = mock_message.channel.send.call_args[0][0]
         assert "invalid" in args.lower() or "failed" in args.lower()
@@ -297,73 +334,90 @@ class TestSpotifyPlaylistHandling:
         yield
         music_handler.queue = {}
     
-    @pytest.mark.asyncio
-    @patch('music_handler.sp')
-    async def test_handle_spotify_playlist_success(self, mock_sp):
-        # Test handling Spotify playlist successfully  
-        mock_sp.playlist_tracks.return_value = {
-            'items': [
-                {
-                    'track': {
-                        'name': 'Song 1',
-                        'artists': [{'name': 'Artist 1'}]
-                    }
-                },
-                {
-                    'track': {
-                        'name': 'Song 2',
-                        'artists': [{'name': 'Artist 2'}]
-                    }
-                }
-            ]
-        }
-        
+    @pytest.fixture
+    def mock_message(self):
         mock_message = AsyncMock()
         mock_message.guild = MagicMock()
         mock_message.guild.id = 12345
         mock_message.channel = AsyncMock()
-        mock_message.user = MagicMock()
-        mock_message.user.voice = None
-        mock_message.client = MagicMock()
-        
-        music_handler.queue[mock_message.guild.id] = []
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), AsyncMock())
+        return mock_message
+    
+    @pytest.mark.asyncio
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_playlist_success(self, mock_sp, mock_message):
+        # Test every page of a Spotify playlist is queued, not just the first
+        first_page = {
+            'items': [
+                {'track': {'name': 'Song 1', 'artists': [{'name': 'Artist 1'}]}},
+                {'track': None},
+            ],
+            'next': 'https://api.spotify.com/v1/playlists/123456/tracks?offset=100'
+        }
+        second_page = {
+            'items': [{'track': {'name': 'Song 2', 'artists': [{'name': 'Artist 2'}]}}],
+            'next': None
+        }
+        mock_sp.playlist_tracks.return_value = first_page
+        mock_sp.next_page.side_effect = [second_page, None]
         
-        with patch('discord.utils.get', return_value=MagicMock()):
+        with patch('music_handler.schedule_prefetch'):
             await music_handler.handle_spotify_playlist(
                 mock_message,
-                "https://open.spotify.com/playlist/123456?si=abc"
+                "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M?si=abc"
             )
+            # Playback can start after the first page; the rest loads in the background
+            assert len(music_handler.queue[mock_message.guild.id]) == 1
+            await asyncio.gather(*music_handler._ingest_tasks[mock_message.guild.id])
         
         assert len(music_handler.queue[mock_message.guild.id]) == 2
-        assert "Song 1" in music_handler.queue[mock_message.guild.id][0][1]
-        assert "Song 2" in music_handler.queue[mock_message.guild.id][1][1]
-        mock_message.channel.send.assert_called_once()
+        assert "Song 1" in music_handler.queue[mock_message.guild.id][0].title
+        assert "Song 2" in music_handler.queue[mock_message.guild.id][1].title
+        mock_sp.playlist_tracks.assert_called_once_with("37i9dQZF1DXcBWIGoYBM5M", limit=100)
+        mock_message.channel.send.assert_not_called()
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
-    async def test_handle_spotify_playlist_api_error(self, mock_sp):
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_playlist_api_error(self, mock_sp, mock_message):
         # Test handling Spotify playlist API error  
         mock_sp.playlist_tracks.side_effect = Exception("API Error")
         
-        mock_message = AsyncMock()
-        mock_message.guild = MagicMock()
-        mock_message.guild.id = 12345
-        mock_message.channel = AsyncMock()
-        mock_message.user = MagicMock()
-        mock_message.user.voice = None
-        mock_message.client = MagicMock()
-        
-        music_handler.queue[mock_message.guild.id] = []
-        
-        with patch('discord.utils.get', return_value=MagicMock()):
-            await music_handler.handle_spotify_playlist(
-                mock_message,
-                "https://open.spotify.com/playlist/123456?si=abc"
-            )
+        await music_handler.handle_spotify_playlist(
+            mock_message,
+            "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M?si=abc"
+        )
         
         mock_message.channel.send.assert_called_once()
         args = mock_message.channel.send.call_args[0][0]
         assert "failed" in args.lower()
+    
+    @pytest.mark.asyncio
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_album(self, mock_sp, mock_message):
+        # Test album tracks (plain track objects) are queued
+        mock_sp.album_tracks.return_value = {
+            'items': [{'name': 'Album Song', 'artists': [{'name': 'Band'}]}],
+            'next': None
+        }
+        
+        await music_handler.handle_spotify_album(mock_message, "https://open.spotify.com/album/1DFixLWuPkv3KT3TnV35m3?si=x")
+        
+        tracks = music_handler.queue[mock_message.guild.id].snapshot()
+        assert [(track.query, track.title, track.url) for track in tracks] == [("Album Song Band Audio", "Album Song - Band", None)]
+    
+    @pytest.mark.asyncio
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_handle_spotify_artist(self, mock_sp, mock_message):
+        # Test an artist link queues their top tracks
+        mock_sp.artist_top_tracks.return_value = {
+            'tracks': [{'name': f'Hit {i}', 'artists': [{'name': 'Star'}]} for i in range(3)]
+        }
+        
+        await music_handler.handle_spotify_artist(mock_message, "https://open.spotify.com/artist/0OdUWJ0sBjDrqHygGUXeCF")
+        
+        assert len(music_handler.queue[mock_message.guild.id]) == 3
+        mock_sp.artist_top_tracks.assert_called_once_with("0OdUWJ0sBjDrqHygGUXeCF")
 
 
 class TestSongSearch:
@@ -377,18 +431,13 @@ class TestSongSearch:
         music_handler.queue = {}
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
     async def test_handle_song_search_success(self, mock_sp):
         # Test song search on Spotify successfully  
-        mock_sp.search.return_value = {
-            'tracks': {
-                'items': [
-                    {
-                        'name': 'Search Result Song',
-                        'artists': [{'name': 'Search Result Artist'}]
-                    }
-                ]
-            }
+        mock_sp.search_track.return_value = {
+            'id': 'sp1',
+            'name': 'Search Result Song',
+            'artists': [{'name': 'Search Result Artist'}]
         }
         
         mock_message = AsyncMock()
@@ -399,13 +448,14 @@ class TestSongSearch:
         assert result is not None
         assert "Search Result Song" in result[1]
         assert "Search Result Artist" in result[1]
-        mock_sp.search.assert_called_once()
+        assert result[2] == "sp1"
+        mock_sp.search_track.assert_called_once()
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
     async def test_handle_song_search_no_results(self, mock_sp):
         # Test song search with no results  
-        mock_sp.search.return_value = {'tracks': {'items': []}}
+        mock_sp.search_track.return_value = None
         
         mock_message = AsyncMock()
         mock_message.channel = AsyncMock()
@@ -418,22 +468,16 @@ class TestSongSearch:
         assert "no results" in args.lower()
     
     @pytest.mark.asyncio
-    @patch('music_handler.sp')
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
     async def test_handle_song_search_multiple_artists(self, mock_sp):
         # Test song search with multiple artists  
-        mock_sp.search.return_value = {
-            'tracks': {
-                'items': [
-                    {
-                        'name': 'Collab Song',
-                        'artists': [
-                            {'name': 'Artist 1'},
-                            {'name': 'Artist 2'},
-                            {'name': 'Artist 3'}
-                        ]
-                    }
-                ]
-            }
+        mock_sp.search_track.return_value = {
+            'name': 'Collab Song',
+            'artists': [
+                {'name': 'Artist 1'},
+                {'name': 'Artist 2'},
+                {'name': 'Artist 3'}
+            ]
         }
         
         mock_message = AsyncMock()
@@ -471,7 +515,7 @@ class TestPlayFunction:
         mock_message.user.voice.channel = MagicMock()
         mock_message.client = MagicMock()
         
-        music_handler.queue[mock_message.guild.id] = []
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
         
         mock_voice_client = MagicMock()
         mock_voice_client.is_playing.return_value = False
@@ -480,7 +524,7 @@ class TestPlayFunction:
         with patch('music_handler.play_next', new_callable=AsyncMock):
             await music_handler.play(
                 mock_message,
-                "https://open.spotify.com/playlist/123456"
+                "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"
             )
         
         mock_handle.assert_called_once()
@@ -499,7 +543,7 @@ class TestPlayFunction:
         mock_message.user.voice.channel = MagicMock()
         mock_message.client = MagicMock()
         
-        music_handler.queue[mock_message.guild.id] = []
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
         
         mock_voice_client = MagicMock()
         mock_voice_client.is_playing.return_value = False
@@ -508,7 +552,7 @@ class TestPlayFunction:
         with patch('music_handler.play_next', new_callable=AsyncMock):
             await music_handler.play(
                 mock_message,
-                "https://open.spotify.com/track/123456"
+                "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC"
             )
         
         mock_handle.assert_called_once()
@@ -528,10 +572,12 @@ class TestPlayFunction:
         assert "voice channel" in args.lower()
     
     @pytest.mark.asyncio
+    @patch('music_handler.update_embed', new_callable=AsyncMock)
+    @patch('music_handler.get_voice_client')
     @patch('music_handler.handle_song_search')
-    async def test_play_text_query(self, mock_search):
-        # Test playing with text search query  
-        mock_search.return_value = ("search query", "Song Title", False)
+    async def test_play_text_query(self, mock_search, mock_get_voice, mock_update):
+        # Test a text search queues the Spotify match with its Spotify id
+        mock_search.return_value = ("search query", "Song Title", "sp1")
         
         mock_message = AsyncMock()
         mock_message.guild = MagicMock()
@@ -542,7 +588,182 @@ class TestPlayFunction:
         mock_message.user.voice.channel = MagicMock()
         mock_message.client = MagicMock()
         
-        music_handler.queue[mock_message.guild.id] = []
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        mock_voice_client = MagicMock()
+        mock_voice_client.is_playing.return_value = False
+        mock_voice_client.is_paused.return_value = False
+        mock_get_voice.return_value = mock_voice_client
+        
+        with patch('music_handler.play_next', new_callable=AsyncMock):
+            await music_handler.play(mock_message, "some song")
+        
+        track = music_handler.queue[mock_message.guild.id][0]
+        assert (track.query, track.title, track.spotify_id) == ("search query", "Song Title", "sp1")
+        music_handler.embed_ctx = {}
+
+
+class TestParseLink:
+    # Test cases for classifying /play input
+
+    @pytest.mark.parametrize("text, kind, link_id, url", [
+        ("https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC?si=abc", "spotify_track", "4uLU6hMCjMI75M1A2tKUQC",
+         "https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC"),
+        ("https://open.spotify.com/intl-de/album/1DFixLWuPkv3KT3TnV35m3", "spotify_album", "1DFixLWuPkv3KT3TnV35m3",
+         "https://open.spotify.com/album/1DFixLWuPkv3KT3TnV35m3"),
+        ("open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M", "spotify_playlist", "37i9dQZF1DXcBWIGoYBM5M",
+         "https://open.spotify.com/playlist/37i9dQZF1DXcBWIGoYBM5M"),
+        ("spotify:artist:0OdUWJ0sBjDrqHygGUXeCF", "spotify_artist", "0OdUWJ0sBjDrqHygGUXeCF",
+         "https://open.spotify.com/artist/0OdUWJ0sBjDrqHygGUXeCF"),
+        ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLabc&index=3", "youtube_video", "dQw4w9WgXcQ",
+         "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+        ("https://youtu.be/dQw4w9WgXcQ?si=x", "youtube_video", "dQw4w9WgXcQ",
+         "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+        ("https://youtube.com/shorts/dQw4w9WgXcQ", "youtube_video", "dQw4w9WgXcQ",
+         "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+        ("https://music.youtube.com/watch?v=dQw4w9WgXcQ", "youtube_video", "dQw4w9WgXcQ",
+         "https://www.youtube.com/watch?v=dQw4w9WgXcQ"),
+        ("https://www.youtube.com/playlist?list=PLabc", "youtube_playlist", "PLabc",
+         "https://www.youtube.com/playlist?list=PLabc"),
+        ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=RDdQw4w9WgXcQ", "youtube_mix", "RDdQw4w9WgXcQ",
+         "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=RDdQw4w9WgXcQ"),
+    ])
+    def test_links(self, text, kind, link_id, url):
+        # Test supported links map to their kind, id and canonical link
+        assert music_handler.parse_link(text) == (kind, link_id, url)
+
+    @pytest.mark.parametrize("text", ["never gonna give you up", "spotify wrapped songs", "Mr. Brightside", "youtube"])
+    def test_search_text(self, text):
+        # Test plain text is a search, even when it mentions spotify or youtube
+        assert music_handler.parse_link(text).kind == "search"
+
+    @pytest.mark.parametrize("text", ["https://open.spotify.com/show/abc", "https://www.youtube.com/@channel",
+                                      "https://open.spotify.com/track/123456",
+                                      "https://youtu.be/short", "https://spotify.link/AbCdEf123",
+                                      "spotify.app.link/AbCdEf123?_p=x"])
+    def test_unsupported(self, text):
+        # Test Spotify/YouTube links without a playable id are rejected
+        assert music_handler.parse_link(text).kind == "unsupported"
+
+    def test_share_link_message(self):
+        # Test a Spotify share link gets its own hint instead of being searched for
+        link_info = music_handler.parse_link("https://spotify.link/AbCdEf123")
+        assert "open.spotify.com" in music_handler.unsupported_link_message(link_info)
+        assert "isn't supported" in music_handler.unsupported_link_message(music_handler.parse_link("https://youtu.be/short"))
+
+    @pytest.mark.asyncio
+    @patch('music_handler.handle_youtube_song')
+    @patch('music_handler.handle_youtube_playlist')
+    @patch('music_handler.get_voice_client')
+    async def test_play_routes_video_in_playlist_as_video(self, mock_get_voice, mock_playlist, mock_song):
+        # Test a watch link opened from a playlist queues only that video
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_get_voice.return_value = MagicMock()
+        music_handler.embed_ctx[mock_message.guild.id] = None
+
+        with patch('music_handler.play_next', new_callable=AsyncMock):
+            await music_handler.play(mock_message, "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLabc")
+
+        mock_playlist.assert_not_called()
+        mock_song.assert_called_once_with(mock_message, "https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        music_handler.embed_ctx = {}
+
+
+class TestMultipleSongs:
+    # Test cases for queuing several songs from one /play
+
+    @pytest.fixture
+    def mock_message(self):
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.channel = AsyncMock()
+        music_handler.queue = {mock_message.guild.id: GuildQueue()}
+        music_handler.embed_ctx = {}
+        yield mock_message
+        music_handler.cancel_ingest(mock_message.guild.id)
+        music_handler.queue = {}
+
+    def test_split_entries(self):
+        # Test entries split on semicolons and new lines, ignoring blanks
+        assert music_handler.split_entries("song a; song b\n\nsong c;") == ["song a", "song b", "song c"]
+        assert music_handler.split_entries("just one song") == ["just one song"]
+
+    @pytest.mark.asyncio
+    async def test_queued_in_order_as_resolved(self, mock_message):
+        # Test entries resolve concurrently, queue in the order given and the first is queued before the rest finish
+        delays = {"a": 0.01, "b": 0.05, "c": 0.0, "missing": 0.0}
+        started = []
+
+        async def fake_resolve(entry):
+            started.append(entry)
+            await asyncio.sleep(delays[entry])
+            return None if entry == "missing" else Track(entry, entry.upper())
+
+        with patch('music_handler.resolve_entry', side_effect=fake_resolve):
+            await music_handler.handle_multiple_songs(mock_message, ["a", "b", "missing", "c"])
+            guild_queue = music_handler.queue[mock_message.guild.id]
+            assert [track.title for track in guild_queue] == ["A"]
+            assert started == ["a", "b", "missing", "c"]
+            await asyncio.gather(*music_handler._ingest_tasks[mock_message.guild.id])
+
+        assert [track.title for track in guild_queue] == ["A", "B", "C"]
+        assert "missing" in mock_message.channel.send.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_entry_limit(self, mock_message):
+        # Test only MULTI_PLAY_MAX entries are taken from one /play
+        async def fake_resolve(entry):
+            return Track(entry, entry)
+
+        with patch.object(music_handler, 'MULTI_PLAY_MAX', 2), \
+             patch('music_handler.resolve_entry', side_effect=fake_resolve) as mock_resolve:
+            await music_handler.handle_multiple_songs(mock_message, ["a", "b", "c"])
+            await asyncio.gather(*music_handler._ingest_tasks.get(mock_message.guild.id, ()))
+
+        assert mock_resolve.call_count == 2
+        assert len(music_handler.queue[mock_message.guild.id]) == 2
+
+    @pytest.mark.asyncio
+    @patch('music_handler.spotify_handler', new_callable=AsyncMock)
+    async def test_resolve_search_entry(self, mock_spotify):
+        # Test a search entry is matched on Spotify and its stream resolved up front
+        mock_spotify.search_track.return_value = {"id": "sp1", "name": "Song", "artists": [{"name": "Artist"}]}
+
+        async def fake_resolve(query):
+            return {"url": "http://stream", "thumbnail": None, "acodec": "opus", "id": "dQw4w9WgXcQ"}
+
+        import cache_handler
+        with patch('music_handler._resolve_query', side_effect=fake_resolve), \
+             patch.object(music_handler, '_spotify_matches', cache_handler.TieredCache("spotify_yt", backend=None)):
+            track = await music_handler.resolve_entry("multi entry song")
+
+        assert (track.title, track.spotify_id, track.url) == ("Song - Artist", "sp1", "http://stream")
+        assert track.video_id == "dQw4w9WgXcQ"
+
+    @pytest.mark.asyncio
+    async def test_resolve_rejects_collections(self):
+        # Test playlists in a list are skipped instead of queued as one song
+        assert await music_handler.resolve_entry("https://open.spotify.com/playlist/abc") is None
+
+    @pytest.mark.asyncio
+    @patch('music_handler.handle_multiple_songs')
+    @patch('music_handler.handle_song_search')
+    @patch('music_handler.get_voice_client')
+    async def test_play_routes_lists(self, mock_get_voice, mock_search, mock_multiple, mock_message):
+        # Test /play with several entries takes the multi-song path
+        mock_voice_client = MagicMock()
+        mock_voice_client.is_playing.return_value = False
+        mock_voice_client.is_paused.return_value = False
+        mock_get_voice.return_value = mock_voice_client
+        with patch('music_handler.play_next', new_callable=AsyncMock) as mock_play_next:
+            await music_handler.play(mock_message, "song a; https://youtu.be/dQw4w9WgXcQ")
+
+        mock_multiple.assert_called_once_with(mock_message, ["song a", "https://youtu.be/dQw4w9WgXcQ"])
+        mock_search.assert_not_called()
+        mock_play_next.assert_called_once()
+        music_handler.embed_ctx = {}
 
 
 class TestYouTubeSongHandling:
@@ -556,13 +777,17 @@ class TestYouTubeSongHandling:
         music_handler.queue = {}
     
     @pytest.mark.asyncio
-    @patch('music_handler.run_yt_dlp_search')
-    async def test_handle_youtube_song_success(self, mock_search):
+    @patch('music_handler.update_embed', new_callable=AsyncMock)
+    @patch('music_handler.extract_info', new_callable=AsyncMock)
+    async def test_handle_youtube_song_success(self, mock_extract, mock_update):
         # Test handling YouTube song successfully  
-        mock_search.return_value = {
+        mock_extract.return_value = {
+            'id': 'dQw4w9WgXcQ',
             'title': 'Test Video',
             'url': 'http://example.com/stream',
-            'uploader': 'Test Uploader'
+            'thumbnail': 'http://example.com/thumb',
+            'uploader': 'Test Uploader',
+            'acodec': 'opus'
         }
         
         mock_message = AsyncMock()
@@ -570,21 +795,69 @@ class TestYouTubeSongHandling:
         mock_message.guild.id = 12345
         mock_message.channel = AsyncMock()
         
-        music_handler.queue[mock_message.guild.id] = []
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), AsyncMock())
+        music_handler._stream_cache.clear()
         
-        with patch('asyncio.to_thread', new_callable=AsyncMock) as mock_thread:
-            mock_thread.return_value = {
-                'title': 'Test Video',
-                'url': 'http://example.com/stream',
-                'uploader': 'Test Uploader'
-            }
-            await music_handler.handle_youtube_song(
-                mock_message,
-                "https://youtu.be/123456"
-            )
+        await music_handler.handle_youtube_song(
+            mock_message,
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+        )
         
+        track = music_handler.queue[mock_message.guild.id][0]
         assert len(music_handler.queue[mock_message.guild.id]) == 1
-        mock_message.channel.send.assert_called_once()
+        assert (track.title, track.url, track.codec, track.video_id) == (
+            "Test Video - Test Uploader", "http://example.com/stream", "opus", "dQw4w9WgXcQ"
+        )
+        mock_extract.assert_called_once_with("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        mock_update.assert_called_once_with(mock_message.guild.id)
+        mock_message.channel.send.assert_not_called()
+        music_handler.embed_ctx = {}
+
+    @pytest.mark.asyncio
+    @patch('music_handler.extract_info', new_callable=AsyncMock)
+    async def test_handle_youtube_song_shares_search_cache_entry(self, mock_extract):
+        # Test a video found by /play link and by prefetch share one cached entry and title
+        mock_extract.return_value = {
+            'id': 'dQw4w9WgXcQ', 'title': 'Test Video', 'uploader': 'Test Uploader',
+            'url': 'http://example.com/stream', 'thumbnail': 'http://example.com/thumb',
+        }
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), AsyncMock())
+        music_handler._stream_cache.clear()
+
+        with patch('music_handler.update_embed', new_callable=AsyncMock):
+            await asyncio.gather(
+                music_handler.handle_youtube_song(mock_message, "https://youtu.be/dQw4w9WgXcQ"),
+                music_handler.resolve_query("https://youtu.be/dQw4w9WgXcQ"),
+            )
+
+        mock_extract.assert_called_once()
+        assert music_handler.queue[mock_message.guild.id][0].title == "Test Video - Test Uploader"
+        assert music_handler._stream_cache.get("yt:dQw4w9WgXcQ")["title"] == "Test Video - Test Uploader"
+        music_handler.embed_ctx = {}
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("outcome", [None, Exception("Video unavailable")])
+    async def test_handle_youtube_song_failure_replies(self, outcome):
+        # Test the user is told when a video can't be extracted, instead of the error only being printed
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.channel = AsyncMock()
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), AsyncMock())
+        music_handler._stream_cache.clear()
+
+        with patch('music_handler.extract_info', new_callable=AsyncMock, side_effect=[outcome]):
+            await music_handler.handle_youtube_song(mock_message, "https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
+        assert "Couldn't load that video" in mock_message.channel.send.call_args[0][0]
+        music_handler.embed_ctx = {}
 
 
 class TestYouTubePlaylistHandling:
@@ -598,140 +871,826 @@ class TestYouTubePlaylistHandling:
         music_handler.queue = {}
     
     @pytest.mark.asyncio
-    @patch('music_handler.run_yt_dlp_search')
-    async def test_handle_youtube_playlist_success(self, mock_search):
-        # Test handling YouTube playlist successfully  
-        mock_search.return_value = {
-            'entries': [
-                {
-                    'title': 'Video 1',
-                    'url': 'http://example.com/stream1',
-                    'uploader': 'Uploader 1'
-                },
-                {
-                    'title': 'Video 2',
-                    'url': 'http://example.com/stream2',
-                    'uploader': 'Uploader 2'
-                }
-            ]
-        }
+    async def test_handle_youtube_playlist_success(self):
+        # Test flat playlist entries are queued unresolved
+        def fake_flat(link, on_chunk):
+            on_chunk([
+                {'id': 'aaaaaaaaaaa', 'title': 'Video 1', 'url': 'https://www.youtube.com/watch?v=aaaaaaaaaaa', 'uploader': 'Uploader 1'},
+                {'id': 'bbbbbbbbbbb', 'title': 'Video 2', 'channel': 'Uploader 2'},
+                {'id': 'ccccccccccc', 'title': '[Private video]'},
+            ])
         
         mock_message = AsyncMock()
         mock_message.guild = MagicMock()
         mock_message.guild.id = 12345
         mock_message.channel = AsyncMock()
         
-        music_handler.queue[mock_message.guild.id] = []
-        
-        with patch('asyncio.to_thread', new_callable=AsyncMock) as mock_thread:
-            mock_thread.return_value = {
-                'entries': [
-                    {
-                        'title': 'Video 1',
-                        'url': 'http://example.com/stream1',
-                        'uploader': 'Uploader 1'
-                    },
-                    {
-                        'title': 'Video 2',
-                        'url': 'http://example.com/stream2',
-                        'uploader': 'Uploader 2'
-                    }
-                ]
-            }
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        mock_ctx = AsyncMock()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), mock_ctx)
+        
+        with patch('music_handler.run_yt_dlp_flat_playlist', side_effect=fake_flat):
             await music_handler.handle_youtube_playlist(
                 mock_message,
                 "https://www.youtube.com/playlist?list=123456"
             )
         
-        assert len(music_handler.queue[mock_message.guild.id]) == 2
-        mock_message.channel.send.assert_called_once()
+        assert [(track.query, track.title) for track in music_handler.queue[mock_message.guild.id]] == [
+            ("https://www.youtube.com/watch?v=aaaaaaaaaaa", "Video 1 - Uploader 1"),
+            ("https://www.youtube.com/watch?v=bbbbbbbbbbb", "Video 2 - Uploader 2"),
+        ]
+        mock_ctx.edit_original_response.assert_called()
+    
+    @pytest.mark.asyncio
+    async def test_playlist_streams_in_background(self):
+        # Test the handler returns after the first chunk and the rest keeps arriving
+        import time
+        
+        def fake_flat(link, on_chunk):
+            for page in range(3):
+                on_chunk([{'id': f'{page}' * 11, 'title': f'Video {page}'}])
+                time.sleep(0.02)
+        
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.channel = AsyncMock()
+        music_handler.queue[mock_message.guild.id] = GuildQueue()
+        embed = discord.Embed()
+        embed.add_field(name="Song", value="None")
+        embed.add_field(name="Queued: ", value="None")
+        music_handler.embed_ctx[mock_message.guild.id] = (embed, AsyncMock())
+        
+        with patch('music_handler.run_yt_dlp_flat_playlist', side_effect=fake_flat), \
+             patch('music_handler.schedule_prefetch'):
+            await music_handler.handle_youtube_playlist(mock_message, "https://www.youtube.com/playlist?list=1")
+            assert len(music_handler.queue[mock_message.guild.id]) == 1
+            assert "loading" in embed.fields[1].value
+            
+            await asyncio.gather(*music_handler._ingest_tasks[mock_message.guild.id])
+        
+        assert len(music_handler.queue[mock_message.guild.id]) == 3
+        assert embed.fields[1].value == "📃 Queued 3 songs"
+
+    @pytest.mark.asyncio
+    async def test_playlist_walk_counts_as_extraction(self):
+        # Test a playlist walk shows up in the extraction pool stats until its thread finishes
+        import threading
+        release = threading.Event()
+
+        def fake_flat(link, on_chunk):
+            on_chunk([{'id': 'a' * 11, 'title': 'Video'}])
+            release.wait(1)
+
+        with patch('music_handler.run_yt_dlp_flat_playlist', side_effect=fake_flat):
+            pages = music_handler.flat_playlist_pages("https://www.youtube.com/playlist?list=1")
+            assert len(await pages.__anext__()) == 1
+            assert music_handler.extraction_stats()['running'] == 1
+
+            release.set()
+            assert [chunk async for chunk in pages] == []
+
+        assert music_handler.extraction_stats()['running'] == 0
 
 
 class TestPlayNext:
-    # Test cases for play_next functionality
+    # Test cases for play_next and the per-guild player task
     
     @pytest.fixture(autouse=True)
     def reset_queue(self):
         # Reset queue before each test
         music_handler.queue = {}
-        yield
+        music_handler._players = {}
+        music_handler._stream_cache.clear()
+        with patch.object(music_handler, 'PLAYBACK_MODE', 'pcm'):
+            yield
+        for task in music_handler._players.values():
+            task.cancel()
+        music_handler.cancel_idle_disconnect(12345)
         music_handler.queue = {}
+        music_handler.embed_ctx = {}
+    
+    @pytest.fixture
+    def mock_message(self):
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.client = MagicMock()
+        mock_message.channel = AsyncMock()
+        music_handler.embed_ctx[mock_message.guild.id] = (MagicMock(), AsyncMock())
+        return mock_message
+    
+    @pytest.fixture
+    def mock_voice_client(self):
+        # A voice client whose songs end as soon as they start
+        mock_voice_client = MagicMock()
+        mock_voice_client.is_connected.return_value = True
+        mock_voice_client.play.side_effect = lambda source, after: after(None)
+        mock_voice_client.disconnect = AsyncMock()
+        return mock_voice_client
     
     @pytest.mark.asyncio
     @patch('music_handler.run_yt_dlp_search')
     @patch('discord.FFmpegPCMAudio')
     @patch('discord.utils.get')
-    async def test_play_next_with_queue(self, mock_get, mock_ffmpeg, mock_search):
-        # Test playing next song when queue has songs
+    async def test_play_next_with_queue(self, mock_get, mock_ffmpeg, mock_search, mock_message, mock_voice_client):
+        # Test the player plays every queued song in order, then starts the idle timer instead of leaving
         mock_search.return_value = {
             'title': 'Test Song',
             'url': 'http://example.com/stream',
-            'uploader': 'Test Uploader'
+            'thumbnail': 'http://example.com/thumb'
         }
-        mock_ffmpeg.return_value = MagicMock()
+        mock_get.return_value = mock_voice_client
         
-        mock_voice_client = MagicMock()
-        mock_voice_client.is_playing.return_value = False
-        mock_voice_client.play = MagicMock()
-        mock_voice_client.is_connected.return_value = True
+        music_handler.queue[mock_message.guild.id] = GuildQueue([
+            Track("q1", "Song 1", "url1"),
+            Track("q2", "Song 2"),
+        ])
+        
+        with patch.object(music_handler, 'EARLY_END_SECONDS', 0), patch('music_handler.schedule_prefetch'):
+            await music_handler.play_next(mock_message)
+            await music_handler._players[mock_message.guild.id]
+        
+        assert [c.args[0] for c in mock_ffmpeg.call_args_list] == ["url1", "http://example.com/stream"]
+        assert mock_voice_client.play.call_count == 2
+        mock_voice_client.disconnect.assert_not_called()
+        assert mock_message.guild.id in music_handler._idle_timers
+        assert "empty" in mock_message.channel.send.call_args[0][0].lower()
+        assert mock_message.guild.id not in music_handler._players
+    
+    @pytest.mark.asyncio
+    @patch('discord.FFmpegPCMAudio')
+    @patch('discord.utils.get')
+    async def test_play_next_skips_bad_entries_without_recursion(self, mock_get, mock_ffmpeg, mock_message, mock_voice_client):
+        # Test a long run of unresolvable songs is skipped in the loop, not by recursing
         mock_get.return_value = mock_voice_client
         
-        mock_message = AsyncMock()
-        mock_message.guild = MagicMock()
-        mock_message.guild.id = 12345
-        mock_message.client = MagicMock()
-        mock_message.channel = AsyncMock()
+        async def fake_resolve(query):
+            return {"url": "http://stream/good"} if query == "good" else None
         
-        music_handler.queue[mock_message.guild.id] = [
-            ("url1", "Song 1", True),
-            ("url2", "Song 2", False),
-        ]
+        music_handler.queue[mock_message.guild.id] = GuildQueue(
+            [Track(f"bad{i}", f"Bad {i}") for i in range(2000)] + [Track("good", "Good")]
+        )
         
-        with patch('asyncio.to_thread', new_callable=AsyncMock) as mock_thread:
-            mock_thread.return_value = {
-                'title': 'Test Song',
-                'url': 'http://example.com/stream',
-                'uploader': 'Test Uploader'
-            }
+        with patch.object(music_handler, 'EARLY_END_SECONDS', 0), \
+             patch('music_handler.resolve_query', side_effect=fake_resolve), \
+             patch('music_handler.schedule_prefetch'):
             await music_handler.play_next(mock_message)
+            await music_handler._players[mock_message.guild.id]
+        
+        mock_ffmpeg.assert_called_once_with("http://stream/good", **music_handler.FFMPEG_OPTIONS)
     
     @pytest.mark.asyncio
     @patch('music_handler.run_yt_dlp_search')
     @patch('discord.FFmpegPCMAudio')
     @patch('discord.utils.get')
-    async def test_play_next_calls_voice_client(self, mock_get, mock_ffmpeg, mock_search):
-        # Test that play_next uses the voice client
-        mock_search.return_value = {
-            'title': 'Test Song',
-            'url': 'http://example.com/stream',
-            'uploader': 'Test Uploader'
-        }
-        mock_ffmpeg.return_value = MagicMock()
-        
+    async def test_skip_right_after_start(self, mock_get, mock_ffmpeg, mock_search, mock_message):
+        # Test /next just after a song starts moves on instead of retrying the skipped song
+        playing = {}
+        mock_voice_client = MagicMock()
+        mock_voice_client.is_connected.return_value = True
+        mock_voice_client.is_playing.side_effect = lambda: bool(playing)
+        mock_voice_client.is_paused.return_value = False
+        mock_voice_client.play.side_effect = lambda source, after: playing.update(after=after)
+        mock_voice_client.stop.side_effect = lambda: playing.pop("after")(None)
+        mock_get.return_value = mock_voice_client
+
+        music_handler.queue[mock_message.guild.id] = GuildQueue([
+            Track("qa", "Song A", "urlA"),
+            Track("qb", "Song B", "urlB"),
+        ])
+
+        with patch('music_handler.schedule_prefetch'):
+            await music_handler.play_next(mock_message)
+            await asyncio.sleep(0.01)
+            await music_handler.skip(mock_message)
+            await asyncio.sleep(0.01)
+
+        assert [c.args[0] for c in mock_ffmpeg.call_args_list] == ["urlA", "urlB"]
+        mock_search.assert_not_called()
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
+
+    @pytest.mark.asyncio
+    @patch('discord.utils.get')
+    async def test_play_next_keeps_one_player(self, mock_get, mock_message):
+        # Test calling play_next while a song is playing doesn't start a second player
         mock_voice_client = MagicMock()
-        mock_voice_client.is_playing.return_value = False
-        mock_voice_client.play = MagicMock()
         mock_voice_client.is_connected.return_value = True
         mock_get.return_value = mock_voice_client
+        music_handler.queue[mock_message.guild.id] = GuildQueue([Track("q1", "Song 1", "url1")])
+        
+        with patch('discord.FFmpegPCMAudio'), patch('music_handler.schedule_prefetch'):
+            await music_handler.play_next(mock_message)
+            player = music_handler._players[mock_message.guild.id]
+            await asyncio.sleep(0)
+            await music_handler.play_next(mock_message)
+            
+            assert music_handler._players[mock_message.guild.id] is player
+            mock_voice_client.play.assert_called_once()
+    
+    @pytest.mark.asyncio
+    @patch('discord.utils.get', return_value=None)
+    async def test_play_next_without_voice(self, mock_get, mock_message):
+        # Test nothing starts when the bot isn't connected
+        music_handler.queue[mock_message.guild.id] = GuildQueue([Track("q1", "Song 1", "url1")])
         
+        await music_handler.play_next(mock_message)
+        
+        mock_get.assert_called()
+        assert mock_message.guild.id not in music_handler._players
+
+
+class TestAudioSource:
+    # Test cases for picking Opus passthrough or PCM playback
+
+    @pytest.mark.asyncio
+    @patch('discord.FFmpegOpusAudio')
+    async def test_opus_stream_is_copied(self, mock_opus):
+        # Test Opus streams are passed through without re-encoding
+        with patch.object(music_handler, 'PLAYBACK_MODE', 'opus'):
+            await music_handler.make_audio_source(Track("q", "Song", "http://stream", codec="opus"))
+        mock_opus.assert_called_once_with("http://stream", codec="copy", **music_handler.FFMPEG_OPTIONS)
+
+    @pytest.mark.asyncio
+    @patch('discord.FFmpegOpusAudio')
+    async def test_unknown_codec_is_probed(self, mock_opus):
+        # Test a stream without codec info is probed, and PCM is used if probing fails
+        mock_opus.from_probe = AsyncMock(side_effect=Exception("ffprobe missing"))
+        with patch.object(music_handler, 'PLAYBACK_MODE', 'opus'), patch('discord.FFmpegPCMAudio') as mock_pcm:
+            await music_handler.make_audio_source(Track("q", "Song", "http://stream"))
+        mock_opus.from_probe.assert_awaited_once()
+        mock_pcm.assert_called_once()
+
+    @pytest.mark.asyncio
+    @patch('discord.FFmpegOpusAudio')
+    @patch('discord.FFmpegPCMAudio')
+    async def test_pcm_fallbacks(self, mock_pcm, mock_opus):
+        # Test non-Opus streams, and every stream in pcm mode, are played as PCM
+        with patch.object(music_handler, 'PLAYBACK_MODE', 'opus'):
+            await music_handler.make_audio_source(Track("q", "Song", "http://stream", codec="mp4a.40.2"))
+        with patch.object(music_handler, 'PLAYBACK_MODE', 'pcm'):
+            await music_handler.make_audio_source(Track("q", "Song", "http://stream", codec="opus"))
+        assert mock_pcm.call_count == 2
+        mock_opus.assert_not_called()
+
+
+class TestAudioCache:
+    # Test cases for the on-disk cache of frequently played songs
+
+    @pytest.fixture(autouse=True)
+    def audio_dir(self, tmp_path):
+        import cache_handler
+        with patch.object(music_handler, 'AUDIO_CACHE_DIR', str(tmp_path)), \
+             patch.object(music_handler, '_play_counts', cache_handler.TieredCache("audio_plays", backend=None)):
+            yield tmp_path
+
+    def test_cached_audio_lookup(self, audio_dir):
+        # Test a saved song is found by the video id in its link and marked recently used
+        track = Track("https://www.youtube.com/watch?v=aaaaaaaaaaa", "Song")
+        assert music_handler.cached_audio(track) is None
+
+        saved = audio_dir / "aaaaaaaaaaa.opus"
+        saved.write_bytes(b"opus")
+        os.utime(saved, (0, 0))
+        assert music_handler.cached_audio(track) == str(saved)
+        assert saved.stat().st_mtime > 0
+        assert "aaaaaaaaaaa" in track.thumbnail
+
+    @pytest.mark.asyncio
+    async def test_cache_disabled(self, audio_dir):
+        # Test nothing is looked up or counted without AUDIO_CACHE_DIR
+        (audio_dir / "aaaaaaaaaaa.opus").write_bytes(b"opus")
+        track = Track("https://youtu.be/aaaaaaaaaaa", "Song")
+        with patch.object(music_handler, 'AUDIO_CACHE_DIR', ""):
+            assert music_handler.cached_audio(track) is None
+            await music_handler.record_play(track)
+        assert music_handler._play_counts.get("aaaaaaaaaaa") is None
+
+    @pytest.mark.asyncio
+    async def test_saved_after_min_plays(self, audio_dir):
+        # Test a song is downloaded once it has been played AUDIO_CACHE_MIN_PLAYS times
+        busy = []
+
+        def fake_download(video_id):
+            busy.append(music_handler.extraction_stats()['running'])
+            (audio_dir / f"{video_id}.opus").write_bytes(b"opus")
+
+        track = Track("song query", "Song", "http://stream", video_id="bbbbbbbbbbb")
+        with patch.object(music_handler, 'AUDIO_CACHE_MIN_PLAYS', 2), \
+             patch('music_handler.run_yt_dlp_download', side_effect=fake_download) as mock_download:
+            await music_handler.record_play(track)
+            assert not music_handler._audio_downloads
+            await music_handler.record_play(track)
+            await music_handler._audio_downloads["bbbbbbbbbbb"]
+            await music_handler.record_play(track)
+
+        mock_download.assert_called_once_with("bbbbbbbbbbb")
+        assert (audio_dir / "bbbbbbbbbbb.opus").exists()
+        # The download ran as a counted extraction job
+        assert busy == [1]
+        assert music_handler.extraction_stats()['running'] == 0
+
+    def test_eviction_drops_least_recently_played(self, audio_dir):
+        # Test eviction removes the oldest files until the cache fits
+        for age, name in enumerate(["new", "mid", "old"]):
+            path = audio_dir / f"{name}.opus"
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (1000 - age, 1000 - age))
+
+        with patch.object(music_handler, 'AUDIO_CACHE_MAX_BYTES', 150):
+            music_handler.evict_audio_cache()
+
+        assert sorted(p.name for p in audio_dir.iterdir()) == ["new.opus"]
+
+    def test_eviction_counts_incoming_leftovers(self, audio_dir):
+        # Test files left in .incoming count against the cap and are removed before saved songs
+        saved = audio_dir / "keep.opus"
+        saved.write_bytes(b"x" * 100)
+        (audio_dir / ".incoming").mkdir()
+        (audio_dir / ".incoming" / "ccccccccccc.webm.part").write_bytes(b"x" * 100)
+
+        with patch.object(music_handler, 'AUDIO_CACHE_MAX_BYTES', 150):
+            music_handler.evict_audio_cache()
+
+        assert saved.exists()
+        assert not any((audio_dir / ".incoming").iterdir())
+
+    def test_failed_download_is_cleaned_up(self, audio_dir):
+        # Test a download that fails part way leaves nothing in .incoming
+        def failing_download(urls):
+            (audio_dir / ".incoming" / "ddddddddddd.webm.part").write_bytes(b"partial")
+            raise Exception("HTTP Error 403")
+
+        with patch('yt_dlp.YoutubeDL') as mock_ydl:
+            mock_ydl.return_value.__enter__.return_value.download.side_effect = failing_download
+            with pytest.raises(Exception):
+                music_handler.run_yt_dlp_download("ddddddddddd")
+
+        assert not any((audio_dir / ".incoming").iterdir())
+        assert not (audio_dir / "ddddddddddd.opus").exists()
+
+    @pytest.mark.asyncio
+    @patch('discord.FFmpegOpusAudio')
+    async def test_cached_file_is_played_directly(self, mock_opus):
+        # Test a saved file is stream-copied from disk without the network reconnect options
+        with patch.object(music_handler, 'PLAYBACK_MODE', 'opus'):
+            await music_handler.make_audio_source(Track("q", "Song"), "/cache/id.opus")
+        mock_opus.assert_called_once_with("/cache/id.opus", codec="copy", **music_handler.LOCAL_FFMPEG_OPTIONS)
+
+
+class TestSpotifyMatchCache:
+    # Test cases for remembering which YouTube video a Spotify track matched
+
+    @pytest.fixture(autouse=True)
+    def reset_matches(self):
+        import cache_handler
+        music_handler.queue = {}
+        music_handler._prefetch_tasks = {}
+        music_handler._stream_cache.clear()
+        with patch.object(music_handler, '_spotify_matches', cache_handler.TieredCache("spotify_yt", backend=None)):
+            yield
+        music_handler._stream_cache.clear()
+        music_handler.queue = {}
+
+    async def prefetch(self, track):
+        music_handler.queue[1] = GuildQueue([track])
+        music_handler.schedule_prefetch(1)
+        await music_handler._prefetch_tasks[1]
+
+    @pytest.mark.asyncio
+    async def test_second_play_skips_search(self):
+        # Test a Spotify track is searched once, then resolved straight from its matched video
+        async def fake_resolve(query):
+            return {"url": f"http://stream/{query}", "id": "ccccccccccc"}
+
+        with patch('music_handler._resolve_query', side_effect=fake_resolve) as mock_resolve:
+            await self.prefetch(Track("Song Artist Audio", "Song - Artist", spotify_id="sp1"))
+            second = Track("Song Artist Audio", "Song - Artist", spotify_id="sp1")
+            await self.prefetch(second)
+
+        assert [c.args[0] for c in mock_resolve.call_args_list] == [
+            "Song Artist Audio",
+            "https://www.youtube.com/watch?v=ccccccccccc",
+        ]
+        assert music_handler._spotify_matches.get("sp1") == "ccccccccccc"
+        assert second.video_id == "ccccccccccc"
+
+    @pytest.mark.asyncio
+    async def test_dead_match_falls_back_to_search(self):
+        # Test a matched video that no longer resolves is forgotten and the track searched for again
+        music_handler._spotify_matches.set("sp1", "ddddddddddd", music_handler.SPOTIFY_MATCH_TTL)
+
+        async def fake_resolve(query):
+            if "ddddddddddd" in query:
+                return None  # removed or region-blocked
+            return {"url": f"http://stream/{query}", "id": "eeeeeeeeeee"}
+
+        track = Track("Song Artist Audio", "Song - Artist", spotify_id="sp1")
+        with patch('music_handler._resolve_query', side_effect=fake_resolve) as mock_resolve:
+            await self.prefetch(track)
+
+        assert [c.args[0] for c in mock_resolve.call_args_list] == [
+            "https://www.youtube.com/watch?v=ddddddddddd",
+            "Song Artist Audio",
+        ]
+        assert track.url == "http://stream/Song Artist Audio"
+        assert music_handler._spotify_matches.get("sp1") == "eeeeeeeeeee"
+
+    @pytest.mark.asyncio
+    async def test_spotify_items_keep_track_id(self):
+        # Test tracks queued from Spotify carry their Spotify id
+        track = music_handler.spotify_track_to_item({"id": "sp9", "name": "Song", "artists": [{"name": "Band"}]})
+        assert track.spotify_id == "sp9"
+        assert await music_handler.track_query(track) == "Song Band Audio"
+
+
+class TestExtractionPool:
+    # Test cases for the bounded yt-dlp extraction pool
+
+    @pytest.mark.asyncio
+    async def test_extract_info_runs_off_loop(self):
+        # Test extraction runs on a pool thread, not the event loop thread
+        import threading
+        threads = []
+
+        def fake_search(query):
+            threads.append(threading.current_thread().name)
+            return {'title': query}
+
+        with patch('music_handler.run_yt_dlp_search', side_effect=fake_search):
+            result = await music_handler.extract_info("song")
+
+        assert result == {'title': 'song'}
+        assert threads[0].startswith("yt-dlp")
+        assert music_handler.extraction_stats()['running'] == 0
+
+    @pytest.mark.asyncio
+    async def test_extract_info_is_bounded(self):
+        # Test no more than EXTRACT_WORKERS extractions run at once and the rest queue up
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        lock = threading.Lock()
+        active = []
+        peak = []
+
+        def slow_search(query):
+            with lock:
+                active.append(query)
+                peak.append(len(active))
+            time.sleep(0.02)
+            with lock:
+                active.remove(query)
+            return {'title': query}
+
+        with patch('music_handler.run_yt_dlp_search', side_effect=slow_search), \
+             patch.object(music_handler, 'EXTRACT_WORKERS', 2), \
+             patch.object(music_handler, '_extract_executor', ThreadPoolExecutor(max_workers=2)):
+            tasks = [asyncio.create_task(music_handler.extract_info(f"song {i}")) for i in range(6)]
+            await asyncio.sleep(0)
+            stats = music_handler.extraction_stats()
+            await asyncio.gather(*tasks)
+
+        assert max(peak) == 2
+        assert stats['running'] == 2
+        assert stats['queued'] == 4
+
+    @pytest.mark.asyncio
+    async def test_extract_info_timeout(self):
+        # Test a stuck extraction times out instead of blocking the caller forever
+        import time
+
+        with patch('music_handler.run_yt_dlp_search', side_effect=lambda query: time.sleep(0.2)), \
+             patch.object(music_handler, 'EXTRACT_TIMEOUT', 0.01):
+            with pytest.raises(asyncio.TimeoutError):
+                await music_handler.extract_info("stuck")
+
+            # The abandoned extraction still holds its worker until the thread finishes
+            assert music_handler.extraction_stats()['running'] == 1
+            await asyncio.sleep(0.3)
+
+        assert music_handler.extraction_stats()['running'] == 0
+        assert music_handler.extraction_stats()['timeouts'] >= 1
+
+    @pytest.mark.asyncio
+    async def test_extract_timeout_starts_when_job_runs(self):
+        # Test time spent waiting for a worker doesn't count against EXTRACT_TIMEOUT
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        def slow_search(query):
+            time.sleep(0.1)
+            return {'title': query}
+
+        with patch('music_handler.run_yt_dlp_search', side_effect=slow_search), \
+             patch.object(music_handler, 'EXTRACT_TIMEOUT', 0.15), \
+             patch.object(music_handler, '_extract_executor', ThreadPoolExecutor(max_workers=1)):
+            # The second search queues for ~0.1s and runs for ~0.1s, longer than EXTRACT_TIMEOUT in total
+            results = await asyncio.gather(music_handler.extract_info("first"), music_handler.extract_info("second"))
+
+        assert [result['title'] for result in results] == ["first", "second"]
+
+    @pytest.mark.asyncio
+    async def test_extract_queue_timeout(self):
+        # Test a job that never gets a worker is dropped from the queue and counted separately
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        ran = []
+
+        def search(query):
+            ran.append(query)
+            time.sleep(0.2)
+            return {'title': query}
+
+        queue_timeouts = music_handler.extraction_stats()['queue_timeouts']
+        with patch('music_handler.run_yt_dlp_search', side_effect=search), \
+             patch.object(music_handler, 'EXTRACT_QUEUE_TIMEOUT', 0.05), \
+             patch.object(music_handler, '_extract_executor', ThreadPoolExecutor(max_workers=1)):
+            busy = asyncio.create_task(music_handler.extract_info("busy"))
+            await asyncio.sleep(0.01)
+            with pytest.raises(asyncio.TimeoutError):
+                await music_handler.extract_info("waiting")
+            await busy
+
+        assert ran == ["busy"]
+        assert music_handler.extraction_stats()['queue_timeouts'] == queue_timeouts + 1
+        assert music_handler.extraction_stats()['queued'] == 0
+
+
+class TestPrefetch:
+    # Test cases for look-ahead resolution of queued songs
+
+    @pytest.fixture(autouse=True)
+    def reset_queue(self):
+        music_handler.queue = {}
+        music_handler._prefetch_tasks = {}
+        yield
+        music_handler.queue = {}
+
+    @pytest.mark.asyncio
+    async def test_prefetch_resolves_next_n(self):
+        # Test only the first PREFETCH_COUNT unresolved entries are resolved and stored back
+        async def fake_resolve(query):
+            return {"url": f"http://stream/{query}", "thumbnail": f"http://thumb/{query}", "acodec": "opus"}
+
+        music_handler.queue[1] = GuildQueue([
+            Track("url0", "Song 0", "url0"),
+            Track("q1", "Song 1"),
+            Track("q2", "Song 2"),
+            Track("q3", "Song 3"),
+        ])
+
+        with patch.object(music_handler, 'PREFETCH_COUNT', 3), \
+             patch('music_handler._resolve_query', side_effect=fake_resolve) as mock_resolve:
+            music_handler.schedule_prefetch(1)
+            await music_handler._prefetch_tasks[1]
+
+        assert mock_resolve.call_count == 2
+        assert (music_handler.queue[1][1].url, music_handler.queue[1][1].thumbnail) == ("http://stream/q1", "http://thumb/q1")
+        assert (music_handler.queue[1][2].url, music_handler.queue[1][2].thumbnail) == ("http://stream/q2", "http://thumb/q2")
+        assert not music_handler.queue[1][3].resolved
+
+    @pytest.mark.asyncio
+    async def test_prefetch_follows_moved_entry(self):
+        # Test a resolved entry is written back even if the queue changed meanwhile
+        music_handler.queue[1] = GuildQueue([Track("q1", "Song 1")])
+
+        async def fake_resolve(query):
+            music_handler.queue[1].insert(0, Track("url0", "Song 0", "url0"))
+            return {"url": "http://stream/q1"}
+
+        with patch('music_handler._resolve_query', side_effect=fake_resolve):
+            music_handler.schedule_prefetch(1)
+            await music_handler._prefetch_tasks[1]
+
+        assert music_handler.queue[1][1].title == "Song 1"
+        assert music_handler.queue[1][1].url == "http://stream/q1"
+
+    @pytest.mark.asyncio
+    async def test_playback_joins_inflight_prefetch(self):
+        # Test playback of an entry being prefetched reuses the same extraction
+        async def slow_resolve(query):
+            await asyncio.sleep(0.01)
+            return "http://stream", None
+
+        with patch('music_handler._resolve_query', side_effect=slow_resolve) as mock_resolve:
+            results = await asyncio.gather(music_handler.resolve_query("q"), music_handler.resolve_query("q"))
+
+        assert mock_resolve.call_count == 1
+        assert results[0] == results[1] == ("http://stream", None)
+
+
+class TestStreamCache:
+    # Test cases for the resolved stream url cache
+
+    @pytest.fixture(autouse=True)
+    def reset_cache(self):
+        music_handler._stream_cache.clear()
+        music_handler._stale_retries.clear()
+        music_handler.queue = {}
+        yield
+        music_handler._stream_cache.clear()
+        music_handler.queue = {}
+
+    def test_cache_key_normalization(self):
+        # Test equivalent queries and links share one key
+        assert music_handler.stream_cache_key("Song  Artist Audio") == music_handler.stream_cache_key("song artist audio")
+        assert music_handler.stream_cache_key("https://youtu.be/dQw4w9WgXcQ?si=x") == "yt:dQw4w9WgXcQ"
+        assert music_handler.stream_cache_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL1") == "yt:dQw4w9WgXcQ"
+
+    def test_url_ttl_respects_expire(self):
+        # Test the ttl ends a safety margin before googlevideo's expire timestamp
+        with patch('music_handler.time.time', return_value=1000.0):
+            ttl = music_handler.stream_url_ttl("https://rr1.googlevideo.com/videoplayback?expire=5000&id=1")
+            expired = music_handler.stream_url_ttl("https://rr1.googlevideo.com/videoplayback?expire=1100")
+        assert ttl == 4000 - music_handler.STREAM_EXPIRY_MARGIN
+        assert expired < 0
+        assert music_handler.stream_url_ttl("http://example.com/stream") == music_handler.STREAM_DEFAULT_TTL
+
+    @pytest.mark.asyncio
+    async def test_repeat_query_skips_extraction(self):
+        # Test a second request for the same song is served from the cache
+        with patch('music_handler.extract_info', new_callable=AsyncMock) as mock_extract:
+            mock_extract.return_value = {'entries': [{'url': 'http://stream/1', 'thumbnail': 'thumb', 'title': 'Song'}]}
+            first = await music_handler.resolve_query("Song Artist Audio")
+            second = await music_handler.resolve_query("song artist  audio")
+
+        assert mock_extract.call_count == 1
+        assert first == second
+        assert (first['url'], first['thumbnail']) == ('http://stream/1', 'thumb')
+
+    def test_early_end_evicts_and_retries_once(self):
+        # Test a song that dies immediately is re-resolved once, then left alone
+        music_handler.cache_stream("q", {'url': 'http://stream/old', 'thumbnail': None, 'title': 'Song'})
+        track = Track("q", "Song", "http://stream/old")
+
+        music_handler.retry_if_cut_short(1, track, 0.5)
+        assert music_handler.queue[1].snapshot() == [track]
+        assert not track.resolved
+        assert music_handler._stream_cache.get(music_handler.stream_cache_key("q")) is None
+
+        music_handler.queue[1] = GuildQueue()
+        music_handler.retry_if_cut_short(1, track, 0.5)
+        assert len(music_handler.queue[1]) == 0
+
+
+class TestEmbedUpdates:
+    # Test cases for the debounced now playing embed updater
+
+    @pytest.fixture(autouse=True)
+    def reset_embeds(self):
+        music_handler._embed_dirty.clear()
+        music_handler._embed_last_edit.clear()
+        music_handler._embed_flush_tasks.clear()
+        music_handler.embed_ctx = {}
+        yield
+        for task in music_handler._embed_flush_tasks.values():
+            task.cancel()
+        music_handler.embed_ctx = {}
+
+    @pytest.mark.asyncio
+    async def test_burst_is_coalesced(self):
+        # Test a burst of changes produces one immediate edit and one trailing edit with the latest state
+        embed, ctx = MagicMock(), AsyncMock()
+        music_handler.embed_ctx[1] = (embed, ctx)
+
+        with patch.object(music_handler, 'EMBED_UPDATE_INTERVAL', 0.05):
+            for i in range(20):
+                embed.state = i
+                await music_handler.update_embed(1)
+            assert ctx.edit_original_response.call_count == 1
+            await music_handler._embed_flush_tasks[1]
+
+        assert ctx.edit_original_response.call_count == 2
+        assert ctx.edit_original_response.call_args.kwargs["embed"].state == 19
+
+    @pytest.mark.asyncio
+    async def test_cancel_drops_pending_edit(self):
+        # Test a pending edit is dropped once the embed is being removed
+        embed, ctx = MagicMock(), AsyncMock()
+        music_handler.embed_ctx[1] = (embed, ctx)
+
+        with patch.object(music_handler, 'EMBED_UPDATE_INTERVAL', 0.05):
+            await music_handler.update_embed(1)
+            await music_handler.update_embed(1)
+            music_handler.cancel_embed_updates(1)
+            await asyncio.sleep(0.1)
+
+        assert ctx.edit_original_response.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_new_interaction_edits_immediately(self):
+        # Test the interval is per message: a new /play message is updated right away
+        embed = MagicMock()
+        first, second = AsyncMock(), AsyncMock()
+        music_handler.embed_ctx[1] = (embed, first)
+        await music_handler.update_embed(1)
+
+        music_handler.embed_ctx[1] = (embed, second)
+        await music_handler.update_embed(1)
+
+        second.edit_original_response.assert_called_once()
+
+
+class TestVoiceSession:
+    # Test cases for keeping voice connections around between /play requests
+
+    @pytest.fixture
+    def mock_message(self):
         mock_message = AsyncMock()
         mock_message.guild = MagicMock()
         mock_message.guild.id = 12345
-        mock_message.client = MagicMock()
         mock_message.channel = AsyncMock()
-        
-        music_handler.queue[mock_message.guild.id] = [
-            ("url1", "Song 1", True),
-        ]
-        
-        with patch('asyncio.to_thread', new_callable=AsyncMock) as mock_thread:
-            mock_thread.return_value = {
-                'title': 'Test Song',
-                'url': 'http://example.com/stream',
-                'uploader': 'Test Uploader'
-            }
-            await music_handler.play_next(mock_message)
-        
-        # Voice client should have been retrieved
-        mock_get.assert_called()
+        mock_message.client = MagicMock()
+        mock_message.user = MagicMock()
+        music_handler.queue = {}
+        yield mock_message
+        music_handler.cancel_idle_disconnect(mock_message.guild.id)
+        music_handler._voice_channels = {}
+        music_handler.queue = {}
+        music_handler.embed_ctx = {}
+
+    @pytest.fixture
+    def mock_voice_client(self, mock_message):
+        mock_voice_client = MagicMock()
+        mock_voice_client.is_connected.return_value = True
+        mock_voice_client.is_playing.return_value = False
+        mock_voice_client.is_paused.return_value = False
+        mock_voice_client.channel = mock_message.user.voice.channel
+        mock_voice_client.disconnect = AsyncMock()
+        return mock_voice_client
+
+    @pytest.mark.asyncio
+    async def test_idle_session_leaves_after_grace(self, mock_message, mock_voice_client):
+        # Test the bot disconnects once the idle grace period has passed
+        with patch.object(music_handler, 'VOICE_IDLE_GRACE', 0.01), \
+             patch('discord.utils.get', return_value=mock_voice_client):
+            music_handler.schedule_idle_disconnect(mock_message)
+            await music_handler._idle_timers[mock_message.guild.id]
+
+        mock_voice_client.disconnect.assert_called_once()
+        assert mock_message.guild.id not in music_handler._idle_timers
+
+    @pytest.mark.asyncio
+    async def test_play_reuses_idle_session(self, mock_message, mock_voice_client):
+        # Test a /play during the grace period keeps the existing connection
+        mock_message.user.voice.channel.connect = AsyncMock()
+        with patch('discord.utils.get', return_value=mock_voice_client):
+            music_handler.schedule_idle_disconnect(mock_message)
+            idle_timer = music_handler._idle_timers[mock_message.guild.id]
+            voice_client = await music_handler.get_voice_client(mock_message)
+            await asyncio.sleep(0)
+
+        assert voice_client is mock_voice_client
+        assert idle_timer.cancelled()
+        mock_message.user.voice.channel.connect.assert_not_called()
+        mock_voice_client.disconnect.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_dropped_connection_is_replaced(self, mock_message, mock_voice_client):
+        # Test a voice client that lost its connection is dropped and the session's channel rejoined
+        fresh_client = MagicMock()
+        channel = MagicMock()
+        channel.connect = AsyncMock(return_value=fresh_client)
+        music_handler._voice_channels[mock_message.guild.id] = channel
+        mock_voice_client.is_connected.return_value = False
+
+        with patch('discord.utils.get', return_value=mock_voice_client):
+            voice_client = await music_handler.ensure_voice(mock_message.guild, mock_message.client)
+
+        assert voice_client is fresh_client
+        mock_voice_client.disconnect.assert_called_once_with(force=True)
+        channel.connect.assert_called_once_with(reconnect=True)
+
+    @pytest.mark.asyncio
+    async def test_disconnected_by_moderator_ends_session(self, mock_message):
+        # Test a session whose voice client is gone (bot disconnected from outside) isn't rejoined
+        channel = MagicMock()
+        channel.connect = AsyncMock()
+        music_handler._voice_channels[mock_message.guild.id] = channel
+
+        with patch('discord.utils.get', return_value=None):
+            assert await music_handler.ensure_voice(mock_message.guild, mock_message.client) is None
+
+        channel.connect.assert_not_called()
+        assert mock_message.guild.id not in music_handler._voice_channels
+
+    @pytest.mark.asyncio
+    async def test_no_session_no_reconnect(self, mock_message):
+        # Test a guild without a voice session isn't reconnected anywhere
+        with patch('discord.utils.get', return_value=None):
+            assert await music_handler.ensure_voice(mock_message.guild, mock_message.client) is None
+
+    @pytest.mark.asyncio
+    async def test_leave_disconnects_right_away(self, mock_message, mock_voice_client):
+        # Test /leave clears the queue, ends the session and disconnects without waiting
+        music_handler.queue[mock_message.guild.id] = GuildQueue([Track("q1", "Song 1")])
+        music_handler._voice_channels[mock_message.guild.id] = mock_voice_client.channel
+        with patch('discord.utils.get', return_value=mock_voice_client):
+            music_handler.schedule_idle_disconnect(mock_message)
+            await music_handler.leave(mock_message)
 
+        assert len(music_handler.queue[mock_message.guild.id]) == 0
+        assert mock_message.guild.id not in music_handler._idle_timers
+        assert mock_message.guild.id not in music_handler._voice_channels
+        mock_voice_client.disconnect.assert_called_once()
@@ -0,0 +1,139 @@
+import os
+import sys
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+
+# Add parent directory to path to import music_queue
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from music_queue import GuildQueue, Track
+
+with patch.dict(os.environ, {'SPOTIFY_CLIENT_ID': 'test_id', 'SPOTIFY_CLIENT_SECRET': 'test_secret'}):
+    import music_handler
+
+# to run: .venv/Scripts/python.exe -m pytest tests/test_music_queue.py -v
+
+
+def make_queue(count, max_length=100):
+    return GuildQueue((Track(f"q{i}", f"Song {i}") for i in range(count)), max_length=max_length)
+
+
+def titles(guild_queue):
+    return [track.title for track in guild_queue]
+
+
+class TestTrack:
+    # Test cases for the Track record
+
+    def test_slots_keep_tracks_compact(self):
+        # Test tracks have no per-instance __dict__
+        track = Track("q", "Song")
+        assert not hasattr(track, "__dict__")
+        with pytest.raises(AttributeError):
+            track.extra = 1
+
+    def test_resolved(self):
+        # Test a track is resolved once it has a stream url
+        track = Track("q", "Song")
+        assert not track.resolved
+        track.url = "http://stream"
+        assert track.resolved
+
+
+class TestGuildQueue:
+    # Test cases for the per-guild queue
+
+    def test_fifo_order(self):
+        # Test tracks come out in the order they were added
+        guild_queue = make_queue(3)
+        assert guild_queue.next().title == "Song 0"
+        assert guild_queue.next().title == "Song 1"
+        assert len(guild_queue) == 1
+
+    def test_next_on_empty(self):
+        # Test next() on an empty queue returns None
+        assert GuildQueue().next() is None
+
+    def test_max_length(self):
+        # Test append and extend stop at the length limit
+        guild_queue = make_queue(2, max_length=3)
+        assert guild_queue.extend([Track("a", "A"), Track("b", "B")]) == 1
+        assert guild_queue.append(Track("c", "C")) is False
+        assert titles(guild_queue) == ["Song 0", "Song 1", "A"]
+
+    def test_appendleft_ignores_limit(self):
+        # Test a retried track can always go back to the front
+        guild_queue = make_queue(1, max_length=1)
+        guild_queue.appendleft(Track("r", "Retry"))
+        assert titles(guild_queue) == ["Retry", "Song 0"]
+
+    def test_remove(self):
+        # Test removing by position returns the removed track
+        guild_queue = make_queue(3)
+        assert guild_queue.remove(1).title == "Song 1"
+        assert titles(guild_queue) == ["Song 0", "Song 2"]
+        with pytest.raises(IndexError):
+            guild_queue.remove(5)
+
+    def test_move(self):
+        # Test moving a track forwards and backwards
+        guild_queue = make_queue(4)
+        guild_queue.move(3, 0)
+        assert titles(guild_queue) == ["Song 3", "Song 0", "Song 1", "Song 2"]
+        guild_queue.move(0, 3)
+        assert titles(guild_queue) == ["Song 0", "Song 1", "Song 2", "Song 3"]
+        with pytest.raises(IndexError):
+            guild_queue.move(0, 4)
+        assert len(guild_queue) == 4
+
+    def test_shuffle_keeps_tracks(self):
+        # Test shuffling keeps every track exactly once
+        guild_queue = make_queue(20)
+        guild_queue.shuffle()
+        assert sorted(titles(guild_queue)) == sorted(f"Song {i}" for i in range(20))
+
+    def test_snapshot_and_peek(self):
+        # Test slices are copies of a range of the queue
+        guild_queue = make_queue(10)
+        page = guild_queue.snapshot(5, 8)
+        assert [track.title for track in page] == ["Song 5", "Song 6", "Song 7"]
+        page.clear()
+        assert len(guild_queue) == 10
+        assert [track.title for track in guild_queue.peek(2)] == ["Song 0", "Song 1"]
+
+
+class TestQueueCommands:
+    # Test cases for the /remove and /move handlers
+
+    @pytest.fixture
+    def mock_message(self):
+        mock_message = AsyncMock()
+        mock_message.guild = MagicMock()
+        mock_message.guild.id = 12345
+        mock_message.channel = AsyncMock()
+        music_handler.queue = {mock_message.guild.id: make_queue(3)}
+        yield mock_message
+        music_handler.queue = {}
+
+    @pytest.mark.asyncio
+    async def test_remove_uses_one_based_positions(self, mock_message):
+        # Test /remove 1 removes the first queued song
+        await music_handler.remove_from_queue(mock_message, 1)
+        assert titles(music_handler.queue[mock_message.guild.id]) == ["Song 1", "Song 2"]
+        assert "Song 0" in mock_message.channel.send.call_args[0][0]
+
+    @pytest.mark.asyncio
+    async def test_remove_out_of_range(self, mock_message):
+        # Test invalid positions leave the queue alone
+        await music_handler.remove_from_queue(mock_message, 0)
+        await music_handler.remove_from_queue(mock_message, 4)
+        assert len(music_handler.queue[mock_message.guild.id]) == 3
+        assert "no song" in mock_message.channel.send.call_args[0][0].lower()
+
+    @pytest.mark.asyncio
+    async def test_move(self, mock_message):
+        # Test /move 3 1 puts the last song first
+        with patch('music_handler.schedule_prefetch') as mock_prefetch:
+            await music_handler.move_in_queue(mock_message, 3, 1)
+        assert titles(music_handler.queue[mock_message.guild.id]) == ["Song 2", "Song 0", "Song 1"]
+        mock_prefetch.assert_called_once_with(mock_message.guild.id)
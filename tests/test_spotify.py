@@ -0,0 +1,158 @@
+import os
+import sys
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# Add parent directory to path to import spotify_handler
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+with patch.dict(os.environ, {'SPOTIFY_CLIENT_ID': 'test_id', 'SPOTIFY_CLIENT_SECRET': 'test_secret'}):
+    import spotify_handler
+
+# to run: .venv/Scripts/python.exe -m pytest tests/test_spotify.py -v
+
+
+def fake_track(track_id):
+    return {'id': track_id, 'name': f'Song {track_id}', 'artists': [{'name': 'Artist'}]}
+
+
+@pytest_asyncio.fixture
+async def spotify_server():
+    # Local stand-in for the Spotify accounts and Web API; records every request it serves
+    state = {'hits': [], 'throttle': 0, 'expires_in': 3600}
+
+    async def token(request):
+        state['hits'].append(('token', None))
+        return web.json_response({'access_token': f"token{len(state['hits'])}", 'expires_in': state['expires_in']})
+
+    async def tracks(request):
+        if state['throttle']:
+            state['throttle'] -= 1
+            state['hits'].append(('429', None))
+            return web.json_response({}, status=429, headers={'Retry-After': '0.05'})
+        ids = request.query['ids'].split(',')
+        state['hits'].append(('tracks', len(ids)))
+        if 'bad' in ids:
+            # Like Spotify, one malformed id fails the whole call
+            return web.json_response({'error': {'status': 400, 'message': 'invalid id'}}, status=400)
+        return web.json_response({'tracks': [fake_track(i) if i != 'missing' else None for i in ids]})
+
+    async def search(request):
+        state['hits'].append(('search', request.query['q']))
+        return web.json_response({'tracks': {'items': [fake_track('found')]}})
+
+    async def playlist(request):
+        offset = int(request.query.get('offset', 0))
+        state['hits'].append(('playlist', offset))
+        next_url = str(request.url.with_query({'offset': offset + 2, 'limit': 2})) if offset == 0 else None
+        items = [{'track': fake_track(f'p{offset + i}')} for i in range(2)]
+        return web.json_response({'items': items, 'next': next_url})
+
+    app = web.Application()
+    app.router.add_post('/api/token', token)
+    app.router.add_get('/v1/tracks', tracks)
+    app.router.add_get('/v1/search', search)
+    app.router.add_get('/v1/playlists/{playlist_id}/tracks', playlist)
+    server = TestServer(app)
+    await server.start_server()
+    base = str(server.make_url('')).rstrip('/')
+    with patch.object(spotify_handler, 'SPOTIFY_API_URL', f"{base}/v1"), \
+         patch.object(spotify_handler, 'SPOTIFY_TOKEN_URL', f"{base}/api/token"):
+        yield state
+    await spotify_handler.close_session()
+    await server.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    # Forget the token and any Retry-After hold between tests
+    spotify_handler._token = None
+    spotify_handler._token_expires_at = 0.0
+    spotify_handler._retry_after_until = 0.0
+    spotify_handler._pending_tracks.clear()
+    yield
+
+
+class TestSpotifyClient:
+    # Test cases for the aiohttp-based Spotify client
+
+    @pytest.mark.asyncio
+    async def test_token_is_reused(self, spotify_server):
+        # Test one client-credentials token serves many requests
+        await spotify_handler.search_track('a')
+        await spotify_handler.search_track('b')
+
+        assert [hit[0] for hit in spotify_server['hits']] == ['token', 'search', 'search']
+
+    @pytest.mark.asyncio
+    async def test_token_refreshed_before_expiry(self, spotify_server):
+        # Test a token inside the refresh margin is replaced before it is used
+        spotify_server['expires_in'] = spotify_handler.TOKEN_REFRESH_MARGIN
+        await spotify_handler.search_track('a')
+        await spotify_handler.search_track('b')
+
+        assert [hit[0] for hit in spotify_server['hits']] == ['token', 'search', 'token', 'search']
+
+    @pytest.mark.asyncio
+    async def test_single_lookups_are_batched(self, spotify_server):
+        # Test concurrent single-track lookups share /tracks calls of up to 50 ids
+        ids = [f't{i}' for i in range(120)]
+        results = await asyncio.gather(*(spotify_handler.get_track(i) for i in ids))
+
+        assert [track['id'] for track in results] == ids
+        assert sorted(n for name, n in spotify_server['hits'] if name == 'tracks') == [20, 50, 50]
+
+    @pytest.mark.asyncio
+    async def test_unknown_track_is_none(self, spotify_server):
+        # Test an id Spotify doesn't know resolves to None without failing its batch
+        found, missing = await asyncio.gather(spotify_handler.get_track('t1'), spotify_handler.get_track('missing'))
+
+        assert found['id'] == 't1'
+        assert missing is None
+
+    @pytest.mark.asyncio
+    async def test_bad_id_only_fails_its_own_lookup(self, spotify_server):
+        # Test a batch refused because of one bad id is retried id by id
+        results = await asyncio.gather(
+            spotify_handler.get_track('t1'), spotify_handler.get_track('bad'), spotify_handler.get_track('t2'),
+            return_exceptions=True
+        )
+
+        assert results[0]['id'] == 't1' and results[2]['id'] == 't2'
+        assert isinstance(results[1], Exception)
+        assert sorted(n for name, n in spotify_server['hits'] if name == 'tracks') == [1, 1, 1, 3]
+
+    @pytest.mark.asyncio
+    async def test_retry_after_is_waited_out(self, spotify_server):
+        # Test a 429 holds requests back for Retry-After and then succeeds instead of erroring
+        spotify_server['throttle'] = 2
+        started = time.monotonic()
+        tracks = await spotify_handler.get_tracks(['t1'])
+
+        assert tracks[0]['id'] == 't1'
+        assert time.monotonic() - started >= 0.1
+        assert [hit[0] for hit in spotify_server['hits']].count('429') == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, spotify_server):
+        # Test a Spotify that keeps answering 429 eventually raises
+        spotify_server['throttle'] = 100
+        with patch.object(spotify_handler, 'MAX_ATTEMPTS', 3):
+            with pytest.raises(Exception):
+                await spotify_handler.get_tracks(['t1'])
+
+    @pytest.mark.asyncio
+    async def test_paging(self, spotify_server):
+        # Test next_page follows the paging object's next url until the last page
+        page = await spotify_handler.playlist_tracks('abc', limit=2)
+        pages = [page]
+        while (page := await spotify_handler.next_page(page)):
+            pages.append(page)
+
+        assert [item['track']['id'] for p in pages for item in p['items']] == ['p0', 'p1', 'p2', 'p3']
+        assert [hit for hit in spotify_server['hits'] if hit[0] == 'playlist'] == [('playlist', 0), ('playlist', 2)]
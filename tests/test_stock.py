@@ -1,3 +1,23 @@
+import os
+import sys
+import asyncio
+import pytest
+import pytest_asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+# Add parent directory to path to import stock_handler
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# stock_handler refuses to import without an API key
+with patch.dict(os.environ, {'FINNHUB_API_KEY': 'test_key'}):
+    import stock_handler
+import cache_handler
+
+# to run: .venv/Scripts/python.exe -m pytest tests/test_stock.py -v
+
+
 # import os
 # import sys
 # import pytest
@@ -382,3 +402,482 @@
 
 #         # Clean up
 #         stock_handler._api_call_times = []
+
+
+SAMPLE_QUOTE = {'c': 150.25, 'h': 152.0, 'l': 148.0, 'o': 148.5, 'pc': 147.75, 'd': 2.5, 'dp': 1.69, 'v': 25000000}
+SAMPLE_PROFILE = {'name': 'Apple Inc', 'finnhubIndustry': 'Technology', 'marketCapitalization': 2800000,
+                  'description': 'Apple Inc. is an American technology company', 'website': 'https://www.apple.com',
+                  'currency': 'USD'}
+
+
+@pytest_asyncio.fixture
+async def finnhub_server():
+    # Local stand-in for the Finnhub REST API; records every request it serves
+    hits = []
+
+    async def quote(request):
+        hits.append(('quote', request.query['symbol']))
+        return web.json_response(SAMPLE_QUOTE)
+
+    async def profile(request):
+        hits.append(('profile', request.query['symbol']))
+        return web.json_response(SAMPLE_PROFILE)
+
+    async def search(request):
+        hits.append(('search', request.query['q']))
+        return web.json_response({'result': [{'symbol': 'AAPL', 'description': 'Apple Inc'}]})
+
+    app = web.Application()
+    app.router.add_get('/quote', quote)
+    app.router.add_get('/stock/profile2', profile)
+    app.router.add_get('/search', search)
+    server = TestServer(app)
+    await server.start_server()
+    with patch.object(stock_handler, 'FINNHUB_BASE_URL', str(server.make_url('')).rstrip('/')):
+        yield hits
+    await stock_handler.close_session()
+    await server.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    # Reset cache (in-process only) and rate limit bookkeeping before each test
+    stock_handler._stock_cache = cache_handler.TieredCache("stock", max_size=stock_handler.CACHE_MAX_SIZE, backend=None)
+    stock_handler._rate_limiter = stock_handler.RateLimiter(stock_handler.RATE_LIMIT, stock_handler.RATE_LIMIT_WINDOW)
+    yield
+    stock_handler.clear_cache()
+
+
+class TestAsyncClient:
+    # Test cases for the aiohttp-based Finnhub client
+
+    @pytest.mark.asyncio
+    async def test_get_quote_async(self, finnhub_server):
+        # Test the quote is fetched over the shared session
+        result = await stock_handler.get_quote_async('aapl')
+
+        assert result == SAMPLE_QUOTE
+        assert finnhub_server == [('quote', 'AAPL')]
+
+    @pytest.mark.asyncio
+    async def test_session_is_reused(self, finnhub_server):
+        # Test consecutive calls share one pooled session
+        await stock_handler.get_quote_async('AAPL')
+        session = await stock_handler._http.get()
+        await stock_handler.search_stocks_async('apple')
+
+        assert await stock_handler._http.get() is session
+
+    @pytest.mark.asyncio
+    async def test_get_stock_async_combines_data(self, finnhub_server):
+        # Test quote and profile are merged into one stock_info dict
+        result = await stock_handler.get_stock_async('AAPL')
+
+        assert result['name'] == 'Apple Inc'
+        assert result['price'] == 150.25
+        assert result['previous_close'] == 147.75
+
+    @pytest.mark.asyncio
+    async def test_http_error_returns_none(self, finnhub_server):
+        # Test an upstream error is reported as a missing result
+        with patch.object(stock_handler, 'FINNHUB_BASE_URL', stock_handler.FINNHUB_BASE_URL + '/missing'):
+            result = await stock_handler.get_quote_async('AAPL')
+
+        assert result is None
+
+    def test_sync_wrapper(self):
+        # Test the synchronous wrapper drives the async client
+        async def fake_get(endpoint, params):
+            return {'result': [{'symbol': params['q'].upper()}]}
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            result = stock_handler.search_stocks('msft')
+
+        assert result == [{'symbol': 'MSFT'}]
+
+
+class TestGetStockConcurrency:
+    # Test cases for the concurrent quote + profile fetch in get_stock_async
+
+    @pytest.mark.asyncio
+    async def test_quote_and_profile_fetched_concurrently(self):
+        # Test both requests are in flight at the same time
+        in_flight = []
+        peak = []
+
+        async def fake_get(endpoint, params):
+            in_flight.append(endpoint)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(endpoint)
+            return SAMPLE_QUOTE if endpoint == '/quote' else SAMPLE_PROFILE
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            result = await stock_handler.get_stock_async('AAPL')
+
+        assert max(peak) == 2
+        assert result['missing'] == []
+        assert result['name'] == 'Apple Inc'
+
+    @pytest.mark.asyncio
+    async def test_partial_result_when_profile_fails(self):
+        # Test a failed profile still returns the quote, flagged as partial
+        async def fake_get(endpoint, params):
+            if endpoint == '/quote':
+                return SAMPLE_QUOTE
+            raise Exception("profile down")
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            result = await stock_handler.get_stock_async('AAPL')
+
+        assert result['price'] == 150.25
+        assert result['name'] == 'N/A'
+        assert result['missing'] == ['profile']
+        assert stock_handler._stock_cache.peek(('profile', 'AAPL')) is None
+
+    @pytest.mark.asyncio
+    async def test_none_when_both_fail(self):
+        # Test nothing is returned when neither half can be fetched
+        with patch.object(stock_handler, '_finnhub_get', side_effect=Exception("down")):
+            result = await stock_handler.get_stock_async('AAPL')
+
+        assert result is None
+
+    @pytest.mark.asyncio
+    async def test_unknown_ticker_is_not_found(self):
+        # Test Finnhub's all-zero quote and empty profile for an unknown symbol mean "not found", uncached
+        async def fake_get(endpoint, params):
+            if endpoint == '/quote':
+                return {'c': 0, 'd': None, 'dp': None, 'h': 0, 'l': 0, 'o': 0, 'pc': 0, 't': 0}
+            return {}
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            result = await stock_handler.get_stock_async('ZZZZZ')
+
+        assert result is None
+        assert stock_handler._stock_cache.peek(('quote', 'ZZZZZ')) is None
+        assert stock_handler._stock_cache.peek(('profile', 'ZZZZZ')) is None
+
+    @pytest.mark.asyncio
+    async def test_empty_profile_is_not_partial(self):
+        # Test a real quote with an empty profile (e.g. some ETFs) isn't reported as a failed fetch
+        async def fake_get(endpoint, params):
+            return SAMPLE_QUOTE if endpoint == '/quote' else {}
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            result = await stock_handler.get_stock_async('SPY')
+
+        assert result['price'] == 150.25
+        assert result['name'] == 'N/A'
+        assert result['missing'] == []
+
+
+class TestStockCache:
+    # Test cases for the TTL-split stock cache
+
+    @pytest.mark.asyncio
+    async def test_repeat_lookup_refreshes_only_quote(self):
+        # Test an expired quote is refetched while the profile is served from cache
+        calls = []
+
+        async def fake_get(endpoint, params):
+            calls.append(endpoint)
+            return SAMPLE_QUOTE if endpoint == '/quote' else SAMPLE_PROFILE
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            await stock_handler.get_stock_async('AAPL')
+            await stock_handler.get_stock_async('AAPL')
+            assert sorted(calls) == ['/quote', '/stock/profile2']
+
+            stock_handler._stock_cache.set(('quote', 'AAPL'), SAMPLE_QUOTE, 0)
+            await stock_handler.get_stock_async('AAPL')
+
+        assert sorted(calls) == ['/quote', '/quote', '/stock/profile2']
+        assert stock_handler.list_tickers() == ['AAPL']
+
+
+class TestRateLimiter:
+    # Test cases for the sliding-window RateLimiter
+
+    def test_try_acquire_respects_limit(self):
+        # Test calls beyond the limit are refused until the window slides
+        limiter = stock_handler.RateLimiter(limit=2, window=60)
+        with patch('stock_handler.time.monotonic', return_value=0.0):
+            assert limiter.try_acquire()
+            assert limiter.try_acquire()
+            assert not limiter.try_acquire()
+            assert limiter.wait_time() == 60
+        with patch('stock_handler.time.monotonic', return_value=60.0):
+            assert limiter.try_acquire()
+
+        assert limiter.usage()['total_calls'] == 3
+
+    def test_check_rate_limit_raises_when_full(self):
+        # Test the non-blocking check still reports an exhausted budget
+        stock_handler._rate_limiter = stock_handler.RateLimiter(limit=1, window=60)
+        stock_handler._check_rate_limit()
+
+        with pytest.raises(Exception, match="Rate limit exceeded"):
+            stock_handler._check_rate_limit()
+
+    @pytest.mark.asyncio
+    async def test_acquire_queues_instead_of_failing(self):
+        # Test acquire waits for a free slot and reports queued callers
+        limiter = stock_handler.RateLimiter(limit=1, window=0.05)
+        await limiter.acquire()
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.usage()['queued'] == 1
+
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.usage()['queued'] == 0
+        assert limiter.usage()['total_calls'] == 2
+
+    def test_acquire_from_two_event_loops(self):
+        # Test one limiter can queue bursts on separate loops (the bot's and the sync wrappers')
+        limiter = stock_handler.RateLimiter(limit=2, window=0.05)
+
+        async def burst():
+            await asyncio.wait_for(asyncio.gather(*(limiter.acquire() for _ in range(4))), timeout=1)
+
+        asyncio.run(burst())
+        asyncio.run(burst())
+
+        assert limiter.usage()['total_calls'] == 8
+        assert limiter.usage()['queued'] == 0
+
+
+class TestRequestCoalescing:
+    # Test cases for single-flight de-duplication of identical lookups
+
+    @pytest.mark.asyncio
+    async def test_concurrent_get_stock_shares_upstream_calls(self):
+        # Test many simultaneous lookups of one ticker cost one quote and one profile call
+        calls = []
+
+        async def fake_get(endpoint, params):
+            calls.append(endpoint)
+            await asyncio.sleep(0.01)
+            return SAMPLE_QUOTE if endpoint == '/quote' else SAMPLE_PROFILE
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            results = await asyncio.gather(*(stock_handler.get_stock_async('tsla') for _ in range(10)))
+
+        assert sorted(calls) == ['/quote', '/stock/profile2']
+        assert all(result['price'] == 150.25 for result in results)
+        assert stock_handler._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_searches_coalesce(self):
+        # Test identical concurrent searches share one request, distinct ones don't
+        calls = []
+
+        async def fake_get(endpoint, params):
+            calls.append(params['q'])
+            await asyncio.sleep(0.01)
+            return {'result': [{'symbol': params['q']}]}
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            await asyncio.gather(
+                stock_handler.search_stocks_async('apple'),
+                stock_handler.search_stocks_async('Apple '),
+                stock_handler.search_stocks_async('tesla'),
+            )
+
+        assert sorted(calls) == ['apple', 'tesla']
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_call(self):
+        # Test one caller giving up leaves the shared request running for the others
+        async def fake_get(endpoint, params):
+            await asyncio.sleep(0.02)
+            return SAMPLE_QUOTE
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            first = asyncio.create_task(stock_handler.get_quote_async('AAPL'))
+            second = asyncio.create_task(stock_handler.get_quote_async('AAPL'))
+            await asyncio.sleep(0)
+            first.cancel()
+            result = await second
+
+        assert result == SAMPLE_QUOTE
+
+
+class TestBatchLookup:
+    # Test cases for get_stocks_batch
+
+    @pytest.mark.asyncio
+    async def test_batch_uses_cache_and_preserves_order(self):
+        # Test cached tickers cost no calls and results keep the requested order
+        calls = []
+
+        async def fake_get(endpoint, params):
+            calls.append((endpoint, params['symbol']))
+            return SAMPLE_QUOTE if endpoint == '/quote' else SAMPLE_PROFILE
+
+        stock_handler._stock_cache.set(('quote', 'MSFT'), SAMPLE_QUOTE, 60)
+        stock_handler._stock_cache.set(('profile', 'MSFT'), SAMPLE_PROFILE, 60)
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            results, skipped = await stock_handler.get_stocks_batch(['nvda', 'MSFT', 'NVDA', 'aapl'])
+
+        assert list(results) == ['NVDA', 'MSFT', 'AAPL']
+        assert skipped == []
+        assert ('/quote', 'MSFT') not in calls
+        assert len(calls) == 4
+
+    @pytest.mark.asyncio
+    async def test_batch_spends_budget_on_quotes_first(self):
+        # Test a small budget goes to quotes before profiles, and the rest are skipped
+        stock_handler._rate_limiter = stock_handler.RateLimiter(limit=3, window=60)
+        calls = []
+
+        async def fake_get(endpoint, params):
+            calls.append(endpoint)
+            return SAMPLE_QUOTE if endpoint == '/quote' else SAMPLE_PROFILE
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            results, skipped = await stock_handler.get_stocks_batch(['A', 'B', 'C', 'D'])
+
+        assert calls == ['/quote'] * 3
+        assert skipped == ['D']
+        assert results['A']['missing'] == ['profile']
+        assert results['D'] is None
+
+
+class TestWatchlistRefresh:
+    # Test cases for watchlists and background quote refresh
+
+    @pytest.fixture(autouse=True)
+    def reset_watchlists(self):
+        stock_handler._watch_store = cache_handler.TieredCache("watchlist", backend=None)
+        stock_handler._watchlists = {}
+        yield
+        stock_handler._watchlists = {}
+
+    @pytest.mark.asyncio
+    async def test_watch_and_unwatch(self):
+        # Test watchlists are per guild, capped and persisted
+        assert await stock_handler.watch_ticker(1, 'aapl')
+        assert await stock_handler.watch_ticker(2, 'MSFT')
+        assert stock_handler.get_watchlist(1) == ['AAPL']
+        assert stock_handler._watched_tickers() == ['AAPL', 'MSFT']
+
+        with patch.object(stock_handler, 'WATCHLIST_MAX', 1):
+            assert not await stock_handler.watch_ticker(1, 'TSLA')
+
+        assert await stock_handler.unwatch_ticker(1, 'AAPL')
+        assert not await stock_handler.unwatch_ticker(1, 'AAPL')
+        await stock_handler._load_watchlists()
+        assert stock_handler._watchlists == {2: {'MSFT'}}
+
+    @pytest.mark.asyncio
+    async def test_watchlist_persists_off_loop(self):
+        # Test saving and loading go through the store's async methods (backend I/O on a worker thread)
+        store = MagicMock()
+        store.set_async = AsyncMock()
+        store.get_async = AsyncMock(return_value={'1': ['AAPL']})
+        stock_handler._watch_store = store
+
+        await stock_handler.watch_ticker(1, 'MSFT')
+        store.set_async.assert_awaited_once_with("guilds", {'1': ['MSFT']}, None)
+        store.set.assert_not_called()
+
+        await stock_handler._load_watchlists()
+        assert stock_handler._watchlists == {1: {'AAPL'}}
+        store.get.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_refresh_warms_cache(self):
+        # Test a background refresh stores the quote with the requested TTL
+        async def fake_get(endpoint, params, acquire=True):
+            assert acquire is False
+            return SAMPLE_QUOTE
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get):
+            assert await stock_handler._refresh_quote('AAPL', ttl=60)
+
+        assert stock_handler._stock_cache.peek(('quote', 'AAPL')) == SAMPLE_QUOTE
+
+    @pytest.mark.asyncio
+    async def test_refresh_yields_to_interactive_calls(self):
+        # Test background refreshes leave the reserved slots and queued callers alone
+        stock_handler._rate_limiter = stock_handler.RateLimiter(limit=3, window=60)
+        stock_handler._rate_limiter.try_acquire()
+        stock_handler._rate_limiter.try_acquire()
+
+        with patch.object(stock_handler, 'INTERACTIVE_RESERVE', 1), \
+             patch.object(stock_handler, '_finnhub_get', side_effect=AssertionError("should not fetch")):
+            assert not await stock_handler._refresh_quote('AAPL', ttl=60)
+
+        # The interactive caller still gets the last slot
+        assert stock_handler._rate_limiter.try_acquire()
+
+
+SAMPLE_SYMBOLS = [
+    {'symbol': 'AAPL', 'description': 'APPLE INC', 'displaySymbol': 'AAPL', 'type': 'Common Stock'},
+    {'symbol': 'APLE', 'description': 'APPLE HOSPITALITY REIT INC', 'displaySymbol': 'APLE', 'type': 'REIT'},
+    {'symbol': 'A', 'description': 'AGILENT TECHNOLOGIES INC', 'displaySymbol': 'A', 'type': 'Common Stock'},
+    {'symbol': 'AA', 'description': 'ALCOA CORP', 'displaySymbol': 'AA', 'type': 'Common Stock'},
+    {'symbol': 'MSFT', 'description': 'MICROSOFT CORP', 'displaySymbol': 'MSFT', 'type': 'Common Stock'},
+]
+
+
+class TestSymbolIndex:
+    # Test cases for the local ticker / company name index
+
+    @pytest.fixture(autouse=True)
+    def reset_index(self):
+        yield
+        stock_handler._symbol_index = None
+
+    def test_symbol_exact_and_prefix(self):
+        # Test an exact ticker ranks first, followed by prefix matches
+        index = stock_handler.SymbolIndex(SAMPLE_SYMBOLS)
+
+        assert [r['symbol'] for r in index.search('a', limit=3)] == ['A', 'AA', 'AAPL']
+        assert index.search('msft')[0]['description'] == 'MICROSOFT CORP'
+
+    def test_company_name_tokens(self):
+        # Test multi-word name queries match on word prefixes
+        index = stock_handler.SymbolIndex(SAMPLE_SYMBOLS)
+
+        assert [r['symbol'] for r in index.search('apple')] == ['AAPL', 'APLE']
+        assert [r['symbol'] for r in index.search('apple hosp')] == ['APLE']
+        assert index.search('micro corp')[0]['symbol'] == 'MSFT'
+        assert index.search('zzz') == []
+
+    @pytest.mark.asyncio
+    async def test_search_uses_index_before_api(self):
+        # Test local matches cost no API call and misses fall back to Finnhub
+        stock_handler._symbol_index = stock_handler.SymbolIndex(SAMPLE_SYMBOLS)
+
+        async def fake_get(endpoint, params):
+            return {'result': [{'symbol': 'REMOTE'}]}
+
+        with patch.object(stock_handler, '_finnhub_get', side_effect=fake_get) as mock_get:
+            local = await stock_handler.search_stocks_async('alcoa')
+            assert mock_get.call_count == 0
+            remote = await stock_handler.search_stocks_async('nothing here')
+
+        assert local[0]['symbol'] == 'AA'
+        assert remote == [{'symbol': 'REMOTE'}]
+
+    @pytest.mark.asyncio
+    async def test_load_uses_cached_dump(self, tmp_path):
+        # Test the index is built from a fresh dump on disk, otherwise downloaded and saved
+        path = str(tmp_path / 'symbols.json')
+
+        async def fake_get(endpoint, params):
+            assert endpoint == '/stock/symbol'
+            return SAMPLE_SYMBOLS
+
+        with patch.object(stock_handler, 'SYMBOL_CACHE_PATH', path), \
+             patch.object(stock_handler, '_finnhub_get', side_effect=fake_get) as mock_get:
+            await stock_handler.load_symbol_index()
+            await stock_handler.load_symbol_index()
+
+        assert mock_get.call_count == 1
+        assert len(stock_handler._symbol_index) == len(SAMPLE_SYMBOLS)
+        assert stock_handler.autocomplete_tickers('MS')[0]['symbol'] == 'MSFT'